@@ -10,7 +10,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=datas,
-    hiddenimports=[],
+    hiddenimports=['src.cli'],  # ヘッドレスのサブコマンドはrunpyで実行します。
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
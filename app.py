@@ -3,18 +3,28 @@
     MosaicTool
 """
 import asyncio
+import sys
 from src.utils import get_package_version, Stopwatch
 sw = Stopwatch.start_new()
 
+from src import HEADLESS_COMMANDS
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in HEADLESS_COMMANDS:
+    # ヘッドレスのサブコマンドは、tkinterを読み込まずに実行します。
+    # ワーカープロセスがapp.pyを再読み込みしないように、src.cliを__main__として実行します。
+    import multiprocessing
+    import runpy
+    multiprocessing.freeze_support()
+    runpy.run_module("src.cli", run_name="__main__", alter_sys=True)
+
 from functools import partial
 from pathlib import Path
-import sys
 import os
 import tkinter as tk
 
 from tkinterdnd2 import TkinterDnD
 
 from src.app_config import AppConfig
+from src.async_service import run_tk
 from src.controllers import AppController
 from src.models import AppDataModel
 from src.widgets import MainPage
@@ -87,6 +97,7 @@ class MyApp(TkinterDnD.Tk):
             if self.controller:
                 self.controller.handle_auto_save(None)
         finally:
+            self.controller.close()
             self.destroy()  # ウィンドウを閉じる
 
     def set_window_title(self, filepath: Path):
@@ -110,8 +121,14 @@ class MyApp(TkinterDnD.Tk):
 
 
 async def main():
+    # tkinterのイベントをasyncioのイベントループから処理します。
     app = MyApp()
-    app.mainloop()
+    await run_tk(app)
+    # 保存中の画像は、完了を待ってから終了します。
+    await app.controller.async_service.aclose()
 
 if __name__ == "__main__":
+    # 画像のデコードをワーカープロセスで行う場合(decode.backend: process)に、実行ファイルから起動できるようにします。
+    import multiprocessing
+    multiprocessing.freeze_support()
     asyncio.run(main())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+    http_load_test
+    モザイク処理のHTTPサーバーの負荷試験
+    --urlを省略した場合は、ループバックの空きポートでサーバーを起動して試験します。
+
+    python scripts/http_load_test.py [--url http://127.0.0.1:8765] [--clients 8] [--requests 200] [--size 1920x1080]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import io
+import json
+from pathlib import Path
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.batch import RegionSpec
+from src.cli import default_config_path, load_presets
+from src.http_service import RedactionServer
+
+
+def make_image(size: tuple[int, int], image_format: str) -> bytes:
+    """
+    試験用の画像を生成します。
+    :param size: 画像の大きさ
+    :param image_format: 画像形式
+    :return: エンコードした画像
+    """
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def run_client(host: str, port: int, count: int, body: bytes, spec: str) -> tuple[list[float], dict[int, int]]:
+    """
+    1接続をkeep-aliveで再利用し、要求を繰り返します。
+    :param host: ホスト
+    :param port: ポート番号
+    :param count: 要求数
+    :param body: 画像
+    :param spec: X-Mosaic-Specヘッダー
+    :return: 応答時間(秒)とステータスコード毎の件数
+    """
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            connection.request("POST", "/mosaic", body=body, headers={"X-Mosaic-Spec": spec})
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+    finally:
+        connection.close()
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test for the MosaicTool HTTP service")
+    parser.add_argument("--url", default="", help="server URL (default: start a server on loopback)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=200, help="total number of requests")
+    parser.add_argument("--size", default="1920x1080", help="image size WIDTHxHEIGHT")
+    parser.add_argument("--format", default="JPEG", help="image format")
+    parser.add_argument("--workers", type=int, default=None, help="worker threads of the started server")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    body = make_image((width, height), args.format)
+    spec = json.dumps({"regions": [[0, 0, width // 2, height // 2]], "preset": "mosaic_16"})
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname or "127.0.0.1", url.port or 80
+    else:
+        server = RedactionServer(("127.0.0.1", 0), RegionSpec({}, load_presets(default_config_path())),
+                                 args.workers, max_queue=args.clients)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+
+    per_client = [args.requests // args.clients + (1 if i < args.requests % args.clients else 0)
+                  for i in range(args.clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = list(executor.map(lambda n: run_client(host, port, n, body, spec), per_client))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for result in results for t in result[0])
+    statuses: dict[int, int] = {}
+    for _, result_statuses in results:
+        for status, count in result_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"{len(latencies)} requests, {args.clients} clients, {len(body) / 1024:.0f} KiB {args.format}")
+    print(f"{len(latencies) / elapsed:.1f} req/s, {len(body) * len(latencies) / elapsed / 1024 / 1024:.1f} MB/s")
+    print(f"latency p50:{quantiles[49] * 1000:.1f}ms p95:{quantiles[94] * 1000:.1f}ms p99:{quantiles[98] * 1000:.1f}ms")
+    print(f"status {dict(sorted(statuses.items()))}")
+
+    if server:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+    photo_backend_benchmark
+    表示バックエンド(imagetk, ppm)の転送時間の比較
+    new: PhotoImageを毎回生成して転送(画像の切り替え)
+    reuse: 同じ大きさのPhotoImageを再利用して転送(タイルの再利用)
+    patch: 128x128の領域を転送(モザイク後の部分更新)
+
+    python scripts/photo_backend_benchmark.py [--sizes 512x512,1920x1080,4000x3000] [--modes RGB,L,RGBA] [--repeat 10]
+"""
+import argparse
+from pathlib import Path
+import statistics
+import sys
+import time
+import tkinter as tk
+from typing import Callable
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.photo_backend import BACKENDS, PhotoBackend, display_mode, select_backend
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    """
+    WxH形式の大きさを解析します。
+    :param text: 大きさ
+    :return: 幅, 高さ
+    """
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def timeit(func: Callable[[], None], repeat: int) -> float:
+    """
+    関数の実行時間の中央値を計測します。
+    :param func: 関数
+    :param repeat: 繰り返し回数
+    :return: 実行時間(ミリ秒)
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench(root: tk.Tk, backend: PhotoBackend, image: Image.Image, repeat: int) -> tuple[float, float, float]:
+    """
+    1つの表示バックエンドの転送時間を計測します。
+    :param root: ルートウィンドウ
+    :param backend: 表示バックエンド
+    :param image: 画像
+    :param repeat: 繰り返し回数
+    :return: new, reuse, patchの転送時間(ミリ秒)
+    """
+    mode = display_mode(image)
+    patch = image.crop((0, 0, min(128, image.width), min(128, image.height)))
+
+    def new():
+        backend.put(backend.create(root, mode, image.size), image)
+
+    photo = backend.create(root, mode, image.size)
+    return (timeit(new, repeat),
+            timeit(lambda: backend.put(photo, image), repeat),
+            timeit(lambda: backend.put(photo, patch, image.width // 2, image.height // 2), repeat))
+
+
+def main() -> int:
+    """
+    エントリーポイント
+    :return: 終了コード
+    """
+    parser = argparse.ArgumentParser(description="表示バックエンドの転送時間の比較")
+    parser.add_argument("--sizes", default="512x512,1920x1080,4000x3000", help="画像の大きさ(カンマ区切り)")
+    parser.add_argument("--modes", default="RGB,L,RGBA", help="画像のモード(カンマ区切り)")
+    parser.add_argument("--repeat", type=int, default=10, help="繰り返し回数")
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Tkを初期化できません。(ディスプレイが必要です): {e}", file=sys.stderr)
+        return 1
+    root.withdraw()
+    try:
+        print(f"{'size':>10} {'mode':>5} {'backend':>8} {'new ms':>8} {'reuse ms':>9} {'patch ms':>9}")
+        for size in map(parse_size, args.sizes.split(",")):
+            for mode in args.modes.split(","):
+                image = Image.effect_noise(size, 64).convert(mode)
+                for backend_class in BACKENDS.values():
+                    new, reuse, patch = bench(root, backend_class(), image, args.repeat)
+                    print(f"{size[0]}x{size[1]:<5} {mode:>5} {backend_class.name:>8} "
+                          f"{new:8.2f} {reuse:9.2f} {patch:9.2f}")
+        print(f"auto: {select_backend(root).name}")
+    finally:
+        root.destroy()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,3 +3,6 @@ from . utils import get_package_version
 __version__ = get_package_version()
 
 PROGRAM_NAME = 'MosaicTool'
+
+# tkinterを読み込まずに実行するサブコマンド(src.cli)
+HEADLESS_COMMANDS = ("batch", "pipe", "serve", "queue", "watch", "rerender")
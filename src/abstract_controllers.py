@@ -8,7 +8,9 @@ from pathlib import Path
 from typing import Iterable, Optional
 
 from . app_config import AppConfig, FontSize, ThemeColors
-from . models import AppDataModel, StatusBarInfo, DATA_STATE
+from . async_service import AsyncImageService
+from . models import AppDataModel, ImageList, StatusBarInfo, DATA_STATE, IMAGE_STATE, SORT_KEY
+from . thumbnail_service import ThumbnailService
 from . utils import Stopwatch
 from . effects.image_effects import MosaicEffect
 
@@ -24,13 +26,17 @@ class AbstractAppController(ABC):
         pass
 
     @abstractmethod
-    def add_file_path(self, item) -> int:
+    def add_file_paths(self, items) -> int:
         pass
 
     @abstractmethod
     def get_current_image(self) -> Path:
         pass
 
+    @abstractmethod
+    def get_current_image_format(self) -> Optional[str]:
+        pass
+
     @abstractmethod
     def handle_drop(self, event):
         pass
@@ -51,6 +57,18 @@ class AbstractAppController(ABC):
     def handle_next_image(self, event=None):
         pass
 
+    @abstractmethod
+    def handle_jump_to_index(self, index: int):
+        pass
+
+    @abstractmethod
+    def handle_jump_to_file(self, file_path: Path):
+        pass
+
+    @abstractmethod
+    def handle_sort_images(self, key: SORT_KEY, reverse: bool = False):
+        pass
+
     @abstractmethod
     def on_show_file_property(self, event=None):
         pass
@@ -150,3 +168,39 @@ class AbstractAppController(ABC):
     @abstractmethod
     def update_data_state(self, state: DATA_STATE):
         pass
+
+    @abstractmethod
+    def handle_saved(self, file_path: Path):
+        pass
+
+    @abstractmethod
+    def handle_apply_to_all(self, event=None):
+        pass
+
+    @abstractmethod
+    def get_image_list(self) -> ImageList:
+        pass
+
+    @abstractmethod
+    def get_current_index(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_image_state(self, index: int) -> IMAGE_STATE:
+        pass
+
+    @property
+    def thumbnail_service(self) -> ThumbnailService:
+        """
+        サムネイルの生成サービスを取得します。
+        :return: サムネイルの生成サービス
+        """
+        raise NotImplementedError()
+
+    @property
+    def async_service(self) -> AsyncImageService:
+        """
+        非同期の画像ファイル操作を取得します。
+        :return: 非同期の画像ファイル操作
+        """
+        raise NotImplementedError()
@@ -45,6 +45,40 @@ DEFAULT_CONFIG = {
     },
     "theme_colors": asdict(ThemeColors()),
     "font_sizes": asdict(FontSize()),
+    "image_list": {
+        "sort_key": "natural"  # natural, mtime, size, name
+    },
+    "filmstrip": {  # 画像一覧のサムネイル表示
+        "visible": True,
+        "thumbnail_size": 96
+    },
+    "metadata_cache": {  # 画像情報とサムネイルの永続キャッシュ
+        "enabled": False,
+        "directory": "",  # 空文字はユーザーのキャッシュディレクトリ
+        "max_size_mb": 256,
+        "thumbnail_size": 128
+    },
+    "canvas": {  # 画像の表示
+        "tile_size": 512,  # 表示範囲のみを表示するタイルの一辺のピクセル数
+        "tile_margin": 1,  # 表示範囲の周囲に先読みするタイル数
+        "zoom": "fit",  # 画像を開いた時の表示倍率。fitはウィンドウに合わせます。(1.0は等倍)
+        "photo_backend": "auto",  # 表示バックエンド(auto, imagetk, ppm)。autoは転送時間を計測して選択します。
+        "photo_pool": 64,  # 再利用のために保持するタイルのPhotoImageの上限
+        "live_preview": True,  # ドラッグ中に選択範囲のモザイクをプレビューします。
+        "proxy_megapixels": 50,  # 画素数(百万)を超える画像は縮小した作業用画像で編集します。(0は無効)
+        "proxy_size": 4096,  # 作業用画像の長辺のピクセル数
+        "undo_mb": 256,  # 元に戻すために保持する画素(圧縮後)の上限
+        "brush_size": 3,  # ブラシの直径(セル数)
+        "shape_threshold": 0.5  # 楕円の選択で、モザイクをかけるセルの被覆率の下限
+    },
+    "edit_log": {  # 編集ログ
+        "enabled": True  # 保存時に、出力ファイルの隣に<出力ファイル名>.mosaic.jsonを保存します。
+    },
+    "decode": {  # 画像のデコード
+        "backend": "thread",  # thread, process(PNGなどをワーカープロセスでデコードします)
+        "workers": 0,  # 0はCPU数
+        "pool_mb": 512  # 再利用のために保持する共有メモリの上限
+    },
     "effect_presets": {
         "mosaic": {
             "cell_sizes": [10, 16, 20, -1],
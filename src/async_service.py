@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+    async_service
+    画像ファイルの読み込み、保存、フォルダの走査、メタデータの取得を非同期(awaitable)で実行します。
+    処理はワーカースレッドで実行し、種類毎に同時実行数を制限します。タスクは取り消しできます。
+
+    アプリではtkinterをasyncioのイベントループから駆動します(run_tk)。
+    コルーチンはtkinterと同じメインスレッドで実行されるため、awaitの後にそのまま画面を更新できます。
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Iterable, Optional, TypeVar
+
+from PIL import Image
+
+from . decode_pool import ProcessDecodePool
+from . image_file_service import ImageFileService
+from . metadata_cache import CachedMetadata, MetadataCache
+
+if TYPE_CHECKING:
+    from . batch import BatchJob, BatchResult, BatchSummary
+
+T = TypeVar("T")
+
+
+class AsyncImageService:
+    """
+    非同期の画像ファイル操作
+    """
+    def __init__(self, io_workers: Optional[int] = None, max_loads: int = 2, max_saves: int = 2,
+                 max_scans: int = 1, max_metadata: int = 4, cache: Optional[MetadataCache] = None,
+                 decode_pool: Optional[ProcessDecodePool] = None):
+        """
+        コンストラクタ
+        イベントループは最初に処理を実行した時点のものを使用します。
+        :param io_workers: ワーカースレッド数。Noneの場合はCPU数(最大8)
+        :param max_loads: 読み込みの同時実行数
+        :param max_saves: 保存の同時実行数
+        :param max_scans: フォルダの走査の同時実行数
+        :param max_metadata: メタデータの取得の同時実行数
+        :param cache: メタデータの永続キャッシュ。Noneの場合は毎回ヘッダーを読み込みます。
+        :param decode_pool: 指定した場合は、画像をワーカープロセスでデコードします。
+        """
+        workers = io_workers or min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-io")
+        self.cache = cache
+        self.decode_pool = decode_pool
+        self.limits: dict[str, asyncio.Semaphore] = {
+            "load": asyncio.Semaphore(max_loads),
+            "save": asyncio.Semaphore(max_saves),
+            "scan": asyncio.Semaphore(max_scans),
+            "metadata": asyncio.Semaphore(max_metadata),
+            "batch": asyncio.Semaphore(1),
+        }
+        self.tasks: set[asyncio.Task] = set()  # 実行中のタスク
+        self.keyed_tasks: dict[str, asyncio.Task] = {}  # キー毎の最新のタスク
+        self.protected_tasks: set[asyncio.Task] = set()  # 終了時に完了を待つタスク
+        self.closed: bool = False
+
+    def limit(self, kind: str) -> asyncio.Semaphore:
+        """
+        処理の種類毎の同時実行数の制限
+        取り消された場合、開始前の処理は実行しません。開始済みの処理は完了を待たずに戻ります。
+        :param kind: 処理の種類(load, save, scan, metadata, batch)
+        :return: セマフォ
+        """
+        if self.closed:
+            raise RuntimeError("AsyncImageService is closed")
+        return self.limits[kind]
+
+    async def run(self, kind: str, func: Callable[..., T], *args: Any) -> T:
+        """
+        同時実行数の制限内で、関数をワーカースレッドで実行します。
+        :param kind: 処理の種類(load, save, scan, metadata)
+        :param func: 実行する関数
+        :param args: 関数の引数
+        :return: 関数の戻り値
+        """
+        async with self.limit(kind):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def load(self, file_path: Path) -> Image.Image:
+        """
+        画像ファイルを読み込み、画素をデコードします。
+        decode_poolを指定した場合は、共有メモリをコピーせずに参照する読み取り専用の画像を返します。
+        (RGBの画像はRGBXモードです。書き込むと複製されます。ブロックは画像の破棄時に返却します。)
+        :param file_path: 画像ファイルのパス
+        :return: 画像データ
+        """
+        async with self.limit("load"):
+            if self.decode_pool is not None:
+                shared = await asyncio.wrap_future(self.decode_pool.submit(file_path))
+                return shared.image
+            return await ImageFileService.load_async(file_path, self.executor)
+
+    async def save(self, out_image: Image.Image, output_path: Path, filename: Path,
+                   src_format: Optional[str] = None):
+        """
+        画像を保存します。
+        保存中の書き換えを防ぐため、呼び出し側で複製した画像を渡してください。
+        :param out_image: 出力画像
+        :param output_path: 出力先ファイルパス
+        :param filename: 元画像のファイルパス
+        :param src_format: 元画像の画像形式
+        """
+        async with self.limit("save"):
+            await ImageFileService.save_async(out_image, output_path, filename, src_format, self.executor)
+
+    async def replay(self, job: 'BatchJob') -> 'BatchResult':
+        """
+        元の画像を読み込み、記録した領域にモザイクをかけて保存します。(縮小した作業用画像の編集時の保存)
+        :param job: 処理内容
+        :return: 処理結果
+        """
+        from . batch import process_job
+
+        result = await self.run("save", process_job, job)
+        if not result.ok:
+            raise RuntimeError(result.error)
+        return result
+
+    async def scan(self, inputs: Iterable[str]) -> list[Path]:
+        """
+        ファイル、フォルダ、globパターンより画像ファイルを列挙します。
+        :param inputs: ファイル、フォルダ、globパターン
+        :return: 画像ファイルのパス
+        """
+        from . batch import iter_input_files
+        return await self.run("scan", lambda: [path for path, _ in iter_input_files(list(inputs))])
+
+    async def metadata(self, file_path: Path) -> CachedMetadata:
+        """
+        画像の大きさ、形式などを取得します。画素のデコードは行いません。
+        :param file_path: 画像ファイルのパス
+        :return: 画像の情報
+        """
+        probe = self.cache.get_or_probe if self.cache else MetadataCache.probe
+        return await self.run("metadata", probe, file_path)
+
+    async def run_jobs(self, jobs: Iterable['BatchJob'], max_workers: Optional[int] = None,
+                       progress: Optional[Callable[['BatchResult', 'BatchSummary'], None]] = None) -> 'BatchSummary':
+        """
+        一括処理をプロセスプールで実行します。完了した順にprogressを呼び出します。
+        取り消された場合は、開始前のファイルを処理せずに戻ります。(処理中のファイルは保存まで完了します。)
+        :param jobs: 処理内容
+        :param max_workers: ワーカープロセス数。Noneの場合はCPU数
+        :param progress: 1ファイル処理毎に呼び出すコールバック
+        :return: 集計結果
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from . batch import BatchSummary, process_job
+        from . utils import Stopwatch
+
+        job_list = list(jobs)
+        summary = BatchSummary()
+        if not job_list:
+            return summary
+        async with self.limit("batch"):
+            sw = Stopwatch.start_new()
+            executor = ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(job_list)))
+            try:
+                futures = [asyncio.wrap_future(executor.submit(process_job, job)) for job in job_list]
+                for future in asyncio.as_completed(futures):
+                    result = await future
+                    summary.add(result)
+                    summary.elapsed = sw.elapsed
+                    if progress:
+                        progress(result, summary)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+            summary.elapsed = sw.stop()
+        return summary
+
+    def spawn(self, coro: Coroutine[Any, Any, T], key: Optional[str] = None,
+              done: Optional[Callable[['asyncio.Task[T]'], None]] = None,
+              wait_on_close: bool = False) -> 'asyncio.Task[T]':
+        """
+        コルーチンをタスクとして実行します。実行中のイベントループが必要です。
+        :param coro: コルーチン
+        :param key: 指定した場合は、同じキーの前のタスクを取り消します。(画像の切り替えなど、最新の要求のみ必要な場合)
+        :param done: 完了時(取り消し、例外を含む)に呼び出すコールバック
+        :param wait_on_close: 終了時に取り消さず、完了を待つ場合はTrue(保存など)
+        :return: タスク
+        """
+        task = asyncio.get_running_loop().create_task(coro)
+        if key is not None:
+            previous = self.keyed_tasks.get(key)
+            if previous is not None:
+                previous.cancel()
+            self.keyed_tasks[key] = task
+        self.tasks.add(task)
+        if wait_on_close:
+            self.protected_tasks.add(task)
+
+        def on_done(t: asyncio.Task):
+            self.tasks.discard(t)
+            self.protected_tasks.discard(t)
+            if key is not None and self.keyed_tasks.get(key) is t:
+                del self.keyed_tasks[key]
+            if done is not None:
+                done(t)
+        task.add_done_callback(on_done)
+        return task
+
+    def cancel(self, key: Optional[str] = None):
+        """
+        タスクを取り消します。
+        :param key: 取り消すタスクのキー。Noneの場合はwait_on_closeを指定したタスク以外の全てのタスク
+        """
+        if key is None:
+            for task in list(self.tasks):
+                if task not in self.protected_tasks:
+                    task.cancel()
+        elif key in self.keyed_tasks:
+            self.keyed_tasks[key].cancel()
+
+    @property
+    def pending(self) -> int:
+        """
+        実行中のタスク数
+        """
+        return len(self.tasks)
+
+    async def aclose(self):
+        """
+        終了します。wait_on_closeを指定したタスクは完了を待ち、それ以外のタスクは取り消します。
+        """
+        self.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.closed = True
+        self.executor.shutdown(wait=True)
+
+
+async def run_tk(root: Any, interval: float = 0.01, max_events: int = 100):
+    """
+    tkinterのイベントをasyncioのイベントループから処理します。mainloopの代わりに使用します。
+    イベントがある間は連続して処理し、ない場合はinterval秒待機して他のタスクに処理を譲ります。
+    ウィンドウが破棄されると終了します。
+    :param root: tkinterのルートウィンドウ
+    :param interval: イベントがない場合の待機時間(秒)
+    :param max_events: 他のタスクに処理を譲るまでに処理するイベントの上限
+    """
+    # 画面を持たない処理から読み込まれた場合に、tkinterを読み込まないようにします。
+    import _tkinter
+    import tkinter as tk
+
+    while True:
+        try:
+            processed = 0
+            while processed < max_events and root.tk.dooneevent(_tkinter.DONT_WAIT):
+                processed += 1
+            if not root.winfo_exists():
+                return
+        except tk.TclError:
+            return  # ウィンドウの破棄後
+        await asyncio.sleep(0 if processed else interval)
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+    batch
+    ヘッドレスの一括モザイク処理
+    tkinterを読み込まずに、プロセスプールで 読み込み → MosaicEffect → ImageFileService.save を実行します。
+"""
+from dataclasses import dataclass, field
+import fnmatch
+import glob
+import json
+import os
+from pathlib import Path
+import sys
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from PIL import Image
+
+from . edit_log import EditLog
+from . effects.image_effects import EffectPreset, MosaicEffect
+from . effects.mask_shapes import shape_from_dict
+from . image_file_service import EXTENSION_FORMATS, ImageFileService
+from . utils import Stopwatch
+
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Rect = tuple[int, int, int, int]
+# 画像の幅と高さに対する比率(0.0～1.0)の矩形
+RelativeRect = tuple[float, float, float, float]
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """
+    1ファイル分の処理内容
+    プロセス間で受け渡すため、pickle化できる値のみを保持します。
+    """
+    input_path: str  # 元画像のファイルパス
+    cell_size: int  # モザイクのセルサイズ(MosaicEffect.AUTOは自動計算)
+    regions: tuple[Rect, ...]  # モザイクをかける領域
+    output_path: str = ""  # 出力先ファイルパス。空文字の場合は_mosaic_Nの名前で保存します。
+    output_dir: str = ""  # 出力先ディレクトリ。空文字の場合は元画像と同じ場所に保存します。
+    output_subdir: str = ""  # output_dir内のサブフォルダ。異なるフォルダの同名のファイルを別々に保存します。
+    save_directory: bool = False  # フォルダ指定時は、<フォルダ名>_mosaicに保存します。
+    relative_regions: tuple[RelativeRect, ...] = ()  # 画像の大きさに対する比率で指定する領域
+    region_cell_sizes: tuple[int, ...] = ()  # regionsの領域毎のセルサイズ。空の場合は全ての領域でcell_sizeを使用します。
+    edit_log: bool = False  # 出力ファイルの隣に編集ログ(サイドカー)を保存します。
+    shapes: tuple[dict[str, Any], ...] = ()  # 多角形、楕円の領域({"polygon": [[x, y], ...]}、{"ellipse": [x0, y0, x1, y1]})
+    shape_threshold: float = 0.5  # 多角形、楕円の領域で、モザイクをかけるセルの被覆率の下限
+
+    def resolve_regions(self, size: tuple[int, int]) -> tuple[Rect, ...]:
+        """
+        比率で指定した領域をピクセル単位に変換し、ピクセル単位の領域と合わせて取得します。
+        :param size: 画像の大きさ
+        :return: モザイクをかける領域
+        """
+        width, height = size
+        relative = tuple((round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height))
+                         for x0, y0, x1, y1 in self.relative_regions)
+        return self.regions + relative
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'BatchJob':
+        """
+        JSONより読み込んだ辞書から生成します。(リストをタプルに変換します。)
+        :param data: dataclasses.asdictの形式の辞書
+        :return: 処理内容
+        """
+        return cls(**{**data, "regions": tuple(tuple(rect) for rect in data.get("regions", ())),
+                      "relative_regions": tuple(tuple(rect) for rect in data.get("relative_regions", ())),
+                      "region_cell_sizes": tuple(data.get("region_cell_sizes", ())),
+                      "shapes": tuple(data.get("shapes", ()))})
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """
+    1ファイル分の処理結果
+    """
+    input_path: str  # 元画像のファイルパス
+    output_path: str = ""  # 出力先ファイルパス
+    error: str = ""  # エラーメッセージ。正常終了時は空文字
+    pixels: int = 0  # 処理した画像の画素数
+    input_bytes: int = 0  # 元画像のファイルサイズ
+
+    @property
+    def ok(self) -> bool:
+        """
+        正常終了したかどうか
+        :return: 正常終了時はTrue
+        """
+        return not self.error
+
+
+@dataclass
+class BatchSummary:
+    """
+    一括処理の集計
+    """
+    total: int = 0  # 処理件数
+    succeeded: int = 0  # 正常終了の件数
+    failed: list[BatchResult] = field(default_factory=list)  # エラーの処理結果
+    elapsed: float = 0.0  # 経過時間(秒)
+    pixels: int = 0  # 処理した画素数
+    input_bytes: int = 0  # 読み込んだバイト数
+
+    def add(self, result: BatchResult):
+        """
+        処理結果を集計します。
+        :param result: 処理結果
+        """
+        self.total += 1
+        self.pixels += result.pixels
+        self.input_bytes += result.input_bytes
+        if result.ok:
+            self.succeeded += 1
+        else:
+            self.failed.append(result)
+
+    def merge(self, other: 'BatchSummary'):
+        """
+        他のプロセスの集計結果を合算します。経過時間は合算しません。
+        :param other: 集計結果
+        """
+        self.total += other.total
+        self.succeeded += other.succeeded
+        self.failed.extend(other.failed)
+        self.pixels += other.pixels
+        self.input_bytes += other.input_bytes
+
+    def __str__(self) -> str:
+        """
+        集計結果の文字列
+        :return: 件数とスループット
+        """
+        elapsed = max(self.elapsed, 1e-9)
+        return (f"{self.succeeded}/{self.total} succeeded, {len(self.failed)} failed, {self.elapsed:.3f}s, "
+                f"{self.total / elapsed:.1f} images/s, {self.pixels / elapsed / 1e6:.1f} MP/s, "
+                f"{self.input_bytes / elapsed / 1024 / 1024:.1f} MB/s")
+
+
+class RegionSpec:
+    """
+    モザイクをかける領域の指定(JSON)
+    {
+        "preset": "mosaic_16",
+        "regions": [[0, 0, 100, 50]],
+        "shapes": [{"ellipse": [200, 100, 320, 260]}, {"polygon": [[0, 300], [80, 280], [90, 330], [10, 350]]}],
+        "files": {
+            "*.png": {"preset": "mosaic_auto", "regions": [[10, 10, 200, 40]]},
+            "scan_001.jpg": {"regions": [], "shapes": []}
+        }
+    }
+    filesのキーはファイル名またはパスのglobパターンです。先に一致したものを使用し、一致しない場合は最上位の指定を使用します。
+    filesでpreset、regions、shapesを省略した場合は、最上位の指定を使用します。
+    """
+    def __init__(self, spec: dict[str, Any], presets: EffectPreset, default_preset: str = ""):
+        """
+        コンストラクタ
+        :param spec: 領域の指定
+        :param presets: エフェクトのプリセット
+        :param default_preset: specでプリセットを指定しない場合のプリセット名
+        """
+        self.presets = presets
+        self.base_preset: str = spec.get("preset") or default_preset or presets.default_preset
+        self.default = self.parse_entry(spec, self.base_preset, ())
+        self.files: list[tuple[str, tuple[int, tuple[Rect, ...]]]] = [
+            (pattern, self.parse_entry(entry, self.base_preset, self.default[1]))
+            for pattern, entry in spec.get("files", {}).items()
+        ]
+        self.default_shapes = self.parse_shapes(spec, ())
+        self.file_shapes: list[tuple[str, tuple[dict[str, Any], ...]]] = [
+            (pattern, self.parse_shapes(entry, self.default_shapes))
+            for pattern, entry in spec.get("files", {}).items()
+        ]
+
+    @classmethod
+    def load(cls, spec_path: Path, presets: EffectPreset, default_preset: str = "") -> 'RegionSpec':
+        """
+        JSONファイルより領域の指定を読み込みます。
+        :param spec_path: JSONファイルのパス
+        :param presets: エフェクトのプリセット
+        :param default_preset: 既定のプリセット名
+        :return: 領域の指定
+        """
+        with open(spec_path, "r", encoding="utf-8") as file:
+            return cls(json.load(file), presets, default_preset)
+
+    def parse_entry(self, entry: dict[str, Any], default_preset: str,
+                    default_regions: tuple[Rect, ...]) -> tuple[int, tuple[Rect, ...]]:
+        """
+        プリセットと領域を解析します。
+        :param entry: プリセットと領域の指定
+        :param default_preset: プリセットを省略した場合のプリセット名
+        :param default_regions: 領域を省略した場合の領域
+        :return: セルサイズと領域
+        """
+        preset_name = entry.get("preset") or default_preset
+        if preset_name not in self.presets.presets:
+            raise ValueError(f"Unknown preset:{preset_name}")
+        if "regions" not in entry:
+            return self.presets.get_preset(preset_name).cell_size, default_regions
+        regions: list[Rect] = []
+        for rect in entry.get("regions", []):
+            if len(rect) != 4:
+                raise ValueError(f"Region must be [left, top, right, bottom]:{rect}")
+            x0, y0, x1, y1 = (int(v) for v in rect)
+            regions.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        return self.presets.get_preset(preset_name).cell_size, tuple(regions)
+
+    @staticmethod
+    def parse_shapes(entry: dict[str, Any], default_shapes: tuple[dict[str, Any], ...]) -> tuple[dict[str, Any], ...]:
+        """
+        多角形、楕円の領域を解析します。
+        :param entry: 領域の指定
+        :param default_shapes: 領域を省略した場合の領域
+        :return: 多角形、楕円の領域(BatchJob.shapesの形式)
+        """
+        if "shapes" not in entry:
+            return default_shapes
+        return tuple(shape_from_dict(shape).to_dict() for shape in entry.get("shapes", []))
+
+    def match(self, file_path: Path) -> tuple[int, tuple[Rect, ...]]:
+        """
+        ファイルに対応するセルサイズと領域を取得します。
+        :param file_path: 画像ファイルのパス
+        :return: セルサイズと領域
+        """
+        return self._find(file_path, self.files, self.default)
+
+    def match_shapes(self, file_path: Path) -> tuple[dict[str, Any], ...]:
+        """
+        ファイルに対応する多角形、楕円の領域を取得します。
+        :param file_path: 画像ファイルのパス
+        :return: 多角形、楕円の領域
+        """
+        return self._find(file_path, self.file_shapes, self.default_shapes)
+
+    @staticmethod
+    def _find(file_path: Path, entries: list[tuple[str, Any]], default: Any) -> Any:
+        """
+        ファイルに最初に一致したパターンの値を取得します。
+        :param file_path: 画像ファイルのパス
+        :param entries: globパターンと値
+        :param default: 一致しない場合の値
+        :return: 値
+        """
+        name = file_path.name
+        posix = file_path.as_posix()
+        for pattern, entry in entries:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(posix, pattern):
+                return entry
+        return default
+
+
+def iter_input_files(inputs: Iterable[str]) -> Iterator[tuple[Path, bool]]:
+    """
+    入力のファイル、フォルダ、globパターンより画像ファイルを列挙します。
+    :param inputs: ファイル、フォルダ、globパターン
+    :return: 画像ファイルのパスとフォルダ指定かどうか
+    """
+    for item in inputs:
+        paths = [Path(p) for p in sorted(glob.glob(item))] if glob.has_magic(item) else [Path(item)]
+        for path in paths:
+            if path.is_dir():
+                for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                    if entry.is_file() and Path(entry.name).suffix.lower() in EXTENSION_FORMATS:
+                        yield Path(entry.path), True
+            elif path.suffix.lower() in EXTENSION_FORMATS:
+                yield path, False
+
+
+def common_folder(folders: Iterable[Path]) -> Optional[Path]:
+    """
+    フォルダの共通の親フォルダ
+    :param folders: フォルダ
+    :return: 共通の親フォルダ。フォルダがない場合、ドライブが異なる場合はNone
+    """
+    resolved = [str(Path(folder).resolve()) for folder in folders]
+    try:
+        return Path(os.path.commonpath(resolved)) if resolved else None
+    except ValueError:  # Windowsでドライブが異なる場合
+        return None
+
+
+def relative_folder(file_path: Path, base: Optional[Path]) -> str:
+    """
+    出力先ディレクトリ内に、入力のフォルダ構成を保持するサブフォルダ
+    :param file_path: 画像ファイルのパス
+    :param base: 入力の共通の親フォルダ(common_folder)
+    :return: サブフォルダ。共通の親フォルダの直下のファイルは空文字
+    """
+    folder = Path(file_path).resolve().parent
+    relative = folder.relative_to(base) if base is not None else folder.relative_to(folder.anchor)
+    return "" if relative == Path(".") else relative.as_posix()
+
+
+def create_jobs(inputs: Iterable[str], spec: RegionSpec, output_dir: str = "") -> Iterator[BatchJob]:
+    """
+    入力より処理内容を生成します。
+    出力先ディレクトリを指定した場合は、入力の共通の親フォルダからのフォルダ構成を保持して保存します。
+    (異なるフォルダの同名のファイルが、同じ出力ファイルに上書きされないようにします。)
+    :param inputs: ファイル、フォルダ、globパターン
+    :param spec: 領域の指定
+    :param output_dir: 出力先ディレクトリ
+    :return: 処理内容
+    """
+    files = list(iter_input_files(inputs))
+    base = common_folder({file_path.parent for file_path, _ in files}) if output_dir else None
+    for file_path, is_dir in files:
+        cell_size, regions = spec.match(file_path)
+        yield BatchJob(str(file_path), cell_size, regions, output_dir=output_dir,
+                       output_subdir=relative_folder(file_path, base) if output_dir else "",
+                       save_directory=is_dir, shapes=spec.match_shapes(file_path))
+
+
+def apply_regions(image: Image.Image, cell_size: int, regions: Iterable[Rect]) -> bool:
+    """
+    画像の範囲内に切り詰めた領域にモザイクを適用します。
+    切り詰めた幅または高さがセルサイズ未満の領域は、セルを作れないためスキップします。(他の領域の処理は継続します。)
+    :param image: モザイクをかける画像
+    :param cell_size: セルサイズ(MosaicEffect.AUTOは自動計算)
+    :param regions: モザイクをかける領域
+    :return: いずれかの領域にモザイクをかけたかどうか
+    """
+    if cell_size == MosaicEffect.AUTO:
+        cell_size = MosaicEffect.calc_cell_size(image)
+    mosaic = MosaicEffect(cell_size)
+    is_apply = False
+    for x0, y0, x1, y1 in regions:
+        x0, x1 = max(0, x0), min(image.width, x1)
+        y0, y1 = max(0, y0), min(image.height, y1)
+        if x1 - x0 < cell_size or y1 - y0 < cell_size:
+            continue
+        is_apply |= mosaic.apply(image, x0, y0, x1, y1)
+    return is_apply
+
+
+def output_path_for(job: BatchJob, size: tuple[int, int]) -> Path:
+    """
+    出力先のファイルパスを決定します。
+    :param job: 処理内容
+    :param size: 元画像の大きさ
+    :return: 出力先ファイルパス
+    """
+    if job.output_path:
+        return Path(job.output_path)
+    input_path = Path(job.input_path)
+    if job.output_dir:
+        return ImageFileService.generate_new_filename(Path(job.output_dir, job.output_subdir, input_path.name), size)
+    return ImageFileService.mosaic_filename(input_path, job.save_directory)
+
+
+def process_job(job: BatchJob) -> BatchResult:
+    """
+    1ファイル分の 読み込み → モザイク → 保存 を実行します。ワーカープロセスで実行します。
+    例外は処理結果に格納し、他のファイルの処理を継続します。
+    :param job: 処理内容
+    :return: 処理結果
+    """
+    input_path = Path(job.input_path)
+    try:
+        input_bytes = input_path.stat().st_size
+        with ImageFileService.load(input_path) as image:
+            image.load()
+            size = image.size
+            cell_size = MosaicEffect.calc_cell_size(image) if job.cell_size == MosaicEffect.AUTO else job.cell_size
+            if job.region_cell_sizes:  # 画面で適用した順序で、領域毎のセルサイズを使用します。
+                applied = list(zip(job.region_cell_sizes, job.regions))
+            else:
+                applied = [(cell_size, rect) for rect in job.resolve_regions(size)]
+            for region_cell_size, rect in applied:
+                apply_regions(image, region_cell_size, (rect, ))
+            if job.shapes:
+                # 多角形、楕円の領域は、モザイクをかけたセルを行毎にまとめた矩形として編集ログに記録します。
+                runs = MosaicEffect(cell_size).apply_shapes(image, [shape_from_dict(shape) for shape in job.shapes],
+                                                            job.shape_threshold)
+                applied.extend((cell_size, rect) for rect in runs)
+            output_path = output_path_for(job, size)
+            ImageFileService.save(image, output_path, input_path, image.format or "")
+            if job.edit_log:
+                log = EditLog.create(input_path, output_path, size)
+                for cell_size, rect in applied:
+                    log.add(rect, cell_size)
+                log.save(output_path)
+        return BatchResult(job.input_path, str(output_path), pixels=size[0] * size[1], input_bytes=input_bytes)
+    except Exception as e:
+        return BatchResult(job.input_path, error=f"{type(e).__name__}: {e}")
+
+
+def run_batch(jobs: Iterable[BatchJob], max_workers: Optional[int] = None,
+              progress: Optional[Callable[[BatchResult, BatchSummary], None]] = None) -> BatchSummary:
+    """
+    プロセスプールで一括処理を実行します。
+    :param jobs: 処理内容
+    :param max_workers: ワーカープロセス数。Noneの場合はCPU数
+    :param progress: 1ファイル処理毎に呼び出すコールバック
+    :return: 集計結果
+    """
+    # multiprocessingは読み込みに時間がかかるため、一括処理の実行時に読み込みます。
+    from concurrent.futures import ProcessPoolExecutor
+
+    job_list = list(jobs)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(job_list) or 1))
+    # 大量の小さな画像のプロセス間通信を減らすため、複数件をまとめてワーカーに渡します。
+    chunksize = max(1, min(64, len(job_list) // (workers * 8)))
+
+    summary = BatchSummary()
+    sw = Stopwatch.start_new()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(process_job, job_list, chunksize=chunksize):
+            summary.add(result)
+            summary.elapsed = sw.elapsed
+            if progress:
+                progress(result, summary)
+    summary.elapsed = sw.stop()
+    return summary
+
+
+class ProgressPrinter:
+    """
+    進捗を標準エラー出力に表示します。
+    """
+    def __init__(self, total: int, interval: float = 0.5):
+        """
+        コンストラクタ
+        :param total: 総件数
+        :param interval: 表示間隔(秒)
+        """
+        self.total = total
+        self.interval = interval
+        self.last = -interval
+
+    def __call__(self, result: BatchResult, summary: BatchSummary):
+        """
+        1ファイル処理毎に呼び出されます。
+        :param result: 処理結果
+        :param summary: 途中の集計結果
+        """
+        if not result.ok:
+            print(f"\nERROR {result.input_path}: {result.error}", file=sys.stderr)
+        if summary.elapsed - self.last >= self.interval or summary.total == self.total:
+            self.last = summary.elapsed
+            rate = summary.total / max(summary.elapsed, 1e-9)
+            print(f"\r[{summary.total}/{self.total}] {rate:.1f} images/s", end="", file=sys.stderr, flush=True)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+    BrushStroke
+    ブラシでなぞった軌跡のセルにモザイクをかけるための、1回のストローク
+    セルは画像の左上を原点とする格子に揃え、セル毎の使用済みのビットマップで、各セルを1回だけ平均します。
+    マウス移動毎に新しく触れたセルのみを返すため、処理時間は画像の大きさではなく、なぞった面積に比例します。
+"""
+import math
+from typing import Iterable, Optional
+
+# セルの位置(列, 行)
+Cell = tuple[int, int]
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Rect = tuple[int, int, int, int]
+
+
+class BrushStroke:
+    """
+    ブラシの1回のストローク
+    """
+    def __init__(self, image_size: tuple[int, int], cell_size: int, radius: float):
+        """
+        コンストラクタ
+        画像の右端と下端の、セルサイズに満たない余りの画素は、矩形の選択と同じく変更しません。
+        :param image_size: 元の画像の大きさ
+        :param cell_size: セルサイズ
+        :param radius: ブラシの半径(元の画像のピクセル数)
+        """
+        if cell_size <= 0:
+            raise ValueError(f"cell_size:{cell_size}")
+        self.cell_size = cell_size
+        self.radius = max(0.0, radius)
+        self.columns = image_size[0] // cell_size
+        self.rows = image_size[1] // cell_size
+        self.occupied = bytearray(self.columns * self.rows)  # 使用済みのセル
+        self.last: Optional[tuple[float, float]] = None  # 最後の位置
+        self.count = 0  # 使用済みのセル数
+
+    def move_to(self, x: float, y: float) -> list[Cell]:
+        """
+        前回の位置から指定した位置までなぞります。最初の呼び出しは、指定した位置のみをなぞります。
+        :param x: 元の画像のX座標
+        :param y: 元の画像のY座標
+        :return: 新しく触れたセル(行、列の順)
+        """
+        start = self.last if self.last is not None else (x, y)
+        self.last = (x, y)
+        # セルサイズの半分の間隔で軌跡上の点を取り、各点の円と重なるセルを集めます。
+        steps = max(1, math.ceil(math.hypot(x - start[0], y - start[1]) / (self.cell_size / 2)))
+        cells: list[Cell] = []
+        for i in range(steps + 1):
+            t = i / steps
+            cells.extend(self._paint(start[0] + (x - start[0]) * t, start[1] + (y - start[1]) * t))
+        return sorted(cells, key=lambda cell: (cell[1], cell[0]))
+
+    def _paint(self, x: float, y: float) -> list[Cell]:
+        """
+        円と重なる未使用のセルを使用済みにします。
+        :param x: 円の中心のX座標
+        :param y: 円の中心のY座標
+        :return: 新しく使用済みにしたセル
+        """
+        size, radius = self.cell_size, self.radius
+        cells: list[Cell] = []
+        for row in range(max(0, math.floor((y - radius) / size)), min(self.rows, math.floor((y + radius) / size) + 1)):
+            # 円の中心に最も近い、行内のY座標までの距離から、行と重なるX座標の範囲を求めます。
+            dy = y - min(max(y, row * size), (row + 1) * size)
+            if dy * dy > radius * radius:
+                continue
+            half = math.sqrt(radius * radius - dy * dy)
+            first = max(0, math.floor((x - half) / size))
+            last = min(self.columns, max(first + 1, math.ceil((x + half) / size)))
+            offset = row * self.columns
+            for column in range(first, last):
+                if not self.occupied[offset + column]:
+                    self.occupied[offset + column] = 1
+                    cells.append((column, row))
+        self.count += len(cells)
+        return cells
+
+    def runs(self, cells: Iterable[Cell]) -> list[Rect]:
+        """
+        行毎に連続するセルを1つの矩形にまとめます。
+        矩形はセルの格子に揃っているため、矩形にモザイクをかけると、各セルを個別に平均した結果と一致します。
+        :param cells: 行、列の順に並べたセル
+        :return: 元の画像の矩形
+        """
+        size = self.cell_size
+        rects: list[Rect] = []
+        run: Optional[list[int]] = None  # 列の開始位置, 終了位置, 行
+        for column, row in cells:
+            if run is not None and run[2] == row and run[1] == column:
+                run[1] = column + 1
+                continue
+            if run is not None:
+                rects.append((run[0] * size, run[2] * size, run[1] * size, (run[2] + 1) * size))
+            run = [column, column + 1, row]
+        if run is not None:
+            rects.append((run[0] * size, run[2] * size, run[1] * size, (run[2] + 1) * size))
+        return rects
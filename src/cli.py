@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+    cli
+    ヘッドレスのサブコマンド
+    tkinter、tkinterdnd2を読み込まずに実行します。各サブコマンドの処理は、実行時に読み込みます。
+
+    python app.py batch <入力...> --regions <領域の指定.json> [--workers N] [--output-dir DIR] [--shard i/n] [--edit-log]
+    python app.py pipe [--regions <領域の指定.json>] [--preset NAME] < 入力 > 出力
+    python app.py serve [--host 127.0.0.1] [--port 8765] [--workers N] [--queue N]
+    python app.py queue enqueue <入力...> --spool DIR [--regions <領域の指定.json>] [--shard i/n]
+    python app.py queue work --spool DIR [--workers N] [--lease 秒] [--wait]
+    python app.py queue status --spool DIR
+    python app.py watch <フォルダ...> --templates <テンプレート.json> [--workers N] [--output-dir DIR] [--process-existing]
+    python app.py rerender <編集ログ(.mosaic.json)、フォルダ...> [--workers N]
+"""
+import argparse
+from pathlib import Path
+import sys
+from typing import Optional
+
+from . import PROGRAM_NAME
+
+
+def default_config_path() -> Path:
+    """
+    既定の設定ファイルのパス
+    :return: アプリと同じフォルダの設定ファイル
+    """
+    return Path(__file__).resolve().parent.parent / f"{PROGRAM_NAME}.json"
+
+
+def load_presets(config_path: Path):
+    """
+    設定ファイルよりエフェクトのプリセットを読み込みます。
+    :param config_path: 設定ファイルのパス
+    :return: エフェクトのプリセット
+    """
+    from . app_config import AppConfig
+    return AppConfig(config_path).effect_presets
+
+
+def shard_argument(text: str) -> tuple[int, int]:
+    """
+    --shardの引数を解析します。
+    :param text: i/n形式
+    :return: シャード番号とシャード数
+    """
+    from . job_queue import parse_shard
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def create_batch_jobs(args: argparse.Namespace) -> list:
+    """
+    コマンドライン引数より処理内容を生成します。
+    :param args: コマンドライン引数
+    :return: 処理内容
+    """
+    from . batch import RegionSpec, create_jobs
+
+    presets = load_presets(args.config)
+    if args.regions:
+        spec = RegionSpec.load(args.regions, presets, args.preset)
+    else:
+        spec = RegionSpec({}, presets, args.preset)
+    jobs = create_jobs(args.inputs, spec, args.output_dir)
+    if args.shard:
+        from . job_queue import select_shard
+        jobs = select_shard(jobs, *args.shard)
+    if args.edit_log:
+        from dataclasses import replace
+        jobs = (replace(job, edit_log=True) for job in jobs)
+    return list(jobs)
+
+
+def command_batch(args: argparse.Namespace) -> int:
+    """
+    batchサブコマンド
+    :param args: コマンドライン引数
+    :return: 終了コード。エラーのファイルが存在する場合は1
+    """
+    from . batch import ProgressPrinter, run_batch
+
+    jobs = create_batch_jobs(args)
+    if not jobs:
+        print("No image files.", file=sys.stderr)
+        return 1
+
+    summary = run_batch(jobs, args.workers, None if args.quiet else ProgressPrinter(len(jobs)))
+    if not args.quiet:
+        print(file=sys.stderr)
+    for result in summary.failed:
+        print(f"ERROR {result.input_path}: {result.error}", file=sys.stderr)
+    print(summary)
+    return 1 if summary.failed else 0
+
+
+def command_pipe(args: argparse.Namespace) -> int:
+    """
+    pipeサブコマンド
+    標準入力のフレームにモザイクをかけ、標準出力に書き込みます。
+    :param args: コマンドライン引数
+    :return: 終了コード。エラーのフレームが存在する場合は1
+    """
+    from . batch import RegionSpec
+    from . pipeline import FrameError, run_pipeline
+
+    presets = load_presets(args.config)
+    if args.regions:
+        spec = RegionSpec.load(args.regions, presets, args.preset)
+    else:
+        spec = RegionSpec({}, presets, args.preset)
+    try:
+        summary = run_pipeline(sys.stdin.buffer, sys.stdout.buffer, spec, args.prefetch)
+    except FrameError as e:
+        print(f"ERROR {e}", file=sys.stderr)
+        return 2
+    if not args.quiet:
+        print(summary, file=sys.stderr)
+    return 1 if summary.failed else 0
+
+
+def command_serve(args: argparse.Namespace) -> int:
+    """
+    serveサブコマンド
+    モザイク処理のHTTPサーバーを起動します。
+    :param args: コマンドライン引数
+    :return: 終了コード
+    """
+    from . batch import RegionSpec
+    from . http_service import RedactionServer, serve
+
+    presets = load_presets(args.config)
+    if args.regions:
+        spec = RegionSpec.load(args.regions, presets, args.preset)
+    else:
+        spec = RegionSpec({}, presets, args.preset)
+    server = RedactionServer((args.host, args.port), spec, args.workers, args.queue, args.timeout, args.max_body_mb)
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port}/mosaic (workers:{server.max_workers}, queue:{server.max_queue})",
+          file=sys.stderr, flush=True)
+    serve(server)
+    return 0
+
+
+def command_queue(args: argparse.Namespace) -> int:
+    """
+    queueサブコマンド
+    共有フォルダのジョブキューへの登録(enqueue)、ジョブの処理(work)、状態の表示(status)を行います。
+    :param args: コマンドライン引数
+    :return: 終了コード。エラーのジョブが存在する場合は1
+    """
+    from . job_queue import JobQueue, run_local_workers
+
+    queue = JobQueue(args.spool, args.lease)
+    if args.action == "enqueue":
+        jobs = create_batch_jobs(args)
+        print(f"{queue.enqueue(jobs)}/{len(jobs)} jobs enqueued.", file=sys.stderr)
+        return 0
+    if args.action == "work":
+        summary = run_local_workers(args.spool, args.workers, args.lease, args.poll, args.wait)
+        print(summary)
+        return 1 if summary.failed else 0
+
+    print(", ".join(f"{name}:{count}" for name, count in queue.counts().items()))
+    failed = [result for result in queue.results() if not result.ok]
+    for result in failed:
+        print(f"ERROR {result.input_path}: {result.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def command_rerender(args: argparse.Namespace) -> int:
+    """
+    rerenderサブコマンド
+    編集ログ(サイドカー)を元の画像に再生し、出力ファイルを再生成します。
+    :param args: コマンドライン引数
+    :return: 終了コード。エラーのファイルが存在する場合は1
+    """
+    from . batch import ProgressPrinter, run_batch
+    from . edit_log import EditLog, iter_sidecars
+
+    jobs = []
+    errors = 0
+    for sidecar in iter_sidecars(args.inputs):
+        try:
+            jobs.append(EditLog.load(sidecar).to_job(sidecar))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"ERROR {sidecar}: {type(e).__name__}: {e}", file=sys.stderr)
+            errors += 1
+    if not jobs:
+        print("No edit logs.", file=sys.stderr)
+        return 1
+
+    summary = run_batch(jobs, args.workers, None if args.quiet else ProgressPrinter(len(jobs)))
+    if not args.quiet:
+        print(file=sys.stderr)
+    for result in summary.failed:
+        print(f"ERROR {result.input_path}: {result.error}", file=sys.stderr)
+    print(summary)
+    return 1 if summary.failed or errors else 0
+
+
+def command_watch(args: argparse.Namespace) -> int:
+    """
+    watchサブコマンド
+    監視フォルダに追加された画像に、領域テンプレートでモザイクをかけます。Ctrl+Cで終了します。
+    :param args: コマンドライン引数
+    :return: 終了コード
+    """
+    import signal
+    from . hot_folder import HotFolderDaemon, TemplateSet
+
+    templates = TemplateSet.load(args.templates, load_presets(args.config), args.preset)
+    daemon = HotFolderDaemon(args.folders, templates, args.output_dir, args.workers, args.interval, args.settle,
+                             args.process_existing)
+    # 処理中のファイルの完了を待ってから終了します。
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    print(f"Watching {', '.join(map(str, args.folders))} (workers:{daemon.max_workers})", file=sys.stderr, flush=True)
+    summary = daemon.run(None if args.quiet else print_watch_result)
+    print(summary, file=sys.stderr)
+    return 0
+
+
+def print_watch_result(result, summary):
+    """
+    watchサブコマンドの処理結果を1ファイル毎に表示します。
+    :param result: 処理結果
+    :param summary: 途中の集計結果
+    """
+    if result.ok:
+        print(f"{result.input_path} -> {result.output_path}", flush=True)
+    else:
+        print(f"ERROR {result.input_path}: {result.error}", file=sys.stderr, flush=True)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    コマンドライン引数の解析器を生成します。
+    :return: 解析器
+    """
+    # 全サブコマンド共通の引数
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", type=Path, default=default_config_path(), help="settings file (MosaicTool.json)")
+
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description="MosaicTool headless commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", parents=[common], help="apply mosaic to many files with a process pool")
+    batch.add_argument("inputs", nargs="+", help="image files, folders or glob patterns")
+    batch.add_argument("--regions", type=Path, help="region spec JSON (rectangles and preset per file or glob)")
+    batch.add_argument("--preset", default="", help="default preset name (e.g. mosaic_16, mosaic_auto)")
+    batch.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    batch.add_argument("--output-dir", default="", help="output folder (default: next to the input)")
+    batch.add_argument("--shard", type=shard_argument, help="process only shard i of n (0 <= i < n, by path CRC32)")
+    batch.add_argument("--edit-log", action="store_true", help="write an edit log (<output>.mosaic.json) per output")
+    batch.add_argument("--quiet", action="store_true", help="do not print progress")
+    batch.set_defaults(handler=command_batch)
+
+    pipe = subparsers.add_parser("pipe", parents=[common],
+                                 help="read framed images from stdin and write framed results to stdout")
+    pipe.add_argument("--regions", type=Path, help="default region spec JSON when a frame header has no regions")
+    pipe.add_argument("--preset", default="", help="default preset name (e.g. mosaic_16, mosaic_auto)")
+    pipe.add_argument("--prefetch", type=int, default=2, help="number of frames decoded ahead (default: 2)")
+    pipe.add_argument("--quiet", action="store_true", help="do not print the summary")
+    pipe.set_defaults(handler=command_pipe)
+
+    http = subparsers.add_parser("serve", parents=[common], help="run a local HTTP service (POST /mosaic)")
+    http.add_argument("--host", default="127.0.0.1", help="bind address (default: loopback only)")
+    http.add_argument("--port", type=int, default=8765, help="port number (0: any free port)")
+    http.add_argument("--regions", type=Path, help="default region spec JSON when a request has no regions")
+    http.add_argument("--preset", default="", help="default preset name (e.g. mosaic_16, mosaic_auto)")
+    http.add_argument("--workers", type=int, default=None, help="number of worker threads (default: CPU count)")
+    http.add_argument("--queue", type=int, default=16, help="requests waiting for a worker before 503 (default: 16)")
+    http.add_argument("--timeout", type=float, default=30.0, help="processing timeout per request in seconds")
+    http.add_argument("--max-body-mb", type=int, default=64, help="maximum request body size in MB")
+    http.set_defaults(handler=command_serve)
+
+    queue = subparsers.add_parser("queue", help="distributed job queue in a shared spool folder")
+    actions = queue.add_subparsers(dest="action", required=True)
+    spool = argparse.ArgumentParser(add_help=False, parents=[common])
+    spool.add_argument("--spool", type=Path, required=True, help="spool folder shared by all hosts")
+    spool.add_argument("--lease", type=float, default=300.0, help="seconds before a stalled job is reclaimed")
+    enqueue = actions.add_parser("enqueue", parents=[spool], help="add image files to the queue")
+    enqueue.add_argument("inputs", nargs="+", help="image files, folders or glob patterns")
+    enqueue.add_argument("--regions", type=Path, help="region spec JSON (rectangles and preset per file or glob)")
+    enqueue.add_argument("--preset", default="", help="default preset name (e.g. mosaic_16, mosaic_auto)")
+    enqueue.add_argument("--output-dir", default="", help="output folder (default: next to the input)")
+    enqueue.add_argument("--shard", type=shard_argument, help="enqueue only shard i of n")
+    enqueue.add_argument("--edit-log", action="store_true", help="write an edit log (<output>.mosaic.json) per output")
+    work = actions.add_parser("work", parents=[spool], help="claim and process jobs")
+    work.add_argument("--workers", type=int, default=1, help="number of worker processes on this host")
+    work.add_argument("--poll", type=float, default=1.0, help="seconds between polls when the queue is empty")
+    work.add_argument("--wait", action="store_true", help="keep waiting for new jobs instead of exiting")
+    actions.add_parser("status", parents=[spool], help="print job counts and errors")
+    queue.set_defaults(handler=command_queue)
+
+    watch = subparsers.add_parser("watch", parents=[common], help="apply region templates to files added to folders")
+    watch.add_argument("folders", nargs="+", type=Path, help="folders to watch")
+    watch.add_argument("--templates", type=Path, required=True, help="region template JSON")
+    watch.add_argument("--preset", default="", help="default preset name (e.g. mosaic_16, mosaic_auto)")
+    watch.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    watch.add_argument("--output-dir", default="", help="output folder (default: <folder>_mosaic)")
+    watch.add_argument("--interval", type=float, default=0.25, help="polling interval in seconds")
+    watch.add_argument("--settle", type=float, default=1.0, help="seconds a file must stay unchanged before processing")
+    watch.add_argument("--process-existing", action="store_true",
+                       help="also process files already in the folders when watching starts")
+    watch.add_argument("--quiet", action="store_true", help="do not print each processed file")
+    watch.set_defaults(handler=command_watch)
+
+    rerender = subparsers.add_parser("rerender", parents=[common],
+                                     help="re-render outputs by replaying edit logs on the original images")
+    rerender.add_argument("inputs", nargs="+", help="edit logs (*.mosaic.json) or folders to search")
+    rerender.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    rerender.add_argument("--quiet", action="store_true", help="do not print progress")
+    rerender.set_defaults(handler=command_rerender)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    サブコマンドを実行します。
+    :param argv: コマンドライン引数(サブコマンド以降)
+    :return: 終了コード
+    """
+    parser = build_parser()
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
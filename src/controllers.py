@@ -2,13 +2,18 @@
 """
     AppController
 """
+import asyncio
 from pathlib import Path
 from typing import Callable, Iterable, Optional
 import re
 
 from . app_config import AppConfig, FontSize, ThemeColors
-from . models import AppDataModel, StatusBarInfo, DATA_STATE
+from . models import AppDataModel, ImageList, StatusBarInfo, DATA_STATE, IMAGE_STATE, SORT_KEY
+from . async_service import AsyncImageService
+from . batch import BatchJob, BatchSummary, Rect
+from . decode_pool import ProcessDecodePool
 from . image_file_service import ImageFileService
+from . thumbnail_service import ThumbnailService
 from . utils import Stopwatch
 from . abstract_controllers import AbstractAppController
 from . widgets import MainPage
@@ -33,22 +38,33 @@ class AppController(AbstractAppController):
         self.model.data_saved_handler = self.handle_auto_save
         # アイコンフォルダ
         self._icons_path: Path
-
-    def add_file_path(self, file_path: Path) -> int:
+        # フィルムストリップのサムネイル
+        filmstrip = model.settings.get("filmstrip", {})
+        thumbnail_size = filmstrip.get("thumbnail_size", 96) if isinstance(filmstrip, dict) else 96
+        # 画像のデコード(backendがprocessの場合はワーカープロセスでデコードします。)
+        self._decode_pool = ProcessDecodePool.from_config(model.settings)
+        self._thumbnail_service = ThumbnailService(int(thumbnail_size), model.metadata_cache,
+                                                   decode_pool=self._decode_pool)
+        # 読み込み、保存などの非同期処理
+        self._async_service = AsyncImageService(cache=model.metadata_cache, decode_pool=self._decode_pool)
+
+    def add_file_paths(self, file_paths: Iterable[Path]) -> int:
         """
         ファイルをデータモデルに追加します。
         パスがディレクトリの場合は、ディレクトリ内のファイルも追加します。
-        :param file_path: 画像ファイルのパス
+        全てのファイルを1回で追加するため、複数のファイルのドロップ時も並列に読み込みます。
+        :param file_paths: 画像ファイルのパス
         :return: 追加件数
         """
-        if not file_path.is_dir():  # ファイルの場合
-            return self.model.add_images([file_path])
-
         files: list[Path] = []
-        for f in file_path.glob("*.*"):  # ディレクトリの場合
-            files.append(f)
-        if len(files) != 0:
-            self.model.save_directory = True
+        for file_path in file_paths:
+            if not file_path.is_dir():  # ファイルの場合
+                files.append(file_path)
+                continue
+            children = list(file_path.glob("*.*"))  # ディレクトリの場合
+            if len(children) != 0:
+                self.model.save_directory = True
+            files.extend(children)
         return self.model.add_images(files)
 
     def get_current_image(self) -> Optional[Path]:
@@ -57,6 +73,12 @@ class AppController(AbstractAppController):
         """
         return self.model.get_current_image()
 
+    def get_current_image_format(self) -> Optional[str]:
+        """
+        現在選択されている画像の画像形式(取り込み時に判定済み)
+        """
+        return self.model.get_current_image_format()
+
     def handle_drop(self, event):
         """
         ドロップ完了時に発生する。
@@ -73,6 +95,7 @@ class AppController(AbstractAppController):
 
         print(event_data)
         self.model.clear()
+        paths: list[Path] = []
         for match in re.finditer(self.drop_file_split, event_data):
             group = match.group()
             if not group:
@@ -80,10 +103,11 @@ class AppController(AbstractAppController):
 
             # 日本語が含まれるパスの場合{C:\画像パス}となるため除外する。
             f = group.rstrip(" {").rstrip("} ")
-            path = Path(f)
-            count += self.add_file_path(path)
+            paths.append(Path(f))
+        count = self.add_file_paths(paths)
 
         if count > 0:
+            self.sort_images()
             self.update_view(sw)
 
         self.view.set_status_message(f"received in drop files:{count}")
@@ -142,6 +166,40 @@ class AppController(AbstractAppController):
         self.model.next_image()
         self.update_view(sw)
 
+    def handle_jump_to_index(self, index: int):
+        """
+        指定したインデックスの画像に遷移します。
+        :param index: 画像一覧のインデックス
+        """
+        sw = Stopwatch.start_new()
+        if self.model.jump_to_index(index):
+            self.update_view(sw)
+
+    def handle_jump_to_file(self, file_path: Path):
+        """
+        指定したファイルの画像に遷移します。
+        :param file_path: 画像ファイルのパス
+        """
+        sw = Stopwatch.start_new()
+        if self.model.jump_to_file(file_path):
+            self.update_view(sw)
+
+    def handle_sort_images(self, key: SORT_KEY, reverse: bool = False):
+        """
+        画像一覧を並べ替えます。処理中の画像は変更しません。
+        :param key: 並び順
+        :param reverse: 降順時はTrue
+        """
+        self.model.sort_images(key, reverse)
+        self.update_status_bar_file_info()
+
+    def sort_images(self):
+        """
+        ファイル追加後に設定ファイルの並び順で画像一覧を並べ替え、先頭の画像を選択します。
+        """
+        self.model.sort_images(self.model.sort_key)
+        self.model.current = 0
+
     def on_show_file_property(self, event=None):
         """
         画像情報を表示するをクリック時
@@ -224,7 +282,125 @@ class AppController(AbstractAppController):
         画像のデータの状態を変更します。
         :param state: データの状態
         """
+        if self.model.data_state == state:
+            return
         self.model.data_state = state
+        self.view.update_filmstrip()
+
+    def handle_saved(self, file_path: Path):
+        """
+        モザイク画像の保存時に発生します。
+        :param file_path: 元画像のファイルパス
+        """
+        self.model.image_list.mark_saved(file_path)
+        self.view.update_filmstrip()
+
+    def handle_apply_to_all(self, event=None):
+        """
+        表示中の画像に適用した領域を、画像一覧の同じ大きさの画像にも適用して保存します。
+        :param event: イベント
+        """
+        current = self.model.get_current_image()
+        regions = self.view.get_applied_regions()
+        if current is None or not regions:
+            self.view.set_status_message("すべてに適用：モザイクを適用した領域がありません。")
+            return
+        self._async_service.spawn(self.apply_to_all(current, regions), key="apply_to_all")
+
+    async def apply_to_all(self, current: Path, regions: list[tuple[int, Rect]]) -> Optional[BatchSummary]:
+        """
+        同じ大きさの画像をプロセスプールで処理し、進捗画面を表示します。
+        :param current: 表示中の画像ファイルのパス
+        :param regions: 表示中の画像に適用した(セルサイズ, 領域)
+        :return: 集計結果。対象の画像がない場合、確認で取り消した場合はNone
+        """
+        size = (await self._async_service.metadata(current)).size
+        current_key = ImageList.normalize(current)
+        others = [file_path for file_path in self.model.image_list if ImageList.normalize(file_path) != current_key]
+        metadata = await asyncio.gather(*(self._async_service.metadata(f) for f in others), return_exceptions=True)
+        targets = [f for f, m in zip(others, metadata) if not isinstance(m, BaseException) and m.size == size]
+        if not targets:
+            self.view.set_status_message(f"すべてに適用：{size[0]}x{size[1]}の画像が他にありません。")
+            return None
+        if not self.view.confirm(f"{size[0]}x{size[1]}の画像{len(targets)}件に、{len(regions)}個の領域を適用して保存します。"):
+            return None
+
+        sw = Stopwatch.start_new()
+        dialog = self.view.show_progress("すべてに適用", len(targets), lambda: self._async_service.cancel("apply_to_all"))
+
+        def progress(result, summary: BatchSummary):
+            if result.ok:
+                self.handle_saved(Path(result.input_path))
+            dialog.update_progress(summary.total, Path(result.input_path).name)
+        try:
+            summary = await self._async_service.run_jobs(self.create_apply_to_all_jobs(targets, regions),
+                                                         progress=progress)
+        except asyncio.CancelledError:
+            self.view.set_status_message("すべてに適用：キャンセルしました。")
+            raise
+        finally:
+            dialog.close()
+        for result in summary.failed:
+            print(f"Error applying to all: {result.input_path} {result.error}")
+        self.view.set_status_message(f"すべてに適用：{summary.succeeded}/{summary.total}件保存しました。",
+                                     f"{sw.elapsed:.3f}s")
+        return summary
+
+    def create_apply_to_all_jobs(self, targets: Iterable[Path], regions: list[tuple[int, Rect]]) -> list[BatchJob]:
+        """
+        すべてに適用の処理内容を生成します。出力先は自動保存と同じ_mosaic_Nの名前です。
+        :param targets: 対象の画像ファイルのパス
+        :param regions: 表示中の画像に適用した(セルサイズ, 領域)
+        :return: 処理内容
+        """
+        cell_sizes = tuple(cell_size for cell_size, _ in regions)
+        rects = tuple(rect for _, rect in regions)
+        return [BatchJob(str(file_path), cell_sizes[0], rects, save_directory=self.model.save_directory,
+                         region_cell_sizes=cell_sizes) for file_path in targets]
+
+    def get_image_list(self) -> ImageList:
+        """
+        画像一覧を取得します。
+        """
+        return self.model.image_list
+
+    def get_current_index(self) -> int:
+        """
+        処理中の画像のインデックスを取得します。
+        """
+        return self.model.current
+
+    def get_image_state(self, index: int) -> IMAGE_STATE:
+        """
+        画像一覧の画像の状態を取得します。
+        :param index: 画像一覧のインデックス
+        """
+        return self.model.get_image_state(index)
+
+    @property
+    def thumbnail_service(self) -> ThumbnailService:
+        """
+        サムネイルの生成サービス
+        """
+        return self._thumbnail_service
+
+    @property
+    def async_service(self) -> AsyncImageService:
+        """
+        非同期の画像ファイル操作
+        """
+        return self._async_service
+
+    def close(self):
+        """
+        アプリの終了時に呼び出します。ワーカースレッドとキャッシュを終了します。
+        保存中の非同期処理は取り消しません。(AsyncImageService.acloseで完了を待ちます。)
+        """
+        self._async_service.cancel()
+        self._thumbnail_service.shutdown()
+        if self._decode_pool is not None:
+            self._decode_pool.shutdown()
+        self.model.close()
 
     def update_status_bar_file_info(self):
         """
@@ -238,17 +414,16 @@ class AppController(AbstractAppController):
         :param files: ファイル一覧
         """
         sw = Stopwatch.start_new()
-        count: int = 0  # カウントは画像件数
-        total: int = 0  # ファイル選択ダイアログより選択した件数(画像ファイル以外も含みます)
+        paths = [Path(file_path) for file_path in files]
+        total: int = len(paths)  # ファイル選択ダイアログより選択した件数(画像ファイル以外も含みます)
 
         self.model.clear()
-        for file_path in files:
-            count += self.add_file_path(Path(file_path))
-            total += 1
+        count: int = self.add_file_paths(paths)  # カウントは画像件数
         if count == 0:
             self.view.set_status_message("No image file selected")
             return
 
+        self.sort_images()
         self.update_view(sw)
         self.view.set_status_message(f"Select files:{count} / {total}")
 
@@ -296,7 +471,7 @@ class AppController(AbstractAppController):
         if file_path is None:
             return StatusBarInfo()
 
-        width, height = ImageFileService.get_image_size(file_path)
+        width, height = self.model.get_image_size(file_path)
 
         return StatusBarInfo(
             current=self.model.current + 1,
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+    core
+    画面(tkinter)に依存しない画像処理の部品
+    他のプログラムやワーカープロセスから、画面のモジュールを読み込まずに使用できます。
+
+    from src.core import MosaicEffect, ImageFileService
+
+    各部品は最初に参照した時点で読み込みます。import src.core のみではPILも読み込みません。
+    このパッケージ配下から tkinter、PIL.ImageTk を読み込まないでください。(test_core.pyで確認します。)
+"""
+from importlib import import_module
+from typing import Any
+
+# 公開する名前 → (モジュール名, 属性名)
+_EXPORTS: dict[str, tuple[str, str]] = {
+    # エフェクト
+    "MosaicEffect": ("..effects.image_effects", "MosaicEffect"),
+    "EffectPreset": ("..effects.image_effects", "EffectPreset"),
+    # 画像ファイル
+    "ImageFileService": ("..image_file_service", "ImageFileService"),
+    "SniffResult": ("..image_file_service", "SniffResult"),
+    "ImageFormat": ("..image_file_service", "ImageFormat"),
+    "EXTENSION_FORMATS": ("..image_file_service", "EXTENSION_FORMATS"),
+    # 出力ファイル名
+    "mosaic_filename": ("..image_file_service", "ImageFileService.mosaic_filename"),
+    "generate_new_filename": ("..image_file_service", "ImageFileService.generate_new_filename"),
+    # 設定
+    "AppConfig": ("..app_config", "AppConfig"),
+    # 領域の指定と一括処理
+    "Rect": ("..batch", "Rect"),
+    "RegionSpec": ("..batch", "RegionSpec"),
+    "apply_regions": ("..batch", "apply_regions"),
+    "BatchJob": ("..batch", "BatchJob"),
+    "process_job": ("..batch", "process_job"),
+    "run_batch": ("..batch", "run_batch"),
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    """
+    部品を最初に参照した時点で読み込みます。
+    :param name: 公開する名前
+    :return: クラス、関数など
+    """
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr_path = _EXPORTS[name]
+    value: Any = import_module(module_name, __name__)
+    for attr in attr_path.split("."):
+        value = getattr(value, attr)
+    globals()[name] = value  # 2回目以降は通常の属性として参照します。
+    return value
+
+
+def __dir__() -> list[str]:
+    """
+    公開する名前の一覧
+    :return: 名前の一覧
+    """
+    return sorted(set(globals()) | set(_EXPORTS))
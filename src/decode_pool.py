@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+    decode_pool
+    プロセスプールで画像をデコードし、共有メモリで画素を受け渡します。
+    PNGのzlib展開など、GILを保持したままのデコードを複数のCPUで並列に実行します。
+
+    ワーカープロセスは画素を共有メモリのブロックに直接書き込み、呼び出し側はImage.frombufferで
+    コピーせずに参照します。ブロックはプールに返却して再利用します。
+    Image.Imageはpickle化できないため、プロセス間ではファイルパス、ブロック名、画像の形式のみを受け渡します。
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+import weakref
+
+from PIL import Image
+
+# ブロックの大きさの単位(バイト)
+BLOCK_UNIT: int = 1024 * 1024
+
+# 画像のモード → (共有メモリに書き込むモード, 1画素のバイト数)
+# Image.frombufferがコピーせずに参照できるモードを使用します。RGBは4バイト境界のRGBXで受け渡します。
+SHARED_LAYOUTS: dict[str, tuple[str, int]] = {
+    "L": ("L", 1),
+    "RGB": ("RGBX", 4),
+    "RGBA": ("RGBA", 4),
+    "CMYK": ("CMYK", 4),
+    "I;16": ("I;16", 2),
+}
+
+
+def shared_mode(image: Image.Image) -> str:
+    """
+    共有メモリで受け渡す画像のモードを決定します。対応していないモードは変換します。
+    :param image: 画像(ヘッダーのみ読み込んだ状態で可)
+    :return: 画像のモード
+    """
+    if image.mode in SHARED_LAYOUTS:
+        return image.mode
+    if image.mode in ("1", "I", "F"):
+        return "L" if image.mode == "1" else "RGB"
+    if image.mode in ("LA", "PA", "RGBa", "La") or "transparency" in image.info:
+        return "RGBA"
+    return "RGB"
+
+
+def required_bytes(mode: str, size: tuple[int, int]) -> int:
+    """
+    共有メモリに必要なバイト数
+    :param mode: shared_modeで決定した画像のモード
+    :param size: 画像の大きさ
+    :return: バイト数
+    """
+    return size[0] * size[1] * SHARED_LAYOUTS[mode][1]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    ワーカープロセスで共有メモリのブロックを開きます。
+    ブロックは呼び出し側のプロセスで管理するため、追跡の対象外にします。
+    Python 3.12以前は、spawnで起動したワーカープロセスは呼び出し側と同じresource_trackerを共有するため、
+    登録済みのブロックの再登録は無視されます。(登録を解除すると、呼び出し側の登録も解除されます。)
+    :param name: ブロック名
+    :return: 共有メモリ
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    except TypeError:  # Python 3.12以前
+        return shared_memory.SharedMemory(name=name)
+
+
+def _paste_into(image: Image.Image, buffer: memoryview, raw_mode: str):
+    """
+    共有メモリを参照する画像に画素を貼り付けます。(tobytesによる中間のバイト列を作りません。)
+    RGBとRGBXは1画素4バイトの同じ内部表現のため、変換せずに貼り付けます。
+    :param image: 画像
+    :param buffer: 共有メモリのブロック
+    :param raw_mode: 共有メモリに書き込むモード
+    """
+    target = Image.frombuffer(raw_mode, image.size, buffer, "raw", raw_mode, 0, 1)
+    target.readonly = False  # 書き込み時に複製せず、共有メモリに書き込みます。
+    target.im.paste(image.im, (0, 0) + image.size)
+
+
+def decode_into(file_path: str, block_name: str, capacity: int) -> tuple[str, tuple[int, int], int]:
+    """
+    画像をデコードし、共有メモリのブロックに書き込みます。ワーカープロセスで実行します。
+    :param file_path: 画像ファイルのパス
+    :param block_name: 共有メモリのブロック名
+    :param capacity: ブロックの大きさ
+    :return: 画像のモード、大きさ、必要なバイト数。必要なバイト数がcapacityを超える場合は書き込みません。
+    """
+    with Image.open(file_path) as image:
+        mode = shared_mode(image)
+        image.load()
+        if image.mode != mode:
+            image = image.convert(mode)
+        nbytes = required_bytes(mode, image.size)
+        if nbytes > capacity:
+            return mode, image.size, nbytes
+        block = _attach(block_name)
+        try:
+            _paste_into(image, block.buf[:nbytes], SHARED_LAYOUTS[mode][0])
+        finally:
+            block.close()
+        return mode, image.size, nbytes
+
+
+class SharedBlockPool:
+    """
+    共有メモリのブロックのプール
+    返却されたブロックは、同程度の大きさの要求に再利用します。
+    """
+    def __init__(self, max_idle_bytes: int = 512 * 1024 * 1024):
+        """
+        コンストラクタ
+        :param max_idle_bytes: 未使用のまま保持するブロックの合計の上限
+        """
+        self.max_idle_bytes = max_idle_bytes
+        self._lock = Lock()
+        self._idle: list[shared_memory.SharedMemory] = []
+        self._blocks: dict[str, shared_memory.SharedMemory] = {}  # 作成した全てのブロック
+
+    def acquire(self, nbytes: int) -> shared_memory.SharedMemory:
+        """
+        ブロックを取得します。nbytes以上、nbytesの2倍以下の未使用のブロックがない場合は作成します。
+        :param nbytes: 必要なバイト数
+        :return: 共有メモリのブロック
+        """
+        size = max(BLOCK_UNIT, -(-nbytes // BLOCK_UNIT) * BLOCK_UNIT)
+        with self._lock:
+            candidates = [block for block in self._idle if size <= block.size <= size * 2]
+            if candidates:
+                block = min(candidates, key=lambda b: b.size)
+                self._idle.remove(block)
+                return block
+        block = shared_memory.SharedMemory(create=True, size=size)
+        with self._lock:
+            self._blocks[block.name] = block
+        return block
+
+    def release(self, block: shared_memory.SharedMemory):
+        """
+        ブロックを返却します。未使用のブロックの合計が上限を超える場合は、古いものから削除します。
+        :param block: 共有メモリのブロック
+        """
+        with self._lock:
+            if block.name not in self._blocks:
+                return  # 終了済み
+            self._idle.append(block)
+            while sum(b.size for b in self._idle) > self.max_idle_bytes:
+                self._destroy(self._idle.pop(0))
+
+    @property
+    def idle_bytes(self) -> int:
+        """
+        未使用のブロックの合計バイト数
+        """
+        with self._lock:
+            return sum(block.size for block in self._idle)
+
+    def _destroy(self, block: shared_memory.SharedMemory):
+        """
+        ブロックを削除します。
+        :param block: 共有メモリのブロック
+        """
+        self._blocks.pop(block.name, None)
+        try:
+            block.close()
+        except BufferError:
+            pass  # 参照中の画像が残っている場合は、画像の破棄時に解放されます。
+        block.unlink()
+
+    def close(self):
+        """
+        全てのブロックを削除します。
+        """
+        with self._lock:
+            for block in list(self._blocks.values()):
+                self._destroy(block)
+            self._idle.clear()
+
+
+class SharedImage:
+    """
+    共有メモリを参照する画像
+    imageはコピーせずにブロックを参照する読み取り専用の画像です。書き込むと複製されます。
+    release後、またはwithブロックを抜けた後はimageを使用しないでください。
+    返却しなかった場合は、imageの破棄時にブロックを返却します。
+    """
+    def __init__(self, image: Image.Image, block: shared_memory.SharedMemory, pool: SharedBlockPool):
+        """
+        コンストラクタ
+        :param image: 画像(RGBの画像はRGBXモード)
+        :param block: 共有メモリのブロック
+        :param pool: 返却先のプール
+        """
+        self.image = image
+        self.block = block
+        self._finalizer = weakref.finalize(image, pool.release, block)
+
+    def release(self):
+        """
+        ブロックをプールに返却します。2回目以降は何もしません。
+        """
+        self._finalizer()
+
+    def detach(self) -> Image.Image:
+        """
+        ブロックを参照しない画像を取得し、ブロックを返却します。
+        :return: 画像。RGBXはRGBに変換します。
+        """
+        image = self.image.convert("RGB") if self.image.mode == "RGBX" else self.image.copy()
+        self.release()
+        return image
+
+    def __enter__(self) -> Image.Image:
+        return self.image
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ProcessDecodePool:
+    """
+    プロセスプールによる画像のデコード
+    """
+    def __init__(self, max_workers: Optional[int] = None, max_idle_bytes: int = 512 * 1024 * 1024):
+        """
+        コンストラクタ
+        ワーカープロセスはspawnで起動します。(tkinterのスレッドを持つプロセスをforkしないため)
+        :param max_workers: ワーカープロセス数。Noneの場合はCPU数
+        :param max_idle_bytes: 未使用のまま保持する共有メモリの合計の上限
+        """
+        self.blocks = SharedBlockPool(max_idle_bytes)
+        self._executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                             mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def from_config(cls, settings) -> Optional['ProcessDecodePool']:
+        """
+        設定ファイルよりデコードのプロセスプールを生成します。backendにprocessを指定した場合のみ使用します。
+        :param settings: アプリの設定情報
+        :return: プロセスプール。threadの場合はNone
+        """
+        options = settings.get("decode", {})
+        if not isinstance(options, dict) or options.get("backend", "thread") != "process":
+            return None
+        return cls(max_workers=int(options.get("workers", 0)) or None,
+                   max_idle_bytes=int(options.get("pool_mb", 512)) * 1024 * 1024)
+
+    def decode(self, file_path: Path) -> SharedImage:
+        """
+        画像をワーカープロセスでデコードし、完了を待ちます。
+        :param file_path: 画像ファイルのパス
+        :return: 共有メモリを参照する画像
+        """
+        return self.submit(file_path).result()
+
+    def submit(self, file_path: Path) -> 'Future[SharedImage]':
+        """
+        画像のデコードをワーカープロセスに要求します。
+        :param file_path: 画像ファイルのパス
+        :return: 共有メモリを参照する画像のFuture
+        """
+        with Image.open(file_path) as header:  # ヘッダーのみ読み込み、必要なバイト数を見積もります。
+            nbytes = required_bytes(shared_mode(header), header.size)
+        result: Future[SharedImage] = Future()
+        self._submit(str(file_path), nbytes, result, retry=True)
+        return result
+
+    def _submit(self, file_path: str, nbytes: int, result: 'Future[SharedImage]', retry: bool):
+        """
+        ブロックを確保してワーカープロセスに要求します。
+        :param file_path: 画像ファイルのパス
+        :param nbytes: 必要なバイト数
+        :param result: 結果を設定するFuture
+        :param retry: 見積もりが不足した場合に、再要求するかどうか
+        """
+        block = self.blocks.acquire(nbytes)
+        future = self._executor.submit(decode_into, file_path, block.name, block.size)
+
+        def on_done(f: Future):
+            try:
+                mode, size, needed = f.result()
+                if needed > block.size:
+                    self.blocks.release(block)
+                    if retry:
+                        self._submit(file_path, needed, result, retry=False)
+                    else:
+                        result.set_exception(MemoryError(f"Shared block too small:{needed} bytes"))
+                    return
+                raw_mode = SHARED_LAYOUTS[mode][0]
+                image = Image.frombuffer(raw_mode, size, block.buf[:needed], "raw", raw_mode, 0, 1)
+                result.set_result(SharedImage(image, block, self.blocks))
+            except BaseException as e:
+                self.blocks.release(block)
+                result.set_exception(e)
+        future.add_done_callback(on_done)
+
+    def shutdown(self):
+        """
+        ワーカープロセスを終了し、共有メモリを削除します。
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.blocks.close()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+    EditHistory
+    モザイクの元に戻す、やり直し
+    画像全体ではなく、変更する矩形の変更前の画素のみをzlibで圧縮して保持し、貼り付けて復元します。
+    保持する画素の合計が上限を超えた場合は、古い操作から破棄します。
+    ブラシのように複数の矩形を変更する操作は、矩形毎の画素をSnapshotGroupにまとめて1回の操作として記録します。
+"""
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+import zlib
+
+from PIL import Image
+
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Box = tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class RegionSnapshot:
+    """
+    画像の矩形の画素
+    """
+    box: Box  # 画像上の矩形
+    mode: str  # 画像のモード
+    data: bytes  # zlibで圧縮した画素
+
+    @classmethod
+    def capture(cls, image: Image.Image, box: Box, level: int = 1) -> 'RegionSnapshot':
+        """
+        画像の矩形の画素を保存します。
+        :param image: 画像
+        :param box: 矩形。画像の範囲に切り詰めます。
+        :param level: zlibの圧縮レベル(速度を優先して既定は1)
+        :return: 画素
+        """
+        left, top, right, bottom = box
+        box = (max(0, left), max(0, top), min(image.width, right), min(image.height, bottom))
+        return cls(box, image.mode, zlib.compress(image.crop(box).tobytes(), level))
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """
+        矩形の大きさ
+        :return: 幅, 高さ
+        """
+        return max(0, self.box[2] - self.box[0]), max(0, self.box[3] - self.box[1])
+
+    @property
+    def boxes(self) -> tuple[Box, ...]:
+        """
+        保存した矩形
+        :return: 矩形
+        """
+        return (self.box, )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        圧縮済みの画素のバイト数
+        :return: バイト数
+        """
+        return len(self.data)
+
+    def recapture(self, image: Image.Image) -> 'RegionSnapshot':
+        """
+        同じ矩形の現在の画素を保存します。
+        :param image: 画像
+        :return: 画素
+        """
+        return RegionSnapshot.capture(image, self.box)
+
+    def restore(self, image: Image.Image, mask: Optional[Image.Image] = None):
+        """
+        保存した画素を画像に貼り付けます。
+        :param image: 画像(保存時と同じモード)
+        :param mask: 貼り付ける画素のマスク(矩形と同じ大きさ)。Noneは矩形全体
+        """
+        if self.size[0] == 0 or self.size[1] == 0:
+            return
+        patch = Image.frombytes(self.mode, self.size, zlib.decompress(self.data))
+        image.paste(patch, self.box[:2], mask)
+
+
+@dataclass(frozen=True)
+class SnapshotGroup:
+    """
+    1回の操作で変更した複数の矩形の画素
+    """
+    snapshots: tuple[RegionSnapshot, ...]  # 変更した順序の矩形の画素
+
+    @property
+    def box(self) -> Box:
+        """
+        全ての矩形を含む矩形
+        :return: 矩形
+        """
+        boxes = self.boxes
+        if not boxes:
+            return 0, 0, 0, 0
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    @property
+    def boxes(self) -> tuple[Box, ...]:
+        """
+        保存した矩形
+        :return: 矩形
+        """
+        return tuple(snapshot.box for snapshot in self.snapshots)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        圧縮済みの画素のバイト数
+        :return: バイト数
+        """
+        return sum(snapshot.nbytes for snapshot in self.snapshots)
+
+    def recapture(self, image: Image.Image) -> 'SnapshotGroup':
+        """
+        同じ矩形の現在の画素を保存します。
+        :param image: 画像
+        :return: 画素
+        """
+        return SnapshotGroup(tuple(snapshot.recapture(image) for snapshot in self.snapshots))
+
+    def restore(self, image: Image.Image):
+        """
+        保存した画素を、変更した順序の逆順に貼り付けます。(矩形が重なる場合は、最初の変更前の画素に戻ります。)
+        :param image: 画像
+        """
+        for snapshot in reversed(self.snapshots):
+            snapshot.restore(image)
+
+
+@dataclass(frozen=True)
+class EditStep:
+    """
+    1回の操作
+    """
+    snapshot: Union[RegionSnapshot, SnapshotGroup]  # 元に戻す場合は変更前、やり直す場合は変更後の画素
+    payload: Any = None  # 操作の内容(適用したモザイクの領域など)
+
+
+class EditHistory:
+    """
+    元に戻す、やり直しの履歴
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        """
+        コンストラクタ
+        :param max_bytes: 保持する圧縮済みの画素の合計の上限
+        """
+        self.max_bytes = max_bytes
+        self.undo_steps: deque[EditStep] = deque()
+        self.redo_steps: deque[EditStep] = deque()
+        self.total_bytes = 0
+
+    def push(self, snapshot: Union[RegionSnapshot, SnapshotGroup], payload: Any = None):
+        """
+        操作を記録します。やり直しの履歴は破棄します。
+        :param snapshot: 変更前の画素(操作の前にRegionSnapshot.captureで保存します。)
+        :param payload: 操作の内容
+        """
+        for step in self.redo_steps:
+            self.total_bytes -= step.snapshot.nbytes
+        self.redo_steps.clear()
+        self.undo_steps.append(EditStep(snapshot, payload))
+        self.total_bytes += snapshot.nbytes
+        self.evict()
+
+    def undo(self, image: Image.Image) -> Optional[EditStep]:
+        """
+        最後の操作を元に戻します。
+        :param image: 画像
+        :return: 元に戻した操作。履歴がない場合はNone
+        """
+        return self._swap(image, self.undo_steps, self.redo_steps)
+
+    def redo(self, image: Image.Image) -> Optional[EditStep]:
+        """
+        元に戻した操作をやり直します。
+        :param image: 画像
+        :return: やり直した操作。履歴がない場合はNone
+        """
+        return self._swap(image, self.redo_steps, self.undo_steps)
+
+    def _swap(self, image: Image.Image, source: deque[EditStep], target: deque[EditStep]) -> Optional[EditStep]:
+        """
+        現在の画素を保存してから、記録した画素を復元し、反対側の履歴に移します。
+        :param image: 画像
+        :param source: 復元する履歴
+        :param target: 現在の画素を記録する履歴
+        :return: 復元した操作
+        """
+        if not source:
+            return None
+        step = source.pop()
+        current = step.snapshot.recapture(image)
+        step.snapshot.restore(image)
+        target.append(EditStep(current, step.payload))
+        self.total_bytes += current.nbytes - step.snapshot.nbytes
+        self.evict()
+        return step
+
+    def evict(self):
+        """
+        上限を超えた場合、古い操作から破棄します。1件のみの場合は上限を超えても保持します。
+        """
+        while self.total_bytes > self.max_bytes and len(self.undo_steps) + len(self.redo_steps) > 1:
+            # 元に戻す履歴の先頭は最も古い操作、やり直しの履歴の先頭は現在の状態から最も遠い操作です。
+            step = (self.undo_steps if self.undo_steps else self.redo_steps).popleft()
+            self.total_bytes -= step.snapshot.nbytes
+
+    def clear(self):
+        """
+        全ての履歴を破棄します。
+        """
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.total_bytes = 0
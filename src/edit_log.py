@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+    edit_log
+    モザイクの編集ログ
+    適用したモザイクの領域、セルサイズ、セルの値の計算方法、格子の原点を適用した順序で記録し、
+    出力ファイルの隣にサイドカー(<出力ファイル名>.mosaic.json)として保存します。
+    元の画像にログを再生すると、同じ出力(ビット単位で一致)を再生成できます。
+"""
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+from PIL import Image
+
+from . effects.image_effects import MosaicEffect
+
+if TYPE_CHECKING:
+    from . batch import BatchJob
+
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Rect = tuple[int, int, int, int]
+
+EDIT_LOG_VERSION = 1
+# サイドカーの拡張子
+SIDECAR_SUFFIX = ".mosaic.json"
+# セルの値の計算方法。mean: セル内の平均値(Image.Resampling.BOX)
+STATISTICS = ("mean", )
+# セルの格子の原点。region: 領域の左上
+ANCHORS = ("region", )
+
+
+def sidecar_path(output_path: Path) -> Path:
+    """
+    出力ファイルのサイドカーのパス
+    :param output_path: 出力ファイルのパス
+    :return: サイドカーのパス
+    """
+    return output_path.with_name(output_path.name + SIDECAR_SUFFIX)
+
+
+def output_path_of(sidecar: Path) -> Path:
+    """
+    サイドカーの出力ファイルのパス
+    :param sidecar: サイドカーのパス
+    :return: 出力ファイルのパス
+    """
+    if not sidecar.name.endswith(SIDECAR_SUFFIX):
+        raise ValueError(f"not an edit log: {sidecar}")
+    return sidecar.with_name(sidecar.name[:-len(SIDECAR_SUFFIX)])
+
+
+def iter_sidecars(inputs: Iterable[str]) -> Iterator[Path]:
+    """
+    サイドカーのファイル、フォルダよりサイドカーを列挙します。フォルダはサブフォルダも探索します。
+    :param inputs: ファイル、フォルダ
+    :return: サイドカーのパス
+    """
+    for text in inputs:
+        path = Path(text)
+        if path.is_dir():
+            yield from sorted(path.rglob(f"*{SIDECAR_SUFFIX}"))
+        else:
+            yield path
+
+
+@dataclass(frozen=True)
+class EditRecord:
+    """
+    1回のモザイクの適用
+    """
+    rect: Rect  # 元の画像の領域
+    cell_size: int  # セルサイズ(自動計算の場合は計算後の値)
+    statistic: str = "mean"  # セルの値の計算方法
+    anchor: str = "region"  # セルの格子の原点
+
+    def __post_init__(self):
+        if self.statistic not in STATISTICS:
+            raise ValueError(f"unsupported statistic:{self.statistic}")
+        if self.anchor not in ANCHORS:
+            raise ValueError(f"unsupported anchor:{self.anchor}")
+        if self.cell_size < MosaicEffect.MIN_CELL_SIZE:
+            raise ValueError(f"cell_size:{self.cell_size}")
+
+    def apply(self, image: Image.Image) -> bool:
+        """
+        画像の範囲内に切り詰めた領域にモザイクを適用します。
+        切り詰めた幅または高さがセルサイズ未満の領域は、一括処理と同じくスキップします。
+        :param image: 元の画像
+        :return: モザイクをかけたかどうか
+        """
+        x0, y0, x1, y1 = self.rect
+        x0, x1 = max(0, x0), min(image.width, x1)
+        y0, y1 = max(0, y0), min(image.height, y1)
+        if x1 - x0 < self.cell_size or y1 - y0 < self.cell_size:
+            return False
+        return MosaicEffect(self.cell_size).apply(image, x0, y0, x1, y1)
+
+
+@dataclass
+class EditLog:
+    """
+    1つの出力ファイルの編集ログ
+    """
+    source: str  # 元の画像のパス(サイドカーのフォルダからの相対パス、または絶対パス)
+    size: tuple[int, int]  # 元の画像の大きさ
+    records: list[EditRecord] = field(default_factory=list)
+
+    def add(self, rect: Rect, cell_size: int):
+        """
+        適用したモザイクを記録します。
+        :param rect: 元の画像の領域
+        :param cell_size: セルサイズ
+        """
+        self.records.append(EditRecord(tuple(rect), cell_size))
+
+    def replay(self, image: Image.Image) -> bool:
+        """
+        元の画像に、記録した順序でモザイクを適用します。
+        :param image: 元の画像
+        :return: いずれかの領域にモザイクをかけたかどうか
+        """
+        if image.size != self.size:
+            raise ValueError(f"image size {image.size} does not match the edit log {self.size}")
+        is_apply = False
+        for record in self.records:
+            is_apply |= record.apply(image)
+        return is_apply
+
+    def source_path(self, sidecar: Path) -> Path:
+        """
+        元の画像のパス
+        :param sidecar: サイドカーのパス
+        :return: 元の画像のパス
+        """
+        return sidecar.parent / self.source
+
+    def to_job(self, sidecar: Path) -> 'BatchJob':
+        """
+        ログを再生して出力ファイルを再生成する処理内容
+        :param sidecar: サイドカーのパス
+        :return: 処理内容
+        """
+        from . batch import BatchJob
+        return BatchJob(str(self.source_path(sidecar)), MosaicEffect.AUTO,
+                        tuple(record.rect for record in self.records),
+                        output_path=str(output_path_of(sidecar)),
+                        region_cell_sizes=tuple(record.cell_size for record in self.records))
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        JSONに保存する辞書
+        :return: 辞書
+        """
+        return {
+            "version": EDIT_LOG_VERSION,
+            "source": self.source,
+            "size": list(self.size),
+            "records": [{"rect": list(record.rect), "cell_size": record.cell_size,
+                         "statistic": record.statistic, "anchor": record.anchor} for record in self.records],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'EditLog':
+        """
+        JSONより読み込んだ辞書から生成します。
+        :param data: 辞書
+        :return: 編集ログ
+        """
+        if data.get("version") != EDIT_LOG_VERSION:
+            raise ValueError(f"unsupported edit log version:{data.get('version')}")
+        records = [EditRecord(tuple(int(v) for v in item["rect"]), int(item["cell_size"]),
+                              item.get("statistic", "mean"), item.get("anchor", "region"))
+                   for item in data.get("records", [])]
+        width, height = data["size"]
+        return cls(str(data["source"]), (int(width), int(height)), records)
+
+    @classmethod
+    def create(cls, source_path: Path, output_path: Path, size: tuple[int, int]) -> 'EditLog':
+        """
+        出力ファイルの編集ログを生成します。元の画像のパスは、可能な場合はサイドカーからの相対パスで保持します。
+        :param source_path: 元の画像のパス
+        :param output_path: 出力ファイルのパス
+        :param size: 元の画像の大きさ
+        :return: 編集ログ
+        """
+        try:
+            source = os.path.relpath(source_path, output_path.parent)
+        except ValueError:  # Windowsでドライブが異なる場合
+            source = str(Path(source_path).resolve())
+        return cls(Path(source).as_posix(), size)
+
+    def save(self, output_path: Path) -> Path:
+        """
+        出力ファイルの隣にサイドカーを保存します。書き込み途中のファイルを読み込まないように、置き換えで保存します。
+        :param output_path: 出力ファイルのパス
+        :return: サイドカーのパス
+        """
+        path = sidecar_path(output_path)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, sidecar: Path) -> 'EditLog':
+        """
+        サイドカーを読み込みます。
+        :param sidecar: サイドカーのパス
+        :return: 編集ログ
+        """
+        with open(sidecar, encoding="utf-8") as file:
+            return cls.from_dict(json.load(file))
@@ -6,12 +6,15 @@ image_effects モジュール
 """
 from collections import OrderedDict
 from dataclasses import dataclass
-from decimal import Decimal
-from typing import Final, Optional, Any
+import math
+from typing import Final, Iterable, Optional, Any
 
-from PIL import Image
+from PIL import Image, ImageDraw
 
-from .. utils import round_up_decimal
+from . mask_shapes import Shape
+
+# 多角形、楕円の領域の被覆率を計算する、セルの一辺当たりのサンプル数
+SHAPE_SAMPLES: Final[int] = 4
 
 
 @dataclass(frozen=True)
@@ -36,6 +39,7 @@ class MosaicEffect:
     def apply(self, image: Image.Image, start_x: int, start_y: int, end_x: int, end_y: int) -> bool:
         """
         画像の指定された領域にモザイクを適用する
+        NumPy配列、バッファプロトコルのオブジェクトの場合は、apply_arrayで直接書き換えます。
         :param image: モザイクをかける画像
         :param start_x: モザイクをかける領域の左上X座標
         :param start_y: モザイクをかける領域の左上Y座標
@@ -55,6 +59,9 @@ class MosaicEffect:
         if self.cell_size < MosaicEffect.MIN_CELL_SIZE:
             raise ValueError(f"MosaicEffect cell_size:{self.cell_size}")
 
+        if not isinstance(image, Image.Image):
+            return self.apply_array_region(self.as_pixel_array(image), start_x, start_y, end_x, end_y)
+
         # 指定された領域にモザイク効果を適用
         region = self.apply_mosaic_to_region(image, start_x, start_y, end_x, end_y, region_width, region_height)
 
@@ -62,6 +69,162 @@ class MosaicEffect:
         image.paste(region, (start_x, start_y, start_x + region.width, start_y + region.height))
         return True
 
+    def apply_proxy(self, proxy: Image.Image, scale: tuple[float, float],
+                    start_x: int, start_y: int, end_x: int, end_y: int) -> Optional[tuple[int, int, int, int]]:
+        """
+        縮小した作業用画像(プロキシ)に、元の画像の領域にモザイクをかけた結果を描画します。
+        セルの数と位置は元の画像で計算するため、元の画像にapplyした結果を縮小した表示とほぼ一致します。
+        :param proxy: 作業用画像
+        :param scale: 元の画像に対する作業用画像の倍率(横, 縦)
+        :param start_x: 元の画像の領域の左上X座標
+        :param start_y: 元の画像の領域の左上Y座標
+        :param end_x: 元の画像の領域の右下X座標
+        :param end_y: 元の画像の領域の右下Y座標
+        :return: 作業用画像の変更した領域。セルが1つもない場合はNone
+        """
+        columns = (end_x - start_x) // self.cell_size
+        rows = (end_y - start_y) // self.cell_size
+        if columns <= 0 or rows <= 0:
+            return None
+        scale_x, scale_y = scale
+        cells = proxy.resize((columns, rows), Image.Resampling.BOX,
+                             box=(start_x * scale_x, start_y * scale_y,
+                                  min(proxy.width, end_x * scale_x), min(proxy.height, end_y * scale_y)))
+        left, top = round(start_x * scale_x), round(start_y * scale_y)
+        right = max(left + 1, round((start_x + columns * self.cell_size) * scale_x))
+        bottom = max(top + 1, round((start_y + rows * self.cell_size) * scale_y))
+        proxy.paste(cells.resize((right - left, bottom - top), Image.Resampling.NEAREST), (left, top))
+        return left, top, right, bottom
+
+    def shape_cells(self, size: tuple[int, int], shapes: Iterable[Shape],
+                    threshold: float = 0.5) -> Optional[tuple[tuple[int, int, int, int], Image.Image]]:
+        """
+        多角形、楕円の領域が覆うセルを求めます。セルは画像の左上を原点とする格子に揃え、画像の端の余りは含みません。
+        全ての領域を、セル毎にSHAPE_SAMPLES×SHAPE_SAMPLESの点のマスクに描画し、縮小した被覆率でセルを選択します。
+        :param size: 画像の大きさ
+        :param shapes: 領域
+        :param threshold: セルを選択する被覆率の下限(0.0～1.0)
+        :return: セルの格子に揃えた矩形と、矩形内のセル毎のLモードのマスク(選択したセルは255)。セルがない場合はNone
+        """
+        if self.cell_size < MosaicEffect.MIN_CELL_SIZE:
+            raise ValueError(f"MosaicEffect cell_size:{self.cell_size}")
+        shapes = list(shapes)
+        bounds = [shape.bounds for shape in shapes]
+        if not bounds:
+            return None
+        cell = self.cell_size
+        first_column = max(0, min(box[0] for box in bounds) // cell)
+        first_row = max(0, min(box[1] for box in bounds) // cell)
+        last_column = min(size[0] // cell, -(-max(box[2] for box in bounds) // cell))
+        last_row = min(size[1] // cell, -(-max(box[3] for box in bounds) // cell))
+        if last_column <= first_column or last_row <= first_row:
+            return None
+
+        samples = min(cell, SHAPE_SAMPLES)
+        mask = Image.new("L", ((last_column - first_column) * samples, (last_row - first_row) * samples))
+        draw = ImageDraw.Draw(mask)
+        for shape in shapes:
+            shape.draw(draw, samples / cell, (first_column * cell, first_row * cell))
+        if samples > 1:
+            mask = mask.reduce(samples)  # セル毎の被覆率(0～255)
+        level = max(1, math.ceil(threshold * 255))
+        cells = mask.point(lambda value: 255 if value >= level else 0)
+        if cells.getbbox() is None:
+            return None
+        return (first_column * cell, first_row * cell, last_column * cell, last_row * cell), cells
+
+    def apply_cells(self, image: Any, box: tuple[int, int, int, int], cells: Image.Image) -> bool:
+        """
+        セルの格子に揃えた矩形のうち、マスクで選択したセルのみをセル毎の平均値で塗りつぶします。
+        NumPy配列、バッファプロトコルのオブジェクトの場合は、apply_array_cellsで直接書き換えます。
+        :param image: モザイクをかける画像
+        :param box: セルの格子に揃えた矩形
+        :param cells: 矩形内のセル毎のLモードのマスク(shape_cellsの戻り値)
+        :return: モザイクをかけたかどうか
+        """
+        if not isinstance(image, Image.Image):
+            return self.apply_array_cells(self.as_pixel_array(image), box, cells)
+        region = image.crop(box)
+        # 矩形全体をセルの数に縮小して拡大し、選択したセルのみを貼り付けます。
+        mosaic = region.resize(cells.size, Image.Resampling.BOX).resize(region.size, Image.Resampling.NEAREST)
+        image.paste(mosaic, box[:2], cells.resize(region.size, Image.Resampling.NEAREST))
+        return True
+
+    def apply_array_cells(self, view: Any, box: tuple[int, int, int, int], cells: Image.Image) -> bool:
+        """
+        (高さ, 幅, チャンネル数)のNumPy配列の、マスクで選択したセルのみをセル毎の平均値で塗りつぶします。
+        選択したセルのみを1回の集計で平均します。
+        :param view: NumPy配列
+        :param box: セルの格子に揃えた矩形
+        :param cells: 矩形内のセル毎のLモードのマスク
+        :return: モザイクをかけたかどうか
+        """
+        import numpy as np
+
+        cell = self.cell_size
+        left, top, right, bottom = box
+        channels = view.shape[2]
+        # (行, 列, セルの高さ, セルの幅, チャンネル数)のビュー(コピーしません)
+        blocks = view[top:bottom, left:right].reshape(cells.height, cell, cells.width, cell, channels).swapaxes(1, 2)
+        selected = np.asarray(cells) > 0
+        if view.dtype == np.float32:
+            sum_dtype: Any = np.float64
+        elif view.dtype == np.uint8:
+            sum_dtype = np.uint32
+        else:
+            sum_dtype = np.int64
+        means = blocks[selected].sum(axis=(1, 2), dtype=sum_dtype) / (cell * cell)
+        if view.dtype != np.float32:
+            means = np.floor(means + 0.5)  # 整数型は四捨五入します。
+        blocks[selected] = means.astype(view.dtype)[:, np.newaxis, np.newaxis, :]
+        return bool(selected.any())
+
+    def cell_runs(self, box: tuple[int, int, int, int], cells: Image.Image) -> list[tuple[int, int, int, int]]:
+        """
+        選択したセルを、行毎に連続するセルの矩形にまとめます。
+        矩形はセルの格子に揃っているため、各矩形にapplyした結果は、apply_cellsの結果と一致します。(編集ログに記録できます。)
+        :param box: セルの格子に揃えた矩形
+        :param cells: 矩形内のセル毎のLモードのマスク
+        :return: 画像の矩形
+        """
+        cell = self.cell_size
+        width = cells.width
+        data = cells.tobytes()
+        rects = []
+        for row in range(cells.height):
+            line = data[row * width:(row + 1) * width]
+            top = box[1] + row * cell
+            start = line.find(b"\xff")
+            while start >= 0:
+                end = line.find(b"\x00", start)
+                if end < 0:
+                    end = width
+                rects.append((box[0] + start * cell, top, box[0] + end * cell, top + cell))
+                start = line.find(b"\xff", end)
+        return rects
+
+    def apply_shapes(self, image: Any, shapes: Iterable[Shape],
+                     threshold: float = 0.5) -> list[tuple[int, int, int, int]]:
+        """
+        多角形、楕円の領域に、被覆率がthreshold以上のセルのみモザイクをかけます。
+        全ての領域を1つのマスクに描画し、1回の処理で適用します。
+        :param image: モザイクをかける画像
+        :param shapes: 領域
+        :param threshold: セルを選択する被覆率の下限(0.0～1.0)
+        :return: モザイクをかけたセルを行毎にまとめた矩形。セルがない場合は空
+        """
+        if isinstance(image, Image.Image):
+            size = image.size
+        else:
+            height, width, _ = self.as_pixel_array(image).shape
+            size = (width, height)
+        cover = self.shape_cells(size, shapes, threshold)
+        if cover is None:
+            return []
+        box, cells = cover
+        self.apply_cells(image, box, cells)
+        return self.cell_runs(box, cells)
+
     def apply_mosaic_to_region(self, image: Image.Image, start_x: int, start_y: int, end_x: int, end_y: int, region_width: int, region_height: int) -> Image.Image:
         """
         指定された領域にモザイク効果を適用する
@@ -87,6 +250,143 @@ class MosaicEffect:
 
         return region
 
+    def apply_array(self, array: Any, start_x: int, start_y: int, end_x: int, end_y: int,
+                    shape: Optional[tuple[int, ...]] = None) -> Any:
+        """
+        配列の指定された領域にモザイクを適用します。PIL.Imageに変換せず、配列を直接書き換えます。
+        :param array: C連続で書き込み可能なNumPy配列、またはバッファプロトコルのオブジェクト(bytearrayなど)
+                      形状は(高さ, 幅)または(高さ, 幅, チャンネル数1～4)、型はuint8、uint16、float32
+        :param start_x: モザイクをかける領域の左上X座標
+        :param start_y: モザイクをかける領域の左上Y座標
+        :param end_x: モザイクをかける領域の右下X座標
+        :param end_y: モザイクをかける領域の右下Y座標
+        :param shape: 1次元のバッファの場合の形状(高さ, 幅[, チャンネル数])
+        :return: 引数の配列(同じオブジェクト)
+        """
+        if self.cell_size < MosaicEffect.MIN_CELL_SIZE:
+            raise ValueError(f"MosaicEffect cell_size:{self.cell_size}")
+        self.apply_array_region(self.as_pixel_array(array, shape), start_x, start_y, end_x, end_y)
+        return array
+
+    @staticmethod
+    def as_pixel_array(array: Any, shape: Optional[tuple[int, ...]] = None) -> Any:
+        """
+        配列またはバッファを、メモリを共有する(高さ, 幅, チャンネル数)のNumPy配列として参照します。
+        :param array: NumPy配列、またはバッファプロトコルのオブジェクト
+        :param shape: 1次元のバッファの場合の形状(高さ, 幅[, チャンネル数])
+        :return: NumPy配列(コピーしません)
+        """
+        import numpy as np  # NumPyは配列を渡した場合のみ使用します。
+
+        view = array if isinstance(array, np.ndarray) else np.asarray(memoryview(array))
+        if not view.flags.c_contiguous:
+            raise ValueError("MosaicEffect array must be C-contiguous")
+        if not view.flags.writeable:
+            raise ValueError("MosaicEffect array must be writable")
+        if view.dtype not in (np.uint8, np.uint16, np.float32):
+            raise TypeError(f"MosaicEffect unsupported dtype:{view.dtype}")
+        if shape is not None:
+            view = view.reshape(shape)
+        if view.ndim == 2:
+            view = view[:, :, np.newaxis]
+        if view.ndim != 3 or not 1 <= view.shape[2] <= 4:
+            raise ValueError(f"MosaicEffect array shape must be (height, width[, 1-4 channels]):{view.shape}")
+        return view
+
+    def apply_array_region(self, view: Any, start_x: int, start_y: int, end_x: int, end_y: int) -> bool:
+        """
+        (高さ, 幅, チャンネル数)のNumPy配列の領域を、セル毎の平均値で塗りつぶします。
+        PIL.Imageのapplyと同じく、領域全体をセルの数に縮小(Image.Resampling.BOX)した値を使用し、
+        セルサイズで割り切れない右端と下端の余りの画素は変更しません。
+        :param view: NumPy配列
+        :param start_x: 領域の左上X座標
+        :param start_y: 領域の左上Y座標
+        :param end_x: 領域の右下X座標
+        :param end_y: 領域の右下Y座標
+        :return: モザイクをかけたかどうか
+        """
+        import numpy as np
+
+        height, width, channels = view.shape
+        start_x, start_y = max(0, start_x), max(0, start_y)
+        region_width = min(width, end_x) - start_x
+        region_height = min(height, end_y) - start_y
+        cols = region_width // self.cell_size
+        rows = region_height // self.cell_size
+        if cols <= 0 or rows <= 0:
+            return False
+
+        region = view[start_y:start_y + region_height, start_x:start_x + region_width]
+        if view.dtype == np.float32:
+            sum_dtype: Any = np.float64
+        elif view.dtype == np.uint8 and region_width * region_height < 1 << 24:
+            sum_dtype = np.uint32  # 桁あふれしない場合は、32ビットで合計します。
+        else:
+            sum_dtype = np.int64
+        x_starts, x_ends = self.box_edges(region_width, cols)
+        y_starts, y_ends = self.box_edges(region_height, rows)
+        sums = self.segment_sums(region, x_starts, x_ends, axis=1, dtype=sum_dtype)
+        sums = self.segment_sums(sums, y_starts, y_ends, axis=0, dtype=sum_dtype)
+        means = sums / np.outer(y_ends - y_starts, x_ends - x_starts)[:, :, np.newaxis]
+        if view.dtype != np.float32:
+            means = np.floor(means + 0.5)  # 整数型は四捨五入します。
+
+        # セルの幅に拡大した行を、セルの高さ分の各行に書き込みます。
+        cell_rows = np.repeat(means.astype(view.dtype), self.cell_size, axis=1)
+        target = view[start_y:start_y + rows * self.cell_size, start_x:start_x + cols * self.cell_size]
+        target.reshape(rows, self.cell_size, cols * self.cell_size, channels)[...] = cell_rows[:, np.newaxis]
+        return True
+
+    @staticmethod
+    def box_edges(size: int, count: int) -> tuple[Any, Any]:
+        """
+        Image.Resampling.BOXで縮小する際に、各画素の値の元になる範囲を計算します。
+        PILと同じ浮動小数点の計算を行い、範囲の間に含まれない画素が生じる場合も再現します。
+        :param size: 縮小前の大きさ
+        :param count: 縮小後の大きさ
+        :return: 各範囲の開始位置と終了位置(終了位置は含みません)
+        """
+        import numpy as np
+
+        scale = size / count
+        center = (np.arange(count) + 0.5) * scale
+        first = np.maximum((center - scale * 0.5 + 0.5).astype(np.int64), 0)
+        last = np.minimum((center + scale * 0.5 + 0.5).astype(np.int64), size)
+        # BOXフィルタは、-0.5 < (画素の位置 - 中心 + 0.5) / scale <= 0.5 の画素を使用します。
+        starts = first + ((first - center + 0.5) / scale <= -0.5)
+        ends = last - ((last - 1 - center + 0.5) / scale > 0.5)
+        return starts, ends
+
+    @staticmethod
+    def segment_sums(array: Any, starts: Any, ends: Any, axis: int, dtype: Any) -> Any:
+        """
+        指定した軸の各範囲の合計を計算します。
+        :param array: NumPy配列
+        :param starts: 各範囲の開始位置
+        :param ends: 各範囲の終了位置
+        :param axis: 合計する軸
+        :param dtype: 合計の型
+        :return: 合計。指定した軸の長さは範囲の数になります。
+        """
+        import numpy as np
+
+        if np.array_equal(starts[1:], ends[:-1]):
+            # 範囲が連続している場合は、1回の集計で済みます。
+            limit = [slice(None)] * array.ndim
+            limit[axis] = slice(0, int(ends[-1]))
+            return np.add.reduceat(array[tuple(limit)], starts, axis=axis, dtype=dtype)
+        # 範囲の間に隙間、重なりがある場合は、境界で区切った区間の累積和の差で計算します。
+        bounds = np.union1d(starts, ends)
+        limit = [slice(None)] * array.ndim
+        limit[axis] = slice(0, int(bounds[-1]))
+        pieces = np.add.reduceat(array[tuple(limit)], bounds[:-1], axis=axis, dtype=dtype)
+        shape = list(pieces.shape)
+        shape[axis] = 1
+        cumulative = np.concatenate([np.zeros(shape, dtype=pieces.dtype), np.cumsum(pieces, axis=axis)], axis=axis)
+        upper = np.take(cumulative, np.searchsorted(bounds, ends), axis=axis)
+        lower = np.take(cumulative, np.searchsorted(bounds, starts), axis=axis)
+        return upper - lower
+
     @staticmethod
     def calc_cell_size(image: Image.Image) -> int:
         """
@@ -95,11 +395,20 @@ class MosaicEffect:
         :param image: セルサイズを計算する対象の画像
         :return: 計算されたセルサイズ
         """
+        return MosaicEffect.calc_cell_size_for(image.size)
+
+    @staticmethod
+    def calc_cell_size_for(size: tuple[int, int]) -> int:
+        """
+        画像の大きさに基づいてモザイクのセルサイズを計算します。(縮小した作業用画像の編集時は元の画像の大きさ)
+
+        :param size: 画像の幅と高さ
+        :return: 計算されたセルサイズ
+        """
         # 長辺を100で割って小数点以下を切り上げます。
         # セルサイズが最小4ピクセル未満の場合は、4ピクセルに設定します。
-        long_side: Decimal = Decimal(max(image.width, image.height))
-        cell_size = max(MosaicEffect.MIN_CELL_SIZE, round_up_decimal(long_side / Decimal(100), 0))
-        return int(cell_size)
+        long_side: int = max(size)
+        return max(MosaicEffect.MIN_CELL_SIZE, -(-long_side // 100))
 
 
 class EffectPreset:
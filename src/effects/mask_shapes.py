@@ -0,0 +1,107 @@
+"""
+mask_shapes モジュール
+
+モザイクをかける多角形、楕円の領域を提供します。
+MosaicEffect.apply_shapesで、セル単位のマスクに描画して使用します。
+"""
+from dataclasses import dataclass
+import math
+from typing import Any, Union
+
+from PIL import ImageDraw
+
+
+@dataclass(frozen=True)
+class Polygon:
+    """
+    多角形の領域
+    """
+    points: tuple[tuple[float, float], ...]  # 頂点の座標(3点以上)
+
+    def __post_init__(self):
+        if len(self.points) < 3:
+            raise ValueError(f"Polygon requires at least 3 points:{self.points}")
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        """
+        多角形を含む矩形
+        :return: 左上X, 左上Y, 右下X, 右下Y
+        """
+        xs = [x for x, _ in self.points]
+        ys = [y for _, y in self.points]
+        return math.floor(min(xs)), math.floor(min(ys)), math.ceil(max(xs)), math.ceil(max(ys))
+
+    def draw(self, draw: ImageDraw.ImageDraw, scale: float, offset: tuple[float, float]):
+        """
+        マスクに塗りつぶして描画します。
+        :param draw: マスクの描画先
+        :param scale: マスクの1ピクセルに対する画像の倍率
+        :param offset: マスクの原点の画像の座標
+        """
+        draw.polygon([((x - offset[0]) * scale, (y - offset[1]) * scale) for x, y in self.points], fill=255)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        JSONに保存する辞書
+        :return: 辞書
+        """
+        return {"polygon": [list(point) for point in self.points]}
+
+
+@dataclass(frozen=True)
+class Ellipse:
+    """
+    矩形に内接する楕円の領域
+    """
+    box: tuple[float, float, float, float]  # 外接する矩形(左上X, 左上Y, 右下X, 右下Y)
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        """
+        楕円を含む矩形
+        :return: 左上X, 左上Y, 右下X, 右下Y
+        """
+        x0, y0, x1, y1 = self.box
+        return math.floor(min(x0, x1)), math.floor(min(y0, y1)), math.ceil(max(x0, x1)), math.ceil(max(y0, y1))
+
+    def draw(self, draw: ImageDraw.ImageDraw, scale: float, offset: tuple[float, float]):
+        """
+        マスクに塗りつぶして描画します。
+        :param draw: マスクの描画先
+        :param scale: マスクの1ピクセルに対する画像の倍率
+        :param offset: マスクの原点の画像の座標
+        """
+        x0, y0, x1, y1 = self.box
+        left, right = (min(x0, x1) - offset[0]) * scale, (max(x0, x1) - offset[0]) * scale
+        top, bottom = (min(y0, y1) - offset[1]) * scale, (max(y0, y1) - offset[1]) * scale
+        # ImageDraw.ellipseは右下の座標を含むため、1ピクセル内側に描画します。
+        draw.ellipse((left, top, max(left, right - 1), max(top, bottom - 1)), fill=255)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        JSONに保存する辞書
+        :return: 辞書
+        """
+        return {"ellipse": list(self.box)}
+
+
+Shape = Union[Polygon, Ellipse]
+
+
+def shape_from_dict(data: dict[str, Any]) -> Shape:
+    """
+    JSONより読み込んだ辞書から領域を生成します。
+    {"polygon": [[x, y], ...]} または {"ellipse": [左上X, 左上Y, 右下X, 右下Y]}
+    :param data: 辞書
+    :return: 領域
+    """
+    if "polygon" in data:
+        return Polygon(tuple((float(x), float(y)) for x, y in data["polygon"]))
+    if "ellipse" in data:
+        box = data["ellipse"]
+        if len(box) != 4:
+            raise ValueError(f"Ellipse must be [left, top, right, bottom]:{box}")
+        x0, y0, x1, y1 = (float(v) for v in box)
+        return Ellipse((x0, y0, x1, y1))
+    raise ValueError(f"Unknown shape:{data}")
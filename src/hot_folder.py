@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+    hot_folder
+    監視フォルダに追加された画像に、名前付きの領域テンプレートでモザイクをかけます。(ヘッドレス)
+
+    フォルダの一覧はフォルダの更新日時が変わった場合のみ取得し、書き込み中のファイルのみを再度statします。
+    ファイルの大きさと更新日時が一定時間(settle)変化しない場合に、書き込みが完了したとみなします。
+    処理はプロセスプールで実行し、<フォルダ名>_mosaic/<ファイル名>_mosaic_N の名前で保存します。
+"""
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+import fnmatch
+import json
+import os
+from pathlib import Path
+import queue
+from threading import Event
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from . batch import BatchJob, BatchResult, BatchSummary, Rect, RelativeRect, common_folder, process_job, relative_folder
+from . effects.image_effects import EffectPreset
+from . image_file_service import EXTENSION_FORMATS
+from . utils import Stopwatch
+
+# フォルダの更新日時の精度(秒)。この時間内に更新されたフォルダは、更新日時が同じでも一覧を再取得します。
+DIRECTORY_MTIME_RESOLUTION: float = 2.0
+
+
+@dataclass(frozen=True)
+class RegionTemplate:
+    """
+    領域テンプレート
+    """
+    name: str  # テンプレート名
+    cell_size: int  # モザイクのセルサイズ
+    regions: tuple[Rect, ...]  # ピクセル単位の領域
+    relative_regions: tuple[RelativeRect, ...]  # 画像の大きさに対する比率の領域
+    patterns: tuple[str, ...]  # 対象のファイル名のglobパターン
+
+    def create_job(self, file_path: Path, output_dir: str = "", output_subdir: str = "") -> BatchJob:
+        """
+        ファイルの処理内容を生成します。
+        :param file_path: 画像ファイルのパス
+        :param output_dir: 出力先ディレクトリ。空文字の場合は<フォルダ名>_mosaicに保存します。
+        :param output_subdir: 出力先ディレクトリ内のサブフォルダ
+        :return: 処理内容
+        """
+        return BatchJob(str(file_path), self.cell_size, self.regions, output_dir=output_dir,
+                        output_subdir=output_subdir, save_directory=not output_dir,
+                        relative_regions=self.relative_regions)
+
+
+class TemplateSet:
+    """
+    領域テンプレートの指定(JSON)
+    {
+        "preset": "mosaic_16",
+        "templates": {
+            "invoice": {"match": ["invoice_*"], "regions": [[0, 0, 1200, 300]]},
+            "form": {"match": ["form_*", "*.tif"], "preset": "mosaic_auto", "units": "relative",
+                     "regions": [[0.0, 0.0, 1.0, 0.1]]}
+        },
+        "default": "invoice"
+    }
+    unitsはpx(ピクセル、既定)またはrelative(画像の幅と高さに対する比率)です。
+    先に一致したテンプレートを使用し、一致しない場合はdefaultのテンプレートを使用します。
+    defaultを省略した場合、一致しないファイルは処理しません。
+    """
+    def __init__(self, spec: dict[str, Any], presets: EffectPreset, default_preset: str = ""):
+        """
+        コンストラクタ
+        :param spec: テンプレートの指定
+        :param presets: エフェクトのプリセット
+        :param default_preset: specでプリセットを指定しない場合のプリセット名
+        """
+        base_preset = spec.get("preset") or default_preset or presets.default_preset
+        self.templates: dict[str, RegionTemplate] = {
+            name: self.parse_template(name, entry, presets, base_preset)
+            for name, entry in spec.get("templates", {}).items()
+        }
+        self.default: Optional[RegionTemplate] = None
+        if spec.get("default"):
+            if spec["default"] not in self.templates:
+                raise ValueError(f"Unknown default template:{spec['default']}")
+            self.default = self.templates[spec["default"]]
+
+    @classmethod
+    def load(cls, spec_path: Path, presets: EffectPreset, default_preset: str = "") -> 'TemplateSet':
+        """
+        JSONファイルよりテンプレートを読み込みます。
+        :param spec_path: JSONファイルのパス
+        :param presets: エフェクトのプリセット
+        :param default_preset: 既定のプリセット名
+        :return: テンプレート
+        """
+        with open(spec_path, "r", encoding="utf-8") as file:
+            return cls(json.load(file), presets, default_preset)
+
+    @staticmethod
+    def parse_template(name: str, entry: dict[str, Any], presets: EffectPreset, base_preset: str) -> RegionTemplate:
+        """
+        テンプレートを解析します。
+        :param name: テンプレート名
+        :param entry: テンプレートの指定
+        :param presets: エフェクトのプリセット
+        :param base_preset: プリセットを省略した場合のプリセット名
+        :return: テンプレート
+        """
+        preset_name = entry.get("preset") or base_preset
+        if preset_name not in presets.presets:
+            raise ValueError(f"Unknown preset:{preset_name}")
+        units = entry.get("units", "px")
+        if units not in ("px", "relative"):
+            raise ValueError(f"Units must be px or relative:{name}")
+        rects = []
+        for rect in entry.get("regions", []):
+            if len(rect) != 4:
+                raise ValueError(f"Region must be [left, top, right, bottom]:{rect}")
+            x0, y0, x1, y1 = (float(v) if units == "relative" else int(v) for v in rect)
+            if units == "relative" and not all(0.0 <= v <= 1.0 for v in (x0, y0, x1, y1)):
+                raise ValueError(f"Relative region must be 0.0-1.0:{rect}")
+            rects.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        patterns = entry.get("match", [])
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        cell_size = presets.get_preset(preset_name).cell_size
+        if units == "relative":
+            return RegionTemplate(name, cell_size, (), tuple(rects), tuple(patterns))
+        return RegionTemplate(name, cell_size, tuple(rects), (), tuple(patterns))
+
+    def match(self, file_path: Path) -> Optional[RegionTemplate]:
+        """
+        ファイルに対応するテンプレートを取得します。
+        :param file_path: 画像ファイルのパス
+        :return: テンプレート。一致しない場合はNone
+        """
+        for template in self.templates.values():
+            if any(fnmatch.fnmatch(file_path.name, pattern) for pattern in template.patterns):
+                return template
+        return self.default
+
+
+class FolderWatcher:
+    """
+    フォルダに追加された画像ファイルの検出(ポーリング)
+    """
+    def __init__(self, directories: Iterable[Path], settle: float = 1.0, process_existing: bool = False):
+        """
+        コンストラクタ
+        :param directories: 監視するフォルダ
+        :param settle: 書き込みの完了とみなすまでの、ファイルの大きさと更新日時が変化しない時間(秒)
+        :param process_existing: 監視の開始時にフォルダにあるファイルも処理する場合はTrue。
+                                 Falseの場合は検出済みとし、開始後に追加されたファイルのみ処理します。(再起動時に処理し直しません。)
+        """
+        self.directories = [Path(directory) for directory in directories]
+        self.settle = settle
+        self.directory_mtimes: dict[Path, int] = {}  # 一覧を取得した時点のフォルダの更新日時
+        self.index: dict[str, tuple[int, int]] = {}  # 検出済みのファイル → (大きさ, 更新日時)
+        self.settling: dict[str, float] = {}  # 書き込み中のファイル → 大きさと更新日時が変化した時刻
+        self.listings: int = 0  # フォルダの一覧の取得回数
+        if not process_existing:
+            for directory in self.directories:
+                self._list_if_changed(directory, 0.0)
+            self.settling.clear()
+
+    def poll(self, now: Optional[float] = None) -> list[Path]:
+        """
+        書き込みが完了した新しいファイルを取得します。
+        :param now: 現在時刻。Noneの場合はtime.monotonic()
+        :return: ファイルのパス
+        """
+        now = time.monotonic() if now is None else now
+        for directory in self.directories:
+            self._list_if_changed(directory, now)
+
+        ready = []
+        for path, changed_at in list(self.settling.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self.settling[path]
+                self.index.pop(path, None)
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if signature != self.index[path] or st.st_size == 0:
+                self.index[path] = signature
+                self.settling[path] = now
+            elif now - changed_at >= self.settle:
+                del self.settling[path]
+                ready.append(Path(path))
+        return sorted(ready)
+
+    def _list_if_changed(self, directory: Path, now: float):
+        """
+        フォルダの更新日時が変わった場合のみ一覧を取得し、新しいファイルを書き込み中として登録します。
+        :param directory: 監視するフォルダ
+        :param now: 現在時刻
+        """
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return
+        recently_modified = time.time() - mtime_ns / 1e9 < DIRECTORY_MTIME_RESOLUTION
+        if self.directory_mtimes.get(directory) == mtime_ns and not recently_modified:
+            return
+        self.directory_mtimes[directory] = mtime_ns
+        self.listings += 1
+        prefix = os.path.join(directory, "")
+        names = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in EXTENSION_FORMATS:
+                    continue
+                names.add(entry.path)
+                if entry.path not in self.index:
+                    st = entry.stat()
+                    self.index[entry.path] = (st.st_size, st.st_mtime_ns)
+                    self.settling[entry.path] = now
+        for path in [path for path in self.index if path.startswith(prefix) and path not in names]:
+            del self.index[path]  # 削除、移動されたファイル
+            self.settling.pop(path, None)
+
+
+class HotFolderDaemon:
+    """
+    監視フォルダの画像ファイルを、プロセスプールで処理します。
+    """
+    def __init__(self, directories: Iterable[Path], templates: TemplateSet, output_dir: str = "",
+                 max_workers: Optional[int] = None, interval: float = 0.25, settle: float = 1.0,
+                 process_existing: bool = False):
+        """
+        コンストラクタ
+        :param directories: 監視するフォルダ
+        :param templates: 領域テンプレート
+        :param output_dir: 出力先ディレクトリ。空文字の場合は<フォルダ名>_mosaicに保存します。
+        :param max_workers: ワーカープロセス数。Noneの場合はCPU数
+        :param interval: ポーリングの間隔(秒)
+        :param settle: 書き込みの完了とみなすまでの時間(秒)
+        :param process_existing: 監視の開始時にフォルダにあるファイルも処理する場合はTrue
+        """
+        self.watcher = FolderWatcher(directories, settle, process_existing)
+        self.templates = templates
+        self.output_dir = output_dir
+        # 複数のフォルダを監視する場合は、出力先ディレクトリ内にフォルダ毎のサブフォルダを作成します。
+        self.output_base = common_folder(self.watcher.directories)
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.interval = interval
+        self.backlog: deque[BatchJob] = deque()  # ワーカーの空き待ちの処理内容
+        self.in_flight: int = 0
+        self.results: queue.SimpleQueue[BatchResult] = queue.SimpleQueue()
+        self.summary = BatchSummary()
+        self.stopped = Event()
+
+    def collect(self, now: Optional[float] = None) -> int:
+        """
+        新しいファイルを検出し、テンプレートに一致するファイルの処理内容を登録します。
+        :param now: 現在時刻
+        :return: 登録件数
+        """
+        count = 0
+        for file_path in self.watcher.poll(now):
+            template = self.templates.match(file_path)
+            if template is None:
+                print(f"No template:{file_path}")
+                continue
+            output_subdir = relative_folder(file_path, self.output_base) if self.output_dir else ""
+            self.backlog.append(template.create_job(file_path, self.output_dir, output_subdir))
+            count += 1
+        return count
+
+    def run(self, progress: Optional[Callable[[BatchResult, BatchSummary], None]] = None) -> BatchSummary:
+        """
+        stopが呼ばれるまで、監視と処理を繰り返します。
+        :param progress: 1ファイル処理毎に呼び出すコールバック
+        :return: 集計結果
+        """
+        # multiprocessingは読み込みに時間がかかるため、実行時に読み込みます。
+        from concurrent.futures import ProcessPoolExecutor
+
+        sw = Stopwatch.start_new()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.stopped.is_set() or self.in_flight:
+                if not self.stopped.is_set():
+                    self.collect()
+                # ワーカーの処理待ちを最小限にするため、ワーカー数の2倍まで投入します。
+                while self.backlog and self.in_flight < self.max_workers * 2 and not self.stopped.is_set():
+                    future = executor.submit(process_job, self.backlog.popleft())
+                    self.in_flight += 1
+                    future.add_done_callback(self._on_done)
+                try:
+                    result = self.results.get(timeout=self.interval)
+                except queue.Empty:
+                    continue
+                while True:
+                    self.in_flight -= 1
+                    self.summary.add(result)
+                    self.summary.elapsed = sw.elapsed
+                    if progress:
+                        progress(result, self.summary)
+                    try:
+                        result = self.results.get_nowait()
+                    except queue.Empty:
+                        break
+        self.summary.elapsed = sw.stop()
+        return self.summary
+
+    def _on_done(self, future: Future):
+        """
+        ワーカーの処理の完了時に呼び出されます。
+        :param future: 処理結果のFuture
+        """
+        try:
+            self.results.put(future.result())
+        except Exception as e:  # ワーカープロセスの異常終了など
+            self.results.put(BatchResult("", error=f"{type(e).__name__}: {e}"))
+
+    def stop(self):
+        """
+        監視を終了します。処理中のファイルは完了を待ちます。
+        """
+        self.stopped.set()
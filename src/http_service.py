@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+    http_service
+    同じホストの他サービスから呼び出すための、モザイク処理のHTTPサーバー
+    標準ライブラリのみで動作し、tkinterは読み込みません。
+
+    POST /mosaic
+        本文: 画像
+        領域の指定: X-Mosaic-Spec ヘッダー または クエリ文字列
+            X-Mosaic-Spec: {"regions": [[0, 0, 100, 50]], "preset": "mosaic_16", "format": "PNG"}
+            /mosaic?regions=[[0,0,100,50]]&preset=mosaic_16&format=PNG
+        応答: モザイクをかけた画像。Server-Timingヘッダーに処理時間を格納します。
+    GET /health
+        応答: 処理中の件数などのJSON
+
+    接続毎のスレッドで受信し、モザイクとエンコードは上限付きのワーカースレッドで処理します。
+    処理中と待機中の合計が上限を超えた場合は、本文を受信せずに503を返し、接続を切断します。
+    処理枠はワーカーの処理の完了時に解放するため、タイムアウトした要求の処理中も上限に含めます。
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from . batch import RegionSpec
+from . pipeline import decode_frame, encode_frame
+from . utils import Stopwatch
+
+# 画像形式とContent-Type
+CONTENT_TYPES: dict[str, str] = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "BMP": "image/bmp",
+    "GIF": "image/gif",
+    "TIFF": "image/tiff",
+}
+
+
+class RedactionServer(ThreadingHTTPServer):
+    """
+    モザイク処理のHTTPサーバー
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], spec: RegionSpec, max_workers: Optional[int] = None,
+                 max_queue: int = 16, request_timeout: float = 30.0, max_body_mb: int = 64):
+        """
+        コンストラクタ
+        :param address: 待ち受けるアドレスとポート番号
+        :param spec: 領域を指定しない要求で使用する領域の指定
+        :param max_workers: ワーカースレッド数。Noneの場合はCPU数
+        :param max_queue: ワーカーの空きを待つ要求の上限
+        :param request_timeout: 1要求の処理時間の上限(秒)
+        :param max_body_mb: 本文の上限(MB)
+        """
+        super().__init__(address, RedactionRequestHandler)
+        self.spec = spec
+        self.max_workers: int = max(1, max_workers or os.cpu_count() or 1)
+        self.max_queue: int = max(0, max_queue)
+        self.request_timeout = request_timeout
+        self.max_body_bytes: int = max_body_mb * 1024 * 1024
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mosaic-worker")
+        # 処理中と待機中の合計の上限
+        self.slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self.lock = threading.Lock()
+        self.in_flight: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+
+    def acquire_slot(self) -> bool:
+        """
+        処理枠を確保します。
+        :return: 確保できた場合はTrue。上限に達している場合はFalse
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return False
+        with self.lock:
+            self.in_flight += 1
+        return True
+
+    def release_slot(self):
+        """
+        処理枠を解放します。
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self.slots.release()
+
+    def stats(self) -> dict[str, int]:
+        """
+        処理状況を取得します。
+        :return: ワーカー数、処理中、完了、拒否の件数
+        """
+        with self.lock:
+            return {"workers": self.max_workers, "queue": self.max_queue, "in_flight": self.in_flight,
+                    "completed": self.completed, "rejected": self.rejected}
+
+    def server_close(self):
+        """
+        サーバーを終了し、ワーカースレッドを停止します。
+        """
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def process_image(header: dict[str, Any], body: bytes, spec: RegionSpec) -> tuple[dict[str, Any], bytes, dict[str, float]]:
+    """
+    画像をデコードし、モザイクをかけてエンコードします。ワーカースレッドで実行します。
+    :param header: 領域、プリセット、出力形式の指定
+    :param body: 画像
+    :param spec: 領域を指定しない場合の領域の指定
+    :return: 結果のヘッダー、画像、処理時間(ミリ秒)
+    """
+    sw = Stopwatch.start_new()
+    frame = decode_frame(header, body, spec)
+    decode_ms = sw.elapsed * 1000
+    result_header, result_body = encode_frame(frame)
+    return result_header, result_body, {"decode": decode_ms, "mosaic-encode": sw.stop() * 1000 - decode_ms}
+
+
+class RedactionRequestHandler(BaseHTTPRequestHandler):
+    """
+    モザイク処理のHTTP要求の処理
+    """
+    protocol_version = "HTTP/1.1"  # keep-aliveで接続を再利用します。
+    timeout = 60  # 無通信の接続を切断するまでの秒数
+    server: RedactionServer
+
+    def log_message(self, format: str, *args: Any):
+        """
+        アクセスログは出力しません。
+        """
+
+    def do_GET(self):
+        """
+        GET要求
+        """
+        if urlsplit(self.path).path == "/health":
+            self.send_body(HTTPStatus.OK, json.dumps(self.server.stats()).encode("utf-8"), "application/json")
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Not found")
+
+    def do_POST(self):
+        """
+        POST要求
+        領域の指定と処理枠を確認してから本文を受信します。
+        """
+        sw = Stopwatch.start_new()
+        url = urlsplit(self.path)
+        if url.path != "/mosaic":
+            self.discard_body()
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Not found")
+            return
+        length = self.read_content_length()
+        if length is None:
+            return
+        try:
+            header = self.parse_spec(url.query)
+        except ValueError as e:
+            self.discard_body()
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        if not self.server.acquire_slot():
+            # 混雑時は本文を受信せずに切断します。
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy", {"Retry-After": "1"}, close=True)
+            return
+
+        result = self.run_job(header, length)
+        if result is None:
+            return
+        result_header, result_body, timings = result
+        timings = {**timings, "total": sw.stop() * 1000}
+        extra = {"Server-Timing": ", ".join(f"{name};dur={value:.2f}" for name, value in timings.items())}
+        if "error" in result_header:
+            self.send_error_json(HTTPStatus.UNPROCESSABLE_ENTITY, result_header["error"], extra)
+            return
+        extra["X-Image-Size"] = f"{result_header['width']}x{result_header['height']}"
+        content_type = CONTENT_TYPES.get(result_header["format"], "application/octet-stream")
+        self.send_body(HTTPStatus.OK, result_body, content_type, extra)
+
+    def read_content_length(self) -> Optional[int]:
+        """
+        本文の長さを取得します。不正な場合、上限を超える場合はエラーを応答します。
+        :return: 本文の長さ。エラーを応答した場合はNone
+        """
+        length = self.headers.get("Content-Length", "")
+        if not length.isdigit():
+            self.send_error_json(HTTPStatus.LENGTH_REQUIRED, "Content-Length required", close=True)
+            return None
+        if int(length) > self.server.max_body_bytes:
+            self.send_error_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large", close=True)
+            return None
+        return int(length)
+
+    def run_job(self, header: dict[str, Any], length: int) -> Optional[tuple[dict[str, Any], bytes, dict[str, float]]]:
+        """
+        確保済みの処理枠で本文を受信し、ワーカースレッドで処理します。
+        処理枠は処理の完了時に解放します。(タイムアウト後も処理中の場合は、完了するまで解放しません。)
+        :param header: 領域、プリセット、出力形式の指定
+        :param length: 本文の長さ
+        :return: 結果のヘッダー、画像、処理時間(ミリ秒)。タイムアウトを応答した場合はNone
+        """
+        server = self.server
+
+        def job() -> tuple[dict[str, Any], bytes, dict[str, float]]:
+            try:
+                return process_image(header, body, server.spec)
+            finally:
+                server.release_slot()  # 結果を返す前に解放します。
+
+        try:
+            body = self.rfile.read(length)
+            queued = Stopwatch.start_new()
+            future = server.executor.submit(job)
+        except BaseException:
+            server.release_slot()
+            raise
+        # 実行前に取り消した場合は、jobが実行されないため、ここで解放します。
+        future.add_done_callback(lambda done: server.release_slot() if done.cancelled() else None)
+        try:
+            result_header, result_body, timings = future.result(timeout=self.server.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.send_error_json(HTTPStatus.GATEWAY_TIMEOUT, "Processing timed out")
+            return None
+        wait_ms = queued.stop() * 1000 - sum(timings.values())
+        return result_header, result_body, {"queue": max(0.0, wait_ms), **timings}
+
+    def parse_spec(self, query: str) -> dict[str, Any]:
+        """
+        X-Mosaic-Specヘッダー、クエリ文字列より領域の指定を取得します。
+        :param query: クエリ文字列
+        :return: 領域、プリセット、出力形式の指定
+        """
+        header: dict[str, Any] = {}
+        params = parse_qs(query)
+        try:
+            spec_header = self.headers.get("X-Mosaic-Spec")
+            if spec_header:
+                spec = json.loads(spec_header)
+                if not isinstance(spec, dict):
+                    raise ValueError("X-Mosaic-Spec must be a JSON object")
+                header.update(spec)
+            if "regions" in params:
+                header["regions"] = json.loads(params["regions"][-1])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid region spec:{e}") from e
+        for key in ("preset", "format"):
+            if key in params:
+                header[key] = params[key][-1]
+        return header
+
+    def discard_body(self):
+        """
+        接続を再利用するために、未読の本文を読み捨てます。
+        """
+        length = self.headers.get("Content-Length", "0")
+        if length.isdigit() and int(length) <= self.server.max_body_bytes:
+            self.rfile.read(int(length))
+        else:
+            self.close_connection = True
+
+    def send_body(self, status: HTTPStatus, body: bytes, content_type: str,
+                  extra_headers: Optional[dict[str, str]] = None):
+        """
+        応答を送信します。
+        :param status: ステータスコード
+        :param body: 本文
+        :param content_type: Content-Type
+        :param extra_headers: 追加のヘッダー
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: HTTPStatus, message: str, extra_headers: Optional[dict[str, str]] = None,
+                        close: bool = False):
+        """
+        エラーの応答を送信します。
+        :param status: ステータスコード
+        :param message: エラーメッセージ
+        :param extra_headers: 追加のヘッダー
+        :param close: 接続を切断する場合はTrue
+        """
+        headers = dict(extra_headers or {})
+        if close:
+            self.close_connection = True
+            headers["Connection"] = "close"
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        self.send_body(status, body, "application/json; charset=utf-8", headers)
+
+
+def serve(server: RedactionServer):
+    """
+    Ctrl+Cで停止するまで要求を処理します。
+    :param server: HTTPサーバー
+    """
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -3,14 +3,50 @@
 ImageFileService
 このモジュールは、画像ファイルの読み込み、保存、処理など、画像ファイルに関連する操作を扱う ImageFileService クラスを提供します。
 """
-from functools import lru_cache
+from concurrent.futures import Executor
+from dataclasses import dataclass
+import io
 from pathlib import Path
 import time
-from typing import Any
+from typing import Any, Optional
 
 from PIL import Image
-from PIL.PngImagePlugin import PngInfo
-from src.utils import Stopwatch
+
+# 形式の判定に読み込むファイル先頭のバイト数
+HEADER_SIZE: int = 32
+
+# 画像形式
+ImageFormat = {
+    'PNG': ('*.png', ),
+    'JPEG': ('*.jpg', '*.jpeg', ),
+    'WEBP': ('*.webp', ),
+    'BMP': ('*.bmp', ),
+    'PNM': ('*.pbm', '*.pgm', '*.ppm', ),
+    'GIF': ('*.gif', ),
+    'TIFF': ('*.tif', '*.tiff', ),
+}
+
+# 拡張子 → 画像形式
+EXTENSION_FORMATS: dict[str, str] = {
+    pattern[1:]: image_format for image_format, patterns in ImageFormat.items() for pattern in patterns
+}
+
+
+@dataclass(frozen=True)
+class SniffResult:
+    """
+    ファイル先頭のバイト列による画像形式の判定結果
+    """
+    format: str = ""  # 画像形式(PNG, JPEG, WEBP, GIF, BMP, PNM, TIFF) 判定できない場合は空文字
+    corrupt: bool = False  # シグネチャは一致するがヘッダーが壊れている場合はTrue
+
+    @property
+    def is_valid(self) -> bool:
+        """
+        読み込み可能な画像ファイルかどうか
+        :return: 画像形式を判定でき、ヘッダーが正常な場合はTrue
+        """
+        return bool(self.format) and not self.corrupt
 
 
 class ImageFileService:
@@ -20,6 +56,56 @@ class ImageFileService:
     Attributes:
         None
     """
+    @staticmethod
+    def read_header(path: Path, size: int = HEADER_SIZE) -> bytes:
+        """
+        ファイルの先頭バイトを読み込みます。
+        :param path: ファイルのパス
+        :param size: 読み込むバイト数
+        :return: ファイルの先頭バイト。読み込めない場合は空のバイト列
+        """
+        try:
+            with open(path, 'rb') as f:
+                return f.read(size)
+        except OSError:
+            return b''
+
+    @staticmethod
+    def detect_format(header: bytes) -> SniffResult:
+        """
+        ファイル先頭のバイト列より画像形式を判定します。
+        :param header: ファイル先頭のバイト列
+        :return: 判定結果
+        """
+        if header.startswith(b'\x89PNG\r\n\x1a\n'):
+            # シグネチャの後は、IHDRチャンクが続きます。
+            return SniffResult("PNG", header[12:16] != b'IHDR')
+        if header.startswith(b'\xFF\xD8'):
+            # SOIマーカーの後は、次のマーカーが続きます。
+            return SniffResult("JPEG", header[2:3] != b'\xFF')
+        if header.startswith((b'GIF87a', b'GIF89a')):
+            return SniffResult("GIF", len(header) < 13)
+        if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+            # VP8 , VP8L, VP8Xのいずれかのチャンクが続きます。
+            return SniffResult("WEBP", header[12:15] != b'VP8')
+        if header.startswith(b'BM'):
+            # BITMAPFILEHEADER(14バイト)と情報ヘッダーのサイズ
+            return SniffResult("BMP", len(header) < 18 or header[14] not in (12, 40, 52, 56, 64, 108, 124))
+        if header.startswith((b'II*\x00', b'MM\x00*')):
+            return SniffResult("TIFF", len(header) < 8)
+        if len(header) >= 3 and header[0:1] == b'P' and header[1:2] in b'1234567' and header[2:3].isspace():
+            return SniffResult("PNM")
+        return SniffResult()
+
+    @staticmethod
+    def sniff(path: Path) -> SniffResult:
+        """
+        ファイル先頭のバイト列より画像形式を判定します。
+        :param path: ファイルのパス
+        :return: 判定結果
+        """
+        return ImageFileService.detect_format(ImageFileService.read_header(path))
+
     @staticmethod
     def is_png(path: Path) -> bool:
         """
@@ -78,14 +164,20 @@ class ImageFileService:
         return Image.open(file_path)
 
     @staticmethod
-    async def load_async(file_path: Path) -> Image.Image:
+    async def load_async(file_path: Path, executor: Optional[Executor] = None) -> Image.Image:
         """
-        画像ファイルを非同期で読み込みます。
+        画像ファイルをワーカースレッドで読み込み、画素をデコードします。
         :param file_path: 画像ファイルのパス
+        :param executor: 実行するExecutor。Noneの場合はイベントループの既定のExecutor
         :return: 画像データ
         """
-        print("load_async" + str(file_path))
-        return Image.open(file_path)
+        import asyncio  # コルーチンの実行時は読み込み済みです。
+
+        def load() -> Image.Image:
+            image = ImageFileService.load(file_path)
+            image.load()
+            return image
+        return await asyncio.get_running_loop().run_in_executor(executor, load)
 
     @staticmethod
     def get_image_size(file_path: Path) -> tuple[int, int]:
@@ -108,42 +200,49 @@ class ImageFileService:
             return img.info
 
     @staticmethod
-    def save(out_image: Image.Image, output_path: Path, filename: Path):
+    def save(out_image: Image.Image, output_path: Path, filename: Path, src_format: Optional[str] = None):
         """
         画像保存処理
         :param out_image: 出力画像
         :param output_path: 出力先ファイルパス
         :param filename: 元画像のファイルパス
+        :param src_format: 元画像の画像形式。取り込み時に判定済みの場合は指定します。
         """
         # Todo: PNGINFOの情報はテストパターンを増やす。
         # 元ファイルを読み込み部分を廃止する。
         # DataModel側に保持する。
-        if not output_path.parent.exists():
-            output_path.parent.mkdir(parents=True)
+        # 複数のワーカープロセスが同じフォルダに保存する場合も失敗しないように、作成済みの場合は無視します。
+        output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if ImageFileService.is_png(filename):
+        if src_format is None:  # 未判定の場合は、ファイル先頭のバイト列より判定します。
+            src_format = ImageFileService.sniff(filename).format
+
+        if src_format == "PNG":
             with Image.open(filename) as src_img:
                 ImageFileService.save_png_metadata(src_img, out_image, output_path)
             return
-        if ImageFileService.is_jpg(filename):
+        if src_format == "JPEG":
             with Image.open(filename) as src_img:
                 ImageFileService.save_jpeg_metadata(src_img, out_image, output_path)
             return
         out_image.save(output_path)
 
     @staticmethod
-    async def save_async(mode, size: tuple[int, int], data: bytes, output_path: Path, filename: Path):
+    async def save_async(out_image: Image.Image, output_path: Path, filename: Path,
+                         src_format: Optional[str] = None, executor: Optional[Executor] = None):
         """
         画像保存処理(非同期)
-        Image.Imageはpickle化を行えないため、bytes型で渡します。
-        :param mode: カラーモード
-        :param size: 出力画像サイズ
-        :param data: 出力画像
+        ワーカースレッドで保存します。保存中に書き換えないように、複製した画像を渡してください。
+        :param out_image: 出力画像
         :param output_path: 出力先ファイルパス
         :param filename: 元画像のファイルパス
+        :param src_format: 元画像の画像形式
+        :param executor: 実行するExecutor。Noneの場合はイベントループの既定のExecutor
         """
-        out_image = Image.frombytes(mode, size, data)
-        ImageFileService.save(out_image, output_path, filename)
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(
+            executor, ImageFileService.save, out_image, output_path, filename, src_format)
 
     @staticmethod
     def save_png_metadata(src_image: Image.Image, out_image: Image.Image, output_path: Path) -> None:
@@ -153,10 +252,32 @@ class ImageFileService:
         :param out_image: 出力画像
         :param output_path: 出力先ファイルパス
         """
-        png_info = src_image.info
-        if png_info:
-            new_png_info = PngInfo()
-            for key, value in png_info.items():
+        out_image.save(output_path, **ImageFileService.metadata_options("PNG", src_image.info))
+
+    @staticmethod
+    def save_jpeg_metadata(src_image: Image.Image, out_image: Image.Image, output_path: Path) -> None:
+        """
+        JPEG形式の画像にメタデータを保存します。
+        :param src_image: 元画像
+        :param out_image: 出力画像
+        :param output_path: 出力先ファイルパス
+        """
+        out_image.save(output_path, **ImageFileService.metadata_options("JPEG", src_image.info))
+
+    @staticmethod
+    def metadata_options(src_format: str, info: dict[str, Any]) -> dict[str, Any]:
+        """
+        元画像のメタデータを引き継ぐための保存オプションを生成します。
+        PNG形式はPNGINFO、JPEG形式はExifを引き継ぎます。
+        :param src_format: 元画像の画像形式
+        :param info: 元画像の情報(Image.info)
+        :return: Image.saveのオプション
+        """
+        if src_format == "PNG" and info:
+            # PngImagePluginは多数のPILのサブモジュールを読み込むため、PNG形式の保存時に読み込みます。
+            from PIL.PngImagePlugin import PngInfo
+            png_info = PngInfo()
+            for key, value in info.items():
                 # 値がint型であれば、文字列に変換してから追加する
                 if isinstance(value, int):
                     value = str(value)
@@ -167,25 +288,33 @@ class ImageFileService:
                 elif isinstance(value, tuple):
                     value = ', '.join(map(str, value))
 
-                new_png_info.add_itxt(key, value)
-
-            out_image.save(output_path, pnginfo=new_png_info)
-        else:
-            out_image.save(output_path)
+                png_info.add_itxt(key, value)
+            return {"pnginfo": png_info}
+        if src_format == "JPEG":
+            exif_data = info.get("exif")
+            if exif_data:
+                return {"exif": exif_data}
+        return {}
 
     @staticmethod
-    def save_jpeg_metadata(src_image: Image.Image, out_image: Image.Image, output_path: Path) -> None:
+    def encode(out_image: Image.Image, image_format: str, src_format: str = "",
+               src_info: Optional[dict[str, Any]] = None) -> bytes:
         """
-        JPEG形式の画像にメタデータを保存します。
-        :param src_image: 元画像
+        画像をファイルに保存せずにエンコードします。
+        元画像と同じ画像形式の場合は、メタデータを引き継ぎます。
         :param out_image: 出力画像
-        :param output_path: 出力先ファイルパス
+        :param image_format: 出力する画像形式(PNG, JPEG, WEBPなど)
+        :param src_format: 元画像の画像形式
+        :param src_info: 元画像の情報(Image.info)
+        :return: エンコードした画像
         """
-        exif_data = src_image.info.get("exif")
-        if exif_data:
-            out_image.save(output_path, exif=exif_data)
-        else:
-            out_image.save(output_path)
+        image_format = image_format.upper()
+        if image_format == "JPEG" and out_image.mode not in ("RGB", "L", "CMYK"):
+            out_image = out_image.convert("RGB")  # JPEG形式は透過色を保存できません。
+        options = ImageFileService.metadata_options(src_format, src_info or {}) if image_format == src_format else {}
+        buffer = io.BytesIO()
+        out_image.save(buffer, format=image_format, **options)
+        return buffer.getvalue()
 
     @staticmethod
     def mosaic_filename(file_path: Path, is_dir: bool = False) -> Path:
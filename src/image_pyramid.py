@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    ImagePyramid
+    画像の縮小表示用のミップマップ(1/2, 1/4, 1/8 ...)
+    各レベルは最初に参照した時点で、1つ上のレベルからImage.reduce(2)で生成しキャッシュします。
+    表示倍率に最も近い、表示倍率以上の大きさのレベルから縮小するため、倍率の変更時に元画像全体を縮小しません。
+"""
+import math
+from typing import Optional
+
+from PIL import Image
+
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Box = tuple[int, int, int, int]
+
+# Image.reduceに対応した画像のモード。その他のモードは変換して縮小します。
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F")
+
+
+class ImagePyramid:
+    """
+    画像のミップマップ
+    """
+    def __init__(self, image: Image.Image, min_size: int = 64):
+        """
+        コンストラクタ
+        レベル0は元の画像そのもの(複製しません)です。元の画像を変更した場合はupdate_regionを呼び出してください。
+        :param image: 元の画像
+        :param min_size: 最小のレベルの長辺のピクセル数
+        """
+        self.image = image
+        self.max_level = max(0, int(math.log2(max(1, max(image.size) / max(1, min_size)))))
+        self.levels: list[Optional[Image.Image]] = [image] + [None] * self.max_level
+
+    def level_for_scale(self, scale: float) -> int:
+        """
+        表示倍率に使用するレベル
+        :param scale: 表示倍率(1.0は等倍)
+        :return: 大きさが表示倍率以上となる最小のレベル
+        """
+        if scale >= 1.0:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / scale) + 1e-9)))
+
+    def get(self, level: int) -> Image.Image:
+        """
+        レベルの画像を取得します。未生成の場合は生成します。
+        :param level: レベル(0は元の画像)
+        :return: 画像。大きさは元の画像の1/(2**level)(端数は切り上げ)
+        """
+        image = self.levels[level]
+        if image is None:
+            image = self._reducible(self.get(level - 1)).reduce(2)
+            self.levels[level] = image
+        return image
+
+    @staticmethod
+    def _reducible(image: Image.Image) -> Image.Image:
+        """
+        Image.reduceに対応したモードに変換します。
+        :param image: 画像
+        :return: 画像
+        """
+        if image.mode in REDUCIBLE_MODES:
+            return image
+        return image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    def update_region(self, box: Box):
+        """
+        元の画像の変更した領域を、生成済みのレベルに反映します。領域を含むブロックのみを縮小し直します。
+        :param box: 元の画像の変更した領域
+        """
+        left, top, right, bottom = box
+        for level in range(1, self.max_level + 1):
+            target = self.levels[level]
+            if target is None:
+                return  # 以降のレベルは未生成
+            source = self.get(level - 1)
+            # 1つ上のレベルの2x2ブロックの境界に合わせます。
+            left, top = max(0, left // 2), max(0, top // 2)
+            right, bottom = min(target.width, -(-right // 2)), min(target.height, -(-bottom // 2))
+            if right <= left or bottom <= top:
+                return
+            crop = source.crop((left * 2, top * 2, min(source.width, right * 2), min(source.height, bottom * 2)))
+            target.paste(self._reducible(crop).reduce(2), (left, top))
+
+    def render(self, scale: float, box: Box, resample: Image.Resampling = Image.Resampling.BILINEAR) -> Image.Image:
+        """
+        表示倍率で表示した画像の、指定した領域を生成します。
+        :param scale: 表示倍率
+        :param box: 表示座標の領域
+        :param resample: 縮小時のリサンプリングフィルター。拡大時は画素を確認できるようにNEARESTを使用します。
+        :return: 領域の画像
+        """
+        left, top, right, bottom = box
+        level = self.level_for_scale(scale)
+        source = self.get(level)
+        factor = scale * (2 ** level)  # レベルの画像に対する倍率(0.5 < factor <= 1.0、または拡大時は1.0超)
+        source_box = (left / factor, top / factor,
+                      min(source.width, right / factor), min(source.height, bottom / factor))
+        if factor == 1.0:
+            return source.crop(tuple(round(v) for v in source_box))
+        if factor > 1.0:
+            resample = Image.Resampling.NEAREST
+        return source.resize((right - left, bottom - top), resample, box=source_box)
+
+    def render_mosaic(self, scale: float, box: Box, cell_size: int) -> Optional[tuple[int, int, Image.Image]]:
+        """
+        元の画像の領域にモザイクをかけた結果を、表示倍率で生成します。(ドラッグ中のプレビュー)
+        セルサイズ以下の大きさに縮小済みのレベルからセルの平均値を求めるため、元の画像の領域全体は参照しません。
+        MosaicEffectと同じく、セルサイズで割り切れない右端と下端の余りは含みません。
+        :param scale: 表示倍率
+        :param box: 元の画像の領域
+        :param cell_size: モザイクのセルサイズ
+        :return: 表示座標の左上X座標, 左上Y座標, モザイクの画像。セルが1つもない場合はNone
+        """
+        left, top, right, bottom = box
+        columns, rows = (right - left) // cell_size, (bottom - top) // cell_size
+        if columns <= 0 or rows <= 0:
+            return None
+        level = min(self.max_level, int(math.log2(cell_size)))
+        source = self._reducible(self.get(level))
+        ratio = 2 ** level
+        cells = source.resize((columns, rows), Image.Resampling.BOX,
+                              box=(left / ratio, top / ratio,
+                                   min(source.width, right / ratio), min(source.height, bottom / ratio)))
+        x, y = round(left * scale), round(top * scale)
+        width = max(1, round((left + columns * cell_size) * scale) - x)
+        height = max(1, round((top + rows * cell_size) * scale) - y)
+        return x, y, cells.resize((width, height), Image.Resampling.NEAREST)
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+    job_queue
+    共有フォルダ(NFSなど)を使用した、複数のマシンでの一括処理のジョブキュー
+
+    spool/
+        pending/<ID>.json           未処理のジョブ
+        running/<ID>@<ワーカー>.json  処理中のジョブ(更新日時がリースの期限の基準)
+        done/<ID>.json              正常終了したジョブの処理結果
+        failed/<ID>.json            エラーのジョブの処理結果
+        tmp/                        書き込み途中のファイル
+
+    ワーカーはpendingからrunningへのリネームでジョブを取得します。リネームは同じファイルシステム内で
+    アトミックなため、同じジョブを複数のワーカーが取得することはありません。
+    処理中はrunningのファイルの更新日時を定期的に更新します。更新が止まり、リースの期限を過ぎたジョブは
+    他のワーカーがpendingに戻して再実行します。(出力先は同じ大きさの画像を上書きするため、再実行しても重複しません。)
+"""
+from dataclasses import asdict
+import json
+import os
+from pathlib import Path
+import re
+import socket
+from threading import Event, Thread
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+import uuid
+import zlib
+
+from . batch import BatchJob, BatchResult, BatchSummary, process_job
+from . utils import Stopwatch
+
+SPOOL_DIRS = ("pending", "running", "done", "failed", "tmp")
+
+# ワーカー名に使用できない文字
+_INVALID_WORKER_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """
+    シャードの指定を解析します。
+    :param text: i/n形式(0 <= i < n)
+    :return: シャード番号とシャード数
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", text)
+    if match is None:
+        raise ValueError(f"Shard must be i/n:{text}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index must be 0 <= i < n:{text}")
+    return index, count
+
+
+def shard_of(input_path: str, count: int) -> int:
+    """
+    ファイルのシャード番号
+    マシン、プロセスによらず同じ値になるように、パスのCRC32より決定します。(hash()は実行毎に異なります。)
+    :param input_path: 画像ファイルのパス
+    :param count: シャード数
+    :return: シャード番号
+    """
+    return zlib.crc32(Path(input_path).as_posix().encode("utf-8")) % count
+
+
+def select_shard(jobs: Iterable[BatchJob], index: int, count: int) -> Iterator[BatchJob]:
+    """
+    シャードに含まれるジョブを選択します。
+    :param jobs: 処理内容
+    :param index: シャード番号
+    :param count: シャード数
+    :return: シャードに含まれる処理内容
+    """
+    return (job for job in jobs if shard_of(job.input_path, count) == index)
+
+
+def default_worker_id() -> str:
+    """
+    既定のワーカー名
+    :return: ホスト名-プロセスID
+    """
+    return _INVALID_WORKER_CHARS.sub("_", f"{socket.gethostname()}-{os.getpid()}")
+
+
+class ClaimedJob(NamedTuple):
+    """
+    取得したジョブ
+    """
+    job_id: str  # ジョブID
+    job: BatchJob  # 処理内容
+    path: Path  # runningのファイルのパス
+
+
+class JobQueue:
+    """
+    フォルダを使用したジョブキュー
+    """
+    def __init__(self, spool_dir: Path, lease: float = 300.0):
+        """
+        コンストラクタ
+        :param spool_dir: スプールフォルダ
+        :param lease: リースの期間(秒)。この期間、更新がない処理中のジョブは再実行します。
+        """
+        self.spool_dir = Path(spool_dir)
+        self.lease = lease
+        for name in SPOOL_DIRS:
+            (self.spool_dir / name).mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, name: str) -> Path:
+        """
+        スプールフォルダ内のフォルダ
+        :param name: フォルダ名(SPOOL_DIRS)
+        :return: フォルダのパス
+        """
+        return self.spool_dir / name
+
+    @staticmethod
+    def job_id(job: BatchJob) -> str:
+        """
+        ジョブID
+        同じファイルを複数回登録しないように、入力ファイルの絶対パスより決定します。
+        :param job: 処理内容
+        :return: ジョブID
+        """
+        key = zlib.crc32(os.path.abspath(job.input_path).encode("utf-8"))
+        return f"{key:08x}-{_INVALID_WORKER_CHARS.sub('_', Path(job.input_path).stem)[:40]}"
+
+    def _write(self, path: Path, data: dict):
+        """
+        JSONファイルを書き込みます。読み込み途中のファイルを参照しないように、書き込み後にリネームします。
+        :param path: ファイルのパス
+        :param data: 書き込む内容
+        """
+        tmp_path = self._dir("tmp") / f"{uuid.uuid4().hex}.json"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def enqueue(self, jobs: Iterable[BatchJob]) -> int:
+        """
+        ジョブを登録します。登録済み、処理済みのジョブは登録しません。
+        入力ファイルは、全てのマシンで同じパスで参照できる必要があります。
+        :param jobs: 処理内容
+        :return: 登録件数
+        """
+        known = {name.split("@")[0].removesuffix(".json")
+                 for sub_dir in ("pending", "running", "done") for name in os.listdir(self._dir(sub_dir))}
+        count = 0
+        for job in jobs:
+            job = BatchJob(**{**asdict(job), "input_path": os.path.abspath(job.input_path)})
+            job_id = self.job_id(job)
+            if job_id in known:
+                continue
+            self._write(self._dir("pending") / f"{job_id}.json", asdict(job))
+            known.add(job_id)
+            count += 1
+        return count
+
+    def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        """
+        未処理のジョブを1件取得します。
+        :param worker_id: ワーカー名
+        :return: 取得したジョブ。未処理のジョブがない場合はNone
+        """
+        for name in sorted(os.listdir(self._dir("pending"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name.removesuffix(".json")
+            src = self._dir("pending") / name
+            dst = self._dir("running") / f"{job_id}@{worker_id}.json"
+            try:
+                # リネームでは更新日時が変わらないため、取得前にリースの開始時刻を設定します。
+                os.utime(src)
+                os.rename(src, dst)
+            except FileNotFoundError:
+                continue  # 他のワーカーが取得済み
+            if (self._dir("done") / name).exists():  # 期限切れで戻されたが、完了済みのジョブ
+                dst.unlink(missing_ok=True)
+                continue
+            try:
+                with open(dst, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                job = BatchJob.from_dict(data)
+            except (OSError, ValueError, TypeError) as e:
+                self._write(self._dir("failed") / name, asdict(BatchResult(name, error=f"Invalid job: {e}")))
+                dst.unlink(missing_ok=True)
+                continue
+            return ClaimedJob(job_id, job, dst)
+        return None
+
+    def heartbeat(self, claimed: ClaimedJob) -> bool:
+        """
+        処理中のジョブのリースを延長します。
+        :param claimed: 取得したジョブ
+        :return: リースを失った(期限切れで他のワーカーに戻された)場合はFalse
+        """
+        try:
+            os.utime(claimed.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, claimed: ClaimedJob, result: BatchResult):
+        """
+        処理結果を書き込み、ジョブを完了します。
+        :param claimed: 取得したジョブ
+        :param result: 処理結果
+        """
+        name = f"{claimed.job_id}.json"
+        self._write(self._dir("done" if result.ok else "failed") / name, asdict(result))
+        if result.ok:  # 再登録して成功した場合は、前回のエラーを削除します。
+            (self._dir("failed") / name).unlink(missing_ok=True)
+        claimed.path.unlink(missing_ok=True)
+
+    def reclaim(self, now: Optional[float] = None) -> int:
+        """
+        リースの期限を過ぎた処理中のジョブを未処理に戻します。
+        :param now: 現在時刻。Noneの場合はtime.time()
+        :return: 戻した件数
+        """
+        now = time.time() if now is None else now
+        count = 0
+        for entry in os.scandir(self._dir("running")):
+            try:
+                if entry.stat().st_mtime + self.lease > now:
+                    continue
+                job_id = entry.name.split("@")[0]
+                os.rename(entry.path, self._dir("pending") / f"{job_id}.json")
+                count += 1
+            except FileNotFoundError:
+                pass  # 完了、または他のワーカーが戻した
+        return count
+
+    def counts(self) -> dict[str, int]:
+        """
+        状態毎のジョブ数
+        :return: pending、running、done、failedの件数
+        """
+        counts = {}
+        for sub_dir in ("pending", "running", "done", "failed"):
+            counts[sub_dir] = sum(1 for name in os.listdir(self._dir(sub_dir)) if name.endswith(".json"))
+        return counts
+
+    def results(self) -> Iterator[BatchResult]:
+        """
+        処理結果を列挙します。
+        :return: 処理結果
+        """
+        for sub_dir in ("done", "failed"):
+            for path in sorted(self._dir(sub_dir).glob("*.json")):
+                with open(path, "r", encoding="utf-8") as file:
+                    yield BatchResult(**json.load(file))
+
+
+class LeaseKeeper:
+    """
+    処理中のジョブのリースを、バックグラウンドのスレッドで定期的に延長します。
+    """
+    def __init__(self, queue: JobQueue, claimed: ClaimedJob):
+        """
+        コンストラクタ
+        :param queue: ジョブキュー
+        :param claimed: 取得したジョブ
+        """
+        self.queue = queue
+        self.claimed = claimed
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.queue.lease / 3):
+            if not self.queue.heartbeat(self.claimed):
+                return
+
+    def __enter__(self) -> 'LeaseKeeper':
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_worker(spool_dir: Path, worker_id: str = "", lease: float = 300.0, poll: float = 1.0,
+               wait: bool = False, max_jobs: Optional[int] = None,
+               progress: Optional[Callable[[BatchResult, BatchSummary], None]] = None) -> BatchSummary:
+    """
+    ジョブキューよりジョブを取得して処理します。
+    :param spool_dir: スプールフォルダ
+    :param worker_id: ワーカー名。空文字の場合はホスト名-プロセスID
+    :param lease: リースの期間(秒)
+    :param poll: 未処理のジョブがない場合の待機時間(秒)
+    :param wait: Trueの場合は、未処理のジョブがなくなっても終了せずに待機します。
+    :param max_jobs: 処理件数の上限
+    :param progress: 1ファイル処理毎に呼び出すコールバック
+    :return: 集計結果
+    """
+    queue = JobQueue(spool_dir, lease)
+    worker_id = _INVALID_WORKER_CHARS.sub("_", worker_id) if worker_id else default_worker_id()
+    summary = BatchSummary()
+    sw = Stopwatch.start_new()
+    while max_jobs is None or summary.total < max_jobs:
+        queue.reclaim()
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            # 他のワーカーの処理中のジョブは、期限切れで戻される可能性があるため完了まで待機します。
+            if not wait and queue.counts()["running"] == 0:
+                break
+            time.sleep(poll)
+            continue
+        with LeaseKeeper(queue, claimed):
+            result = process_job(claimed.job)
+        queue.complete(claimed, result)
+        summary.add(result)
+        summary.elapsed = sw.elapsed
+        if progress:
+            progress(result, summary)
+    summary.elapsed = sw.stop()
+    return summary
+
+
+def run_local_workers(spool_dir: Path, workers: int, lease: float = 300.0, poll: float = 1.0,
+                      wait: bool = False) -> BatchSummary:
+    """
+    同じマシンで複数のワーカープロセスを実行します。
+    :param spool_dir: スプールフォルダ
+    :param workers: ワーカープロセス数
+    :param lease: リースの期間(秒)
+    :param poll: 未処理のジョブがない場合の待機時間(秒)
+    :param wait: Trueの場合は、未処理のジョブがなくなっても終了せずに待機します。
+    :return: 全ワーカーの集計結果
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers <= 1:
+        return run_worker(spool_dir, lease=lease, poll=poll, wait=wait)
+    total = BatchSummary()
+    sw = Stopwatch.start_new()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_worker, spool_dir, f"{default_worker_id()}-{i}", lease, poll, wait)
+                   for i in range(workers)]
+        for future in futures:
+            total.merge(future.result())
+    total.elapsed = sw.stop()
+    return total
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+    MetadataCache
+    画像の大きさ、画像形式、メタデータの概要、サムネイルをSQLiteに保存し、起動をまたいで再利用します。
+    キーは(パス, 最終更新日時, ファイルサイズ)です。ファイルが更新された場合は再取得します。
+"""
+from dataclasses import dataclass
+import io
+import json
+import os
+from pathlib import Path
+import sqlite3
+from threading import Lock
+import time
+from typing import Optional
+import zlib
+
+from PIL import Image
+
+from . image_file_service import ImageFileService
+from . utils import get_user_cache_dir
+
+# データベースのスキーマのバージョン。変更時はキャッシュを作り直します。
+SCHEMA_VERSION: int = 1
+# 最終参照日時を更新する間隔(秒)。参照のみの取り込みで、ファイル毎に書き込まないように間引きます。
+ACCESS_UPDATE_INTERVAL: float = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class CachedMetadata:
+    """
+    キャッシュした画像の情報
+    取り込み時は画像形式のみを判定するため、幅と高さは0(未取得)の場合があります。
+    """
+    width: int = 0  # 幅
+    height: int = 0  # 高さ
+    format: str = ""  # ファイル先頭のバイト列より判定した画像形式
+    summary: str = ""  # メタデータの概要(JSON)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """
+        画像の大きさ
+        :return: 画像の幅と高さ
+        """
+        return self.width, self.height
+
+    @property
+    def is_probed(self) -> bool:
+        """
+        ヘッダーより画像の大きさを取得済みかどうか
+        :return: 取得済みの場合はTrue
+        """
+        return self.width > 0 and self.height > 0
+
+
+class MetadataCache:
+    """
+    画像情報の永続キャッシュ
+    ワーカースレッドからも使用するため、接続はロックで保護します。
+    """
+    def __init__(self, db_path: Path, max_bytes: int = 256 * 1024 * 1024, thumbnail_size: int = 128):
+        """
+        コンストラクタ
+        :param db_path: データベースファイルのパス
+        :param max_bytes: キャッシュの上限サイズ(バイト)。超過時は最終参照日時の古いものから削除します。
+        :param thumbnail_size: サムネイルの長辺のピクセル数
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self._lock = Lock()
+        self._conn = self._open()
+        self._total_bytes: int = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, settings, app_name: str) -> Optional['MetadataCache']:
+        """
+        設定ファイルよりキャッシュを生成します。キャッシュは明示的に有効化した場合のみ使用します。
+        :param settings: アプリの設定情報
+        :param app_name: アプリ名(キャッシュディレクトリ名)
+        :return: キャッシュ。無効時または開けない場合はNone
+        """
+        options = settings.get("metadata_cache", {})
+        if not isinstance(options, dict) or options.get("enabled", False) is not True:
+            return None
+        directory = options.get("directory") or get_user_cache_dir(app_name)
+        try:
+            return cls(Path(directory, "metadata.sqlite3"),
+                       max_bytes=int(options.get("max_size_mb", 256)) * 1024 * 1024,
+                       thumbnail_size=int(options.get("thumbnail_size", 128)))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Metadata cache disabled:{e}")
+            return None
+
+    def _open(self) -> sqlite3.Connection:
+        """
+        データベースを開きます。
+        整合性チェックに失敗した場合、スキーマのバージョンが異なる場合は作り直します。
+        :return: データベースの接続
+        """
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            conn = self._connect()
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version in (0, SCHEMA_VERSION) and conn.execute("PRAGMA quick_check(1)").fetchone()[0] == "ok":
+                self._create_schema(conn)
+                return conn
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            print(f"Metadata cache is corrupt:{e}")
+        # 壊れたキャッシュは削除して作り直します。
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(self.db_path) + suffix).unlink(missing_ok=True)
+        conn = self._connect()
+        self._create_schema(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        データベースに接続します。
+        :return: データベースの接続
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        """
+        テーブルを作成します。
+        :param conn: データベースの接続
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                file_size INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                format TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                thumbnail BLOB,
+                thumbnail_crc INTEGER,
+                bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    @staticmethod
+    def _key(file_path: Path) -> tuple[str, int, int]:
+        """
+        キャッシュのキーを取得します。
+        :param file_path: 画像ファイルのパス
+        :return: パス、最終更新日時(ナノ秒)、ファイルサイズ
+        """
+        st = os.stat(file_path)
+        return os.path.normcase(os.path.abspath(file_path)), st.st_mtime_ns, st.st_size
+
+    def get(self, file_path: Path) -> Optional[CachedMetadata]:
+        """
+        キャッシュした画像の情報を取得します。
+        最終参照日時は、前回の更新からACCESS_UPDATE_INTERVAL以上経過した場合のみ更新します。
+        :param file_path: 画像ファイルのパス
+        :return: 画像の情報。キャッシュに存在しない、またはファイルが更新されている場合はNone
+        """
+        try:
+            path, mtime_ns, file_size = self._key(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT width, height, format, summary, last_access FROM entries "
+                "WHERE path=? AND mtime_ns=? AND file_size=?",
+                (path, mtime_ns, file_size)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[4] >= ACCESS_UPDATE_INTERVAL:
+                self._conn.execute("UPDATE entries SET last_access=? WHERE path=?", (now, path))
+        return CachedMetadata(*row[:4])
+
+    def get_or_probe(self, file_path: Path) -> CachedMetadata:
+        """
+        画像の情報を取得します。キャッシュに存在しない、または画像形式のみ判定済みの場合は、
+        画像ファイルのヘッダーを読み込みキャッシュします。
+        :param file_path: 画像ファイルのパス
+        :return: 画像の情報
+        """
+        metadata = self.get(file_path)
+        if metadata is None or not metadata.is_probed:
+            metadata = self.probe(file_path)
+            self.put(file_path, metadata)
+        return metadata
+
+    @staticmethod
+    def probe(file_path: Path) -> CachedMetadata:
+        """
+        画像ファイルのヘッダーより画像の情報を取得します。画素のデコードは行いません。
+        :param file_path: 画像ファイルのパス
+        :return: 画像の情報
+        """
+        sniff = ImageFileService.sniff(file_path)
+        with Image.open(file_path) as img:
+            info = img.info
+            summary = {
+                "mode": img.mode,
+                "frames": getattr(img, "n_frames", 1),
+                "has_exif": "exif" in info,
+                "has_icc_profile": "icc_profile" in info,
+                "keys": sorted(str(key) for key in info.keys()),
+            }
+            return CachedMetadata(img.width, img.height, sniff.format, json.dumps(summary, ensure_ascii=False))
+
+    def put(self, file_path: Path, metadata: CachedMetadata):
+        """
+        画像の情報をキャッシュします。サムネイルは保持します。
+        :param file_path: 画像ファイルのパス
+        :param metadata: 画像の情報
+        """
+        try:
+            path, mtime_ns, file_size = self._key(file_path)
+        except OSError:
+            return
+        row_bytes = len(path) + len(metadata.summary) + 64
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT bytes, thumbnail, thumbnail_crc, mtime_ns, file_size FROM entries WHERE path=?",
+                (path,)).fetchone()
+            thumbnail, thumbnail_crc = None, None
+            if old is not None:
+                self._total_bytes -= old[0]
+                if (old[3], old[4]) == (mtime_ns, file_size):  # 同じファイルのサムネイルは引き継ぎます。
+                    thumbnail, thumbnail_crc = old[1], old[2]
+                    row_bytes += len(thumbnail) if thumbnail else 0
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, mtime_ns, file_size, metadata.width, metadata.height, metadata.format, metadata.summary,
+                 thumbnail, thumbnail_crc, row_bytes, time.time()))
+            self._total_bytes += row_bytes
+            self._evict()
+
+    def get_thumbnail(self, file_path: Path) -> Optional[Image.Image]:
+        """
+        キャッシュしたサムネイルを取得します。
+        :param file_path: 画像ファイルのパス
+        :return: サムネイル。存在しない、または破損している場合はNone
+        """
+        try:
+            path, mtime_ns, file_size = self._key(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT thumbnail, thumbnail_crc FROM entries WHERE path=? AND mtime_ns=? AND file_size=?",
+                (path, mtime_ns, file_size)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        data, crc = row
+        if zlib.crc32(data) != crc:  # 破損したサムネイルは破棄します。
+            with self._lock:
+                self._conn.execute("UPDATE entries SET thumbnail=NULL, thumbnail_crc=NULL WHERE path=?", (path,))
+            return None
+        thumbnail = Image.open(io.BytesIO(data))
+        thumbnail.load()
+        return thumbnail
+
+    def put_thumbnail(self, file_path: Path, thumbnail: Image.Image):
+        """
+        サムネイルをキャッシュします。画像の情報が未登録の場合は、ヘッダーより取得して登録します。
+        :param file_path: 画像ファイルのパス
+        :param thumbnail: サムネイル
+        """
+        if self.get(file_path) is None:
+            self.put(file_path, self.probe(file_path))
+        buffer = io.BytesIO()
+        if thumbnail.mode not in ("RGB", "L"):
+            thumbnail = thumbnail.convert("RGB")
+        thumbnail.save(buffer, format="JPEG", quality=85)
+        data = buffer.getvalue()
+        try:
+            path, _, _ = self._key(file_path)
+        except OSError:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT bytes, thumbnail FROM entries WHERE path=?", (path,)).fetchone()
+            if row is None:
+                return
+            row_bytes = row[0] - (len(row[1]) if row[1] else 0) + len(data)
+            self._conn.execute(
+                "UPDATE entries SET thumbnail=?, thumbnail_crc=?, bytes=?, last_access=? WHERE path=?",
+                (data, zlib.crc32(data), row_bytes, time.time(), path))
+            self._total_bytes += row_bytes - row[0]
+            self._evict()
+
+    def _evict(self):
+        """
+        上限サイズを超えた場合、最終参照日時の古いものから上限の9割まで削除します。
+        ロックを取得した状態で呼び出します。
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 9 // 10
+        rows = self._conn.execute("SELECT path, bytes FROM entries ORDER BY last_access")
+        evicted: list[tuple[str]] = []
+        for path, row_bytes in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((path,))
+            self._total_bytes -= row_bytes
+        self._conn.executemany("DELETE FROM entries WHERE path=?", evicted)
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        キャッシュの使用サイズ
+        :return: 使用サイズ(バイト)
+        """
+        return self._total_bytes
+
+    def close(self):
+        """
+        データベースを閉じます。
+        """
+        with self._lock:
+            self._conn.close()
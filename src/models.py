@@ -4,24 +4,20 @@
     データモデル関連
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 import os
 from pathlib import Path
-from typing import Any, Optional, Literal, Callable
+import re
+from typing import Any, Iterator, Optional, Literal, Callable
 
+from . import PROGRAM_NAME
 from . app_config import AppConfig
+from . image_file_service import EXTENSION_FORMATS, ImageFileService, SniffResult
+from . metadata_cache import CachedMetadata, MetadataCache
 from . effects.image_effects import MosaicEffect
 
-# 画像形式
-ImageFormat = {
-    'PNG': ('*.png', ),
-    'JPEG': ('*.jpg', '*.jpeg', ),
-    'WEBP': ('*.webp', ),
-    'BMP': ('*.bmp', ),
-    'PNM': ('*.pbm', '*.pgm', '*.ppm', )
-}
-
 
 @dataclass(frozen=True)
 class ImageFileInfo:
@@ -72,6 +68,175 @@ class StatusBarInfo(ImageFileInfo):
 # 画像データの状態
 DATA_STATE = Literal["Modified", "Unchanged"]
 
+# 画像一覧の各画像の状態(フィルムストリップのバッジ)
+IMAGE_STATE = Literal["Modified", "Saved", ""]
+
+# 画像一覧の並び順
+SORT_KEY = Literal["natural", "mtime", "size", "name"]
+SORT_KEYS: tuple[str, ...] = ("natural", "mtime", "size", "name")
+
+
+@dataclass(frozen=True)
+class FileStat:
+    """
+    ファイルの属性情報(キャッシュ用)
+    """
+    mtime: float = 0.0  # 最終更新日時(UNIX時間)
+    size: int = 0  # ファイルサイズ(バイト)
+
+
+class ImageList:
+    """
+    インデックス付きの画像ファイル一覧
+    パス→インデックスの辞書を保持し、存在確認と重複排除をO(1)で行います。
+    """
+    # 自然順ソート用の数字部分の分割
+    _NATURAL_SPLIT = re.compile(r'(\d+)')
+
+    def __init__(self):
+        """
+        コンストラクタ
+        """
+        self._items: list[Path] = []
+        self._index: dict[str, int] = {}  # 正規化したパス → インデックス
+        self._stats: dict[str, FileStat] = {}  # 正規化したパス → ファイル属性
+        self._sniffs: dict[str, SniffResult] = {}  # 正規化したパス → 画像形式の判定結果
+        self._saved: set[str] = set()  # モザイク画像を保存済みのファイル(正規化したパス)
+
+    @staticmethod
+    def normalize(file_path: Path) -> str:
+        """
+        重複判定用にパスを正規化します。
+        ファイルシステムへのアクセスは行いません。
+        :param file_path: ファイルパス
+        :return: 正規化したパス
+        """
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def add(self, file_path: Path, stat: Optional[FileStat] = None, sniff: Optional[SniffResult] = None) -> bool:
+        """
+        画像ファイルを追加します。
+        :param file_path: ファイルパス
+        :param stat: ファイルの属性情報
+        :param sniff: 画像形式の判定結果
+        :return: 追加時はTrue、登録済みの場合はFalse
+        """
+        key = self.normalize(file_path)
+        if key in self._index:
+            return False
+        self._index[key] = len(self._items)
+        self._items.append(file_path)
+        if stat is not None:
+            self._stats[key] = stat
+        if sniff is not None:
+            self._sniffs[key] = sniff
+        return True
+
+    def index_of(self, file_path: Path) -> int:
+        """
+        ファイルのインデックスを取得します。
+        :param file_path: ファイルパス
+        :return: インデックス。存在しない場合は-1
+        """
+        return self._index.get(self.normalize(file_path), -1)
+
+    def stat(self, file_path: Path) -> FileStat:
+        """
+        ファイルの属性情報を取得します。未取得の場合はファイルシステムより取得しキャッシュします。
+        :param file_path: ファイルパス
+        :return: ファイルの属性情報
+        """
+        key = self.normalize(file_path)
+        stat = self._stats.get(key)
+        if stat is None:
+            try:
+                st = os.stat(file_path)
+                stat = FileStat(st.st_mtime, st.st_size)
+            except OSError:
+                stat = FileStat()
+            self._stats[key] = stat
+        return stat
+
+    def sniff(self, file_path: Path) -> SniffResult:
+        """
+        取り込み時に判定した画像形式を取得します。未判定の場合はファイル先頭より判定しキャッシュします。
+        :param file_path: ファイルパス
+        :return: 画像形式の判定結果
+        """
+        key = self.normalize(file_path)
+        sniff = self._sniffs.get(key)
+        if sniff is None:
+            sniff = ImageFileService.sniff(file_path)
+            self._sniffs[key] = sniff
+        return sniff
+
+    def mark_saved(self, file_path: Path):
+        """
+        モザイク画像を保存済みに設定します。
+        :param file_path: 元画像のファイルパス
+        """
+        self._saved.add(self.normalize(file_path))
+
+    def is_saved(self, file_path: Path) -> bool:
+        """
+        モザイク画像を保存済みかどうか
+        :param file_path: 元画像のファイルパス
+        :return: 保存済みの場合はTrue
+        """
+        return self.normalize(file_path) in self._saved
+
+    def sort(self, key: SORT_KEY = "natural", reverse: bool = False):
+        """
+        一覧を並べ替えます。
+        ファイルの属性情報はキャッシュしたものを使用します。
+        :param key: 並び順 natural:自然順, mtime:更新日時順, size:サイズ順, name:名前順
+        :param reverse: 降順時はTrue
+        """
+        if key == "natural":
+            def sort_key(f: Path) -> Any:
+                return [int(t) if t.isdigit() else t.casefold() for t in self._NATURAL_SPLIT.split(f.name)]
+        elif key == "mtime":
+            def sort_key(f: Path) -> Any:
+                return self.stat(f).mtime
+        elif key == "size":
+            def sort_key(f: Path) -> Any:
+                return self.stat(f).size
+        elif key == "name":
+            def sort_key(f: Path) -> Any:
+                return f.name.casefold()
+        else:
+            raise ValueError(f"sort key:{key}")
+
+        self._items.sort(key=sort_key, reverse=reverse)
+        self._index = {self.normalize(f): i for i, f in enumerate(self._items)}
+
+    def clear(self):
+        """
+        一覧をクリアします。
+        """
+        self._items.clear()
+        self._index.clear()
+        self._stats.clear()
+        self._sniffs.clear()
+        self._saved.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> Path:
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[Path]:
+        return iter(self._items)
+
+    def __contains__(self, file_path: object) -> bool:
+        if not isinstance(file_path, (str, os.PathLike)):
+            return False
+        return self.normalize(Path(file_path)) in self._index
+
+    def __str__(self) -> str:
+        return str(self._items)
+
 
 class AppDataModel:
     """
@@ -83,10 +248,10 @@ class AppDataModel:
         :param settings: アプリの設定情報
         """
         self._settings = settings
-        self.image_list: list[Path] = []
+        self.image_list: ImageList = ImageList()
         self.current: int = 0
         # 許可される拡張子のリスト
-        self.allowed_extensions = [".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".svg"]
+        self.allowed_extensions = list(EXTENSION_FORMATS.keys())
         self.file_property_visible: bool = False
         # ディレクトリをドロップ時
         self._is_save_directory: bool = False
@@ -96,21 +261,85 @@ class AppDataModel:
         # プリセット
         self._current_preset_name = settings.effect_presets.default_preset
         self._current_effect = settings.effect_presets.get_preset(self._current_preset_name)
+        # 起動をまたいで画像情報を再利用するキャッシュ(設定ファイルで有効化時のみ)
+        self.metadata_cache: Optional[MetadataCache] = MetadataCache.from_config(settings, PROGRAM_NAME)
 
     def add_images(self, image_list: list[Path]) -> int:
         """
         画像ファイルを追加します。
+        ファイル先頭のバイト列を並列に読み込み、壊れたファイルは追加しません。
         :param image_list: 画像ファイルのリスト
         :return: 追加した件数
         """
-        count: int = 0
+        candidates: list[Path] = []
         for image in image_list:
-            if not self.check_image_file(image):
+            if not self.is_allowed_extension(image):
                 continue
-            self.image_list.append(image)
-            count += 1
+            if image in self.image_list:
+                continue  # 登録済みのファイルは追加しません。
+            candidates.append(image)
+
+        if len(candidates) > 1:
+            # 高レイテンシのストレージを考慮し、I/Oをスレッドプールで並列に実行します。
+            with ThreadPoolExecutor() as executor:
+                results = list(executor.map(self.validate_image_file, candidates))
+        else:
+            results = [self.validate_image_file(image) for image in candidates]
+
+        count: int = 0
+        for image, (stat, sniff) in zip(candidates, results):
+            if stat is None:
+                continue  # ファイルが存在しない
+            if not sniff.is_valid:
+                print(f"Skip invalid image file:{image} format:{sniff.format or 'unknown'}")
+                continue
+            if sniff.format != EXTENSION_FORMATS.get(image.suffix.lower()):
+                print(f"Image format mismatch:{image} format:{sniff.format}")
+            if self.image_list.add(image, stat, sniff):
+                count += 1
         return count
 
+    def validate_image_file(self, file_path: Path) -> tuple[Optional[FileStat], SniffResult]:
+        """
+        画像ファイルの属性とファイル先頭のバイト列を読み込みます。
+        キャッシュに判定済みの画像形式が存在する場合は、ファイルを読み込みません。
+        キャッシュに存在しない場合は、判定した画像形式をキャッシュし、次回の起動時に再利用します。
+        ワーカースレッドより呼び出します。
+        :param file_path: ファイルパス
+        :return: ファイルの属性情報(ファイルが存在しない場合はNone)と画像形式の判定結果
+        """
+        try:
+            st = file_path.stat()
+        except OSError:
+            return None, SniffResult()
+        stat = FileStat(st.st_mtime, st.st_size)
+        if self.metadata_cache is not None:
+            cached = self.metadata_cache.get(file_path)
+            if cached is not None and cached.format:
+                return stat, SniffResult(cached.format)
+        sniff = ImageFileService.sniff(file_path)
+        if self.metadata_cache is not None and sniff.is_valid:
+            self.metadata_cache.put(file_path, CachedMetadata(format=sniff.format))
+        return stat, sniff
+
+    def get_image_size(self, file_path: Path) -> tuple[int, int]:
+        """
+        画像の大きさを取得します。キャッシュが有効な場合はキャッシュより取得します。
+        :param file_path: 画像ファイルのパス
+        :return: 画像の幅と高さ
+        """
+        if self.metadata_cache is None:
+            return ImageFileService.get_image_size(file_path)
+        return self.metadata_cache.get_or_probe(file_path).size
+
+    def close(self):
+        """
+        アプリの終了時に呼び出します。キャッシュを閉じます。
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.close()
+            self.metadata_cache = None
+
     def get(self, key: str, default=None) -> Any:
         """
         設定値を取得する。
@@ -171,13 +400,14 @@ class AppDataModel:
     def check_image_file(self, file_path: Path) -> bool:
         """
         画像ファイルの検証
-        ファイルの存在、許可された拡張子かをチェックします。
+        許可された拡張子か、ファイルの存在、ファイル先頭のバイト列が正常な画像形式かをチェックします。
         :param file_path: チェックするファイルパス
         :return: チェック結果 正常:true、検証エラー:false
         """
-        if not file_path.exists():
+        if not self.is_allowed_extension(file_path):
             return False
-        return self.is_allowed_extension(file_path)
+        stat, sniff = self.validate_image_file(file_path)
+        return stat is not None and sniff.is_valid
 
     def is_allowed_extension(self, file_path: Path) -> bool:
         """
@@ -194,7 +424,7 @@ class AppDataModel:
         モザイク加工中の画像があれば保存イベントを呼び出します。
         """
         self.commit()
-        self.image_list = []
+        self.image_list.clear()
         self.current = 0
         self._is_save_directory = False
 
@@ -227,6 +457,71 @@ class AppDataModel:
         #else:
         #    raise IndexError("No more files in the list.")
 
+    def jump_to_index(self, index: int) -> bool:
+        """
+        インデックスを指定した画像に移動します。
+        :param index: 移動先のインデックス
+        :return: 移動時はTrue、範囲外の場合はFalse
+        """
+        if not 0 <= index < len(self.image_list):
+            return False
+        self.commit()
+        self.current = index
+        return True
+
+    def jump_to_file(self, file_path: Path) -> bool:
+        """
+        指定したファイルの画像に移動します。
+        :param file_path: 移動先のファイルパス
+        :return: 移動時はTrue、一覧に存在しない場合はFalse
+        """
+        return self.jump_to_index(self.image_list.index_of(file_path))
+
+    def sort_images(self, key: SORT_KEY = "natural", reverse: bool = False):
+        """
+        画像一覧を並べ替えます。
+        並べ替え後も処理中の画像を選択状態に保ちます。
+        :param key: 並び順
+        :param reverse: 降順時はTrue
+        """
+        current = self.get_current_image()
+        self.image_list.sort(key, reverse)
+        if current is not None:
+            self.current = self.image_list.index_of(current)
+
+    def get_image_state(self, index: int) -> IMAGE_STATE:
+        """
+        画像一覧の画像の状態を取得します。
+        :param index: 画像一覧のインデックス
+        :return: 処理中の画像が編集中の場合はModified、保存済みの場合はSaved、それ以外は空文字
+        """
+        if index == self.current and self.data_state == "Modified":
+            return "Modified"
+        if self.image_list.is_saved(self.image_list[index]):
+            return "Saved"
+        return ""
+
+    def get_current_image_format(self) -> Optional[str]:
+        """
+        現在処理中の画像の画像形式(取り込み時に判定済み)
+        :return: 画像形式。画像が未選択の場合はNone
+        """
+        current = self.get_current_image()
+        if current is None:
+            return None
+        return self.image_list.sniff(current).format
+
+    @property
+    def sort_key(self) -> SORT_KEY:
+        """
+        設定ファイルの画像一覧の並び順を取得します。
+        :return: 並び順
+        """
+        key = self.settings.get("image_list", {}).get("sort_key", "natural")
+        if key not in SORT_KEYS:
+            return "natural"
+        return key
+
     def get_current_image(self) -> Optional[Path]:
         """
         現在処理中の画像
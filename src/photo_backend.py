@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+    PhotoBackend
+    画像をTkのPhotoImageに転送する方法(表示バックエンド)
+    imagetk: ImageTk.PhotoImage(Pillowの変換処理)
+    ppm: PPM/PGMの画像データをphoto putで直接転送します。部分的な転送でも一時的なPhotoImageを作りません。
+    autoは、実行環境で両方の転送時間を計測し、速い方を選択します。
+"""
+from abc import ABC, abstractmethod
+import time
+import tkinter as tk
+from typing import Optional, Union
+
+from PIL import Image, ImageTk
+
+# 転送先のPhotoImage
+Photo = Union[tk.PhotoImage, ImageTk.PhotoImage]
+
+# ImageTkがそのまま転送する画像のモード
+DISPLAY_MODES = ("1", "L", "RGB", "RGBA")
+# PPM(P6)/PGM(P5)で転送できる画像のモード
+PPM_MODES = {"L": b"P5", "RGB": b"P6"}
+
+
+def display_mode(image: Image.Image) -> str:
+    """
+    画像を表示する際のモード。ImageTk.PhotoImageと同じ規則で決めます。
+    :param image: 画像
+    :return: モード
+    """
+    if image.mode in DISPLAY_MODES:
+        return image.mode
+    if image.mode == "P":
+        return "RGBA" if image.has_transparency_data else "RGB"
+    return Image.getmodebase(image.mode)
+
+
+def encode_ppm(image: Image.Image) -> bytes:
+    """
+    画像をPPM/PGMの画像データに変換します。
+    :param image: L、RGBの画像。"1"はLに変換します。
+    :return: 画像データ
+    """
+    if image.mode == "1":
+        image = image.convert("L")
+    magic = PPM_MODES[image.mode]
+    return b"%s %d %d 255\n" % (magic, image.width, image.height) + image.tobytes()
+
+
+class PhotoBackend(ABC):
+    """
+    表示バックエンドの基底クラス
+    """
+    name = ""
+
+    @abstractmethod
+    def create(self, master: tk.Misc, mode: str, size: tuple[int, int]) -> Photo:
+        """
+        空のPhotoImageを生成します。
+        :param master: 親Widget
+        :param mode: 表示する画像のモード(display_mode)
+        :param size: 大きさ
+        :return: PhotoImage
+        """
+        pass
+
+    @abstractmethod
+    def put(self, photo: Photo, image: Image.Image, x: int = 0, y: int = 0):
+        """
+        PhotoImageの指定した位置に画像を転送します。
+        :param photo: 転送先のPhotoImage
+        :param image: 転送する画像
+        :param x: 転送先のX座標
+        :param y: 転送先のY座標
+        """
+        pass
+
+
+class ImageTkBackend(PhotoBackend):
+    """
+    ImageTk.PhotoImageで転送します。
+    """
+    name = "imagetk"
+
+    def create(self, master: tk.Misc, mode: str, size: tuple[int, int]) -> Photo:
+        return ImageTk.PhotoImage(mode, size, master=master)
+
+    def put(self, photo: Photo, image: Image.Image, x: int = 0, y: int = 0):
+        if isinstance(photo, ImageTk.PhotoImage) and (x, y) == (0, 0) and image.size == (photo.width(), photo.height()):
+            photo.paste(image)
+            return
+        self.copy(photo, image, x, y)
+
+    @staticmethod
+    def copy(photo: Photo, image: Image.Image, x: int, y: int):
+        """
+        画像を一時的なPhotoImageに変換し、Tkのphoto copyで転送します。
+        :param photo: 転送先のPhotoImage
+        :param image: 転送する画像
+        :param x: 転送先のX座標
+        :param y: 転送先のY座標
+        """
+        patch = ImageTk.PhotoImage(image, master=photo.tk)
+        # 透過画像は既存の画素と合成せずに置き換えます。
+        photo.tk.call(str(photo), "copy", str(patch), "-to", x, y, "-compositingrule", "set")
+
+
+class PPMBackend(PhotoBackend):
+    """
+    PPM/PGMの画像データをphoto putで転送します。
+    PPMは透過色を持たないため、透過画像はImageTkで転送します。
+    """
+    name = "ppm"
+
+    def create(self, master: tk.Misc, mode: str, size: tuple[int, int]) -> Photo:
+        return tk.PhotoImage(master=master, width=size[0], height=size[1])
+
+    def put(self, photo: Photo, image: Image.Image, x: int = 0, y: int = 0):
+        mode = display_mode(image)
+        if mode == "RGBA":
+            ImageTkBackend.copy(photo, image, x, y)
+            return
+        if image.mode != mode:
+            image = image.convert(mode)
+        photo.tk.call(str(photo), "put", encode_ppm(image), "-format", "ppm", "-to", x, y)
+
+
+BACKENDS: dict[str, type[PhotoBackend]] = {
+    ImageTkBackend.name: ImageTkBackend,
+    PPMBackend.name: PPMBackend,
+}
+# 計測済みのバックエンド(auto)。プロセスで1回のみ計測します。
+_measured: Optional[PhotoBackend] = None
+
+
+def measure(backend: PhotoBackend, master: tk.Misc, image: Image.Image, repeat: int = 5) -> float:
+    """
+    画像全体と一部の転送時間を計測します。
+    :param backend: 表示バックエンド
+    :param master: 親Widget
+    :param image: 計測用の画像
+    :param repeat: 繰り返し回数
+    :return: 最短の転送時間(秒)
+    """
+    photo = backend.create(master, display_mode(image), image.size)
+    patch = image.crop((0, 0, image.width // 4, image.height // 4))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.put(photo, image)
+        backend.put(photo, patch, image.width // 2, image.height // 2)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def select_backend(master: tk.Misc, name: str = "auto", sample_size: int = 512) -> PhotoBackend:
+    """
+    表示バックエンドを選択します。
+    :param master: 親Widget
+    :param name: バックエンドの名前。autoは計測して速い方を選択します。
+    :param sample_size: 計測に使用する画像の一辺のピクセル数(タイルの大きさ)
+    :return: 表示バックエンド
+    """
+    global _measured
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"photo_backend:{name}")
+        return BACKENDS[name]()
+    if _measured is None:
+        sample = Image.effect_noise((sample_size, sample_size), 64).convert("RGB")
+        timings: dict[PhotoBackend, float] = {}
+        for backend_class in BACKENDS.values():
+            backend = backend_class()
+            try:
+                timings[backend] = measure(backend, master, sample)
+            except tk.TclError as e:
+                print(f"photo backend {backend.name} is not available: {e}")
+        _measured = min(timings, key=timings.get) if timings else ImageTkBackend()
+    return _measured
+
+
+class PhotoPool:
+    """
+    同じモードと大きさのPhotoImageを再利用します。
+    タイル、画像の切り替え時にPhotoImageを生成、破棄しません。
+    """
+    def __init__(self, master: tk.Misc, backend: PhotoBackend, max_idle: int = 64):
+        """
+        コンストラクタ
+        :param master: 親Widget
+        :param backend: 表示バックエンド
+        :param max_idle: 再利用のために保持するPhotoImageの上限
+        """
+        self.master = master
+        self.backend = backend
+        self.max_idle = max_idle
+        self.idle: dict[tuple[str, tuple[int, int]], list[Photo]] = {}
+        self.idle_count = 0
+        self.keys: dict[str, tuple[str, tuple[int, int]]] = {}  # 貸出中のPhotoImageの名前 → (モード, 大きさ)
+
+    def acquire(self, image: Image.Image) -> Photo:
+        """
+        画像を転送したPhotoImageを取得します。
+        :param image: 画像
+        :return: PhotoImage
+        """
+        key = (display_mode(image), image.size)
+        photos = self.idle.get(key)
+        if photos:
+            photo = photos.pop()
+            self.idle_count -= 1
+        else:
+            photo = self.backend.create(self.master, *key)
+        self.backend.put(photo, image)
+        self.keys[str(photo)] = key
+        return photo
+
+    def release(self, photo: Photo):
+        """
+        PhotoImageを返却します。上限を超えた場合は破棄します。
+        :param photo: acquireで取得したPhotoImage
+        """
+        key = self.keys.pop(str(photo), None)
+        if key is None or self.idle_count >= self.max_idle:
+            return
+        self.idle.setdefault(key, []).append(photo)
+        self.idle_count += 1
+
+    def clear(self):
+        """
+        保持しているPhotoImageを破棄します。
+        """
+        self.idle.clear()
+        self.idle_count = 0
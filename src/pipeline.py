@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+    pipeline
+    標準入力から画像を読み込み、モザイクをかけた画像を標準出力に書き込むストリーミング処理
+    一時ファイルを使用せず、ディスクに書き込みません。
+
+    フレームの形式(入力、出力共通)
+        ヘッダー: 1行のJSON(NDJSON)。lengthに続く画像のバイト数を指定します。
+        本体: lengthバイトの画像
+    入力のヘッダー
+        {"id": "任意の識別子", "length": 1234, "regions": [[0, 0, 100, 50]], "preset": "mosaic_16", "format": "PNG"}
+        regions、preset、formatは省略できます。省略時は、--regionsの指定、元画像の画像形式を使用します。
+    出力のヘッダー
+        {"id": "任意の識別子", "length": 1200, "format": "PNG", "width": 640, "height": 480}
+        エラー時は {"id": "任意の識別子", "length": 0, "error": "エラーメッセージ"}
+
+    読み込み用スレッドで次の画像のデコードを行い、メインスレッドでの前の画像のエンコードと並行して処理します。
+"""
+from dataclasses import dataclass
+import io
+import json
+from queue import Queue
+import threading
+from typing import Any, BinaryIO, Optional
+
+from PIL import Image
+
+from . batch import Rect, RegionSpec, apply_regions
+from . image_file_service import ImageFileService
+from . utils import Stopwatch
+
+
+class FrameError(Exception):
+    """
+    フレームの形式が不正な場合の例外
+    """
+
+
+@dataclass
+class DecodedFrame:
+    """
+    デコード済みのフレーム
+    """
+    header: dict[str, Any]  # 入力のヘッダー
+    image: Optional[Image.Image] = None  # デコードした画像
+    cell_size: int = 0  # モザイクのセルサイズ
+    regions: tuple[Rect, ...] = ()  # モザイクをかける領域
+    error: str = ""  # エラーメッセージ。正常時は空文字
+
+
+def read_frame(stream: BinaryIO) -> Optional[tuple[dict[str, Any], bytes]]:
+    """
+    フレームを1件読み込みます。
+    :param stream: 入力ストリーム
+    :return: ヘッダーと本体。入力の終端の場合はNone
+    """
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        if line.strip():
+            break  # 空行は読み飛ばします。
+    try:
+        header = json.loads(line)
+        length = int(header["length"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise FrameError(f"Invalid frame header:{line[:80]!r}") from e
+    if length < 0:
+        raise FrameError(f"Invalid frame length:{length}")
+
+    body = stream.read(length)
+    if len(body) != length:
+        raise FrameError(f"Unexpected end of stream:{len(body)}/{length} bytes")
+    return header, body
+
+
+def write_frame(stream: BinaryIO, header: dict[str, Any], body: bytes = b""):
+    """
+    フレームを1件書き込みます。
+    :param stream: 出力ストリーム
+    :param header: ヘッダー。lengthは本体の長さで上書きします。
+    :param body: 本体
+    """
+    header = dict(header, length=len(body))
+    stream.write(json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+    if body:
+        stream.write(body)
+    stream.flush()
+
+
+def decode_frame(header: dict[str, Any], body: bytes, spec: RegionSpec) -> DecodedFrame:
+    """
+    フレームの画像をデコードし、セルサイズと領域を決定します。
+    :param header: 入力のヘッダー
+    :param body: 画像
+    :param spec: ヘッダーで領域を指定しない場合の領域の指定
+    :return: デコード済みのフレーム
+    """
+    try:
+        if "regions" in header or "preset" in header:
+            cell_size, regions = spec.parse_entry(header, spec.base_preset, spec.default[1])
+        else:
+            cell_size, regions = spec.default
+        image = Image.open(io.BytesIO(body))
+        image.load()
+        return DecodedFrame(header, image, cell_size, regions)
+    except Exception as e:
+        return DecodedFrame(header, error=f"{type(e).__name__}: {e}")
+
+
+def encode_frame(frame: DecodedFrame) -> tuple[dict[str, Any], bytes]:
+    """
+    モザイクをかけ、出力形式にエンコードします。
+    :param frame: デコード済みのフレーム
+    :return: 出力のヘッダーと本体
+    """
+    header: dict[str, Any] = {"id": frame.header.get("id")}
+    if frame.error or frame.image is None:
+        header["error"] = frame.error
+        return header, b""
+    try:
+        image = frame.image
+        src_format = image.format or ""
+        image_format = str(frame.header.get("format") or src_format or "PNG").upper()
+        apply_regions(image, frame.cell_size, frame.regions)
+        body = ImageFileService.encode(image, image_format, src_format, image.info)
+        header.update(format=image_format, width=image.width, height=image.height)
+        return header, body
+    except Exception as e:
+        header["error"] = f"{type(e).__name__}: {e}"
+        return header, b""
+    finally:
+        frame.image.close()
+
+
+@dataclass
+class PipelineSummary:
+    """
+    ストリーミング処理の集計
+    """
+    total: int = 0  # 処理件数
+    failed: int = 0  # エラーの件数
+    elapsed: float = 0.0  # 経過時間(秒)
+
+    def __str__(self) -> str:
+        """
+        集計結果の文字列
+        :return: 件数とスループット
+        """
+        return (f"{self.total - self.failed}/{self.total} succeeded, {self.failed} failed, {self.elapsed:.3f}s, "
+                f"{self.total / max(self.elapsed, 1e-9):.1f} images/s")
+
+
+def run_pipeline(input_stream: BinaryIO, output_stream: BinaryIO, spec: RegionSpec,
+                 prefetch: int = 2) -> PipelineSummary:
+    """
+    入力ストリームのフレームを順に処理し、同じ順序で出力ストリームに書き込みます。
+    読み込みとデコードは読み込み用スレッド、モザイクとエンコードはメインスレッドで行います。
+    :param input_stream: 入力ストリーム
+    :param output_stream: 出力ストリーム
+    :param spec: ヘッダーで領域を指定しない場合の領域の指定
+    :param prefetch: 先読みするフレーム数。メモリ使用量の上限になります。
+    :return: 集計結果
+    """
+    # 終端はNone、フレーム形式のエラー、読み込み時の例外(OSErrorなど)は例外を格納します。
+    frames: Queue[Optional[DecodedFrame] | BaseException] = Queue(maxsize=max(1, prefetch))
+
+    def reader():
+        try:
+            while (frame := read_frame(input_stream)) is not None:
+                frames.put(decode_frame(*frame, spec))
+        except BaseException as e:
+            frames.put(e)
+        finally:
+            # 例外の種類によらず終端を格納し、メインスレッドが待ち続けないようにします。
+            frames.put(None)
+
+    thread = threading.Thread(target=reader, name="pipeline-reader", daemon=True)
+    thread.start()
+
+    summary = PipelineSummary()
+    sw = Stopwatch.start_new()
+    while (item := frames.get()) is not None:
+        if isinstance(item, BaseException):
+            # 以降のフレームの境界が分からないため、処理を中断します。
+            raise item
+        header, body = encode_frame(item)
+        write_frame(output_stream, header, body)
+        summary.total += 1
+        if "error" in header:
+            summary.failed += 1
+    thread.join()
+    summary.elapsed = sw.stop()
+    return summary
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+    RegionIndex
+    表示中の画像に適用したモザイクの領域の空間インデックス(格子状のバケット)
+    クリック位置の領域の検索、重なる領域の列挙を、領域の数ではなく、付近の領域の数に比例する時間で行います。
+"""
+from dataclasses import dataclass, field
+import itertools
+from typing import Callable, Iterator, Optional
+
+from PIL import Image
+
+from . edit_history import RegionSnapshot
+
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Rect = tuple[int, int, int, int]
+# バケットの位置(列, 行)
+Bucket = tuple[int, int]
+
+_sequence = itertools.count()
+
+
+@dataclass(eq=False)
+class AppliedRegion:
+    """
+    適用したモザイクの領域
+    """
+    cell_size: int  # セルサイズ
+    rect: Rect  # 元の画像の領域
+    snapshot: Optional[RegionSnapshot] = None  # 適用前の画素(領域の削除時に復元します。)
+    order: int = field(default_factory=lambda: next(_sequence))  # 適用した順序
+
+
+# 適用前の画素を更新した領域と、更新前の画素
+SnapshotSwap = tuple[AppliedRegion, Optional[RegionSnapshot]]
+
+
+def swap_snapshots(swaps: list[SnapshotSwap]):
+    """
+    領域の適用前の画素を入れ替えます。(領域の削除を元に戻す、やり直す場合に使用します。)
+    入れ替え前の画素をswapsに格納するため、もう一度呼び出すと元に戻ります。
+    :param swaps: 領域と、入れ替える画素
+    """
+    for i, (region, snapshot) in enumerate(swaps):
+        swaps[i] = (region, region.snapshot)
+        region.snapshot = snapshot
+
+
+def overlaps(a: Rect, b: Rect) -> bool:
+    """
+    2つの矩形が重なるかどうか
+    :param a: 矩形
+    :param b: 矩形
+    :return: 重なる場合はTrue
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class RegionIndex:
+    """
+    適用したモザイクの領域の空間インデックス
+    """
+    def __init__(self, bucket_size: int = 256):
+        """
+        コンストラクタ
+        :param bucket_size: バケットの一辺のピクセル数
+        """
+        if bucket_size <= 0:
+            raise ValueError(f"bucket_size:{bucket_size}")
+        self.bucket_size = bucket_size
+        self.buckets: dict[Bucket, set[AppliedRegion]] = {}
+        self.regions: set[AppliedRegion] = set()
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+    def __iter__(self) -> Iterator[AppliedRegion]:
+        """
+        適用した順序で列挙します。
+        """
+        return iter(sorted(self.regions, key=lambda region: region.order))
+
+    def _buckets(self, rect: Rect) -> Iterator[Bucket]:
+        """
+        矩形と重なるバケットを列挙します。
+        :param rect: 矩形
+        :return: バケットの位置
+        """
+        size = self.bucket_size
+        for row in range(rect[1] // size, (max(rect[1], rect[3] - 1)) // size + 1):
+            for column in range(rect[0] // size, (max(rect[0], rect[2] - 1)) // size + 1):
+                yield column, row
+
+    def add(self, region: AppliedRegion):
+        """
+        領域を追加します。
+        :param region: 領域
+        """
+        self.regions.add(region)
+        for bucket in self._buckets(region.rect):
+            self.buckets.setdefault(bucket, set()).add(region)
+
+    def remove(self, region: AppliedRegion):
+        """
+        領域を削除します。
+        :param region: 領域
+        """
+        self.regions.discard(region)
+        for bucket in self._buckets(region.rect):
+            regions = self.buckets.get(bucket)
+            if regions is not None:
+                regions.discard(region)
+                if not regions:
+                    del self.buckets[bucket]
+
+    def overlapping(self, rect: Rect) -> list[AppliedRegion]:
+        """
+        矩形と重なる領域を列挙します。
+        :param rect: 矩形
+        :return: 適用した順序の領域
+        """
+        found: set[AppliedRegion] = set()
+        for bucket in self._buckets(rect):
+            found.update(region for region in self.buckets.get(bucket, ()) if overlaps(region.rect, rect))
+        return sorted(found, key=lambda region: region.order)
+
+    def at(self, x: int, y: int) -> list[AppliedRegion]:
+        """
+        点を含む領域を列挙します。
+        :param x: X座標
+        :param y: Y座標
+        :return: 新しい順の領域
+        """
+        return self.overlapping((x, y, x + 1, y + 1))[::-1]
+
+    def hit_test(self, x: int, y: int) -> Optional[AppliedRegion]:
+        """
+        点を含む最も新しい領域
+        :param x: X座標
+        :param y: Y座標
+        :return: 領域。ない場合はNone
+        """
+        regions = self.at(x, y)
+        return regions[0] if regions else None
+
+    def affected_box(self, rect: Rect) -> Rect:
+        """
+        矩形と重なる領域を、重なる領域がなくなるまで含めた矩形
+        この矩形と重なる領域は、全て矩形の内側にあります。(矩形の外の画素は、矩形の中の領域の影響を受けません。)
+        :param rect: 矩形
+        :return: 矩形
+        """
+        box = rect
+        while True:
+            rects = [box] + [region.rect for region in self.overlapping(box)]
+            grown = (min(r[0] for r in rects), min(r[1] for r in rects), max(r[2] for r in rects), max(r[3] for r in rects))
+            if grown == box:
+                return box
+            box = grown
+
+    def remove_and_replay(self, region: AppliedRegion, image: Image.Image,
+                          apply: Callable[[Image.Image, AppliedRegion], object],
+                          to_box: Optional[Callable[[Rect], Rect]] = None) -> list[SnapshotSwap]:
+        """
+        領域を削除し、affected_boxの中の残りの領域を、元の画素から適用した順序で適用し直します。
+        削除後の画像は、残りの領域を元の画像に順に適用した画像(編集ログの再生結果)と一致します。
+        処理時間は画像の大きさではなく、affected_boxの大きさに比例します。
+        各領域の適用前の画素は、適用し直した時点の画素に更新します。(次の削除も元の画素から適用し直せます。)
+        :param region: 削除する領域
+        :param image: 領域を適用した画像
+        :param apply: 画像に領域のモザイクをかける関数
+        :param to_box: 元の画像の座標を、画像の座標に変換する関数(プロキシ編集時)
+        :return: 適用前の画素を更新した領域と、更新前の画素(swap_snapshotsで元に戻します。)
+        """
+        regions = self.overlapping(self.affected_box(region.rect))
+        # 新しい順に適用前の画素を貼り付けると、各画素には最も古い領域の適用前の画素(元の画素)が残ります。
+        for other in reversed(regions):
+            if other.snapshot is not None:
+                other.snapshot.restore(image)
+        self.remove(region)
+        swaps: list[SnapshotSwap] = []
+        for other in regions:
+            if other is region:
+                continue
+            swaps.append((other, other.snapshot))
+            other.snapshot = RegionSnapshot.capture(image, to_box(other.rect) if to_box else other.rect)
+            apply(image, other)
+        return swaps
+
+    def clear(self):
+        """
+        全ての領域を削除します。
+        """
+        self.buckets.clear()
+        self.regions.clear()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+    ThumbnailService
+    サムネイルをワーカースレッドで生成し、メモリと永続キャッシュに保持します。
+    UIスレッドでは、生成済みのサムネイルの取得と完了通知の取り出しのみを行います。
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+from pathlib import Path
+import queue
+from threading import Lock
+from typing import Iterable, Optional
+
+from PIL import Image
+
+from . decode_pool import ProcessDecodePool
+from . metadata_cache import MetadataCache
+
+# ドラフトモードで縮小してデコードできる拡張子
+DRAFT_SUFFIXES = (".jpg", ".jpeg")
+
+
+class ThumbnailService:
+    """
+    サムネイルの生成と保持
+    """
+    def __init__(self, size: int = 96, cache: Optional[MetadataCache] = None,
+                 max_workers: Optional[int] = None, memory_items: int = 1024,
+                 decode_pool: Optional[ProcessDecodePool] = None):
+        """
+        コンストラクタ
+        :param size: サムネイルの長辺のピクセル数
+        :param cache: 永続キャッシュ
+        :param max_workers: ワーカースレッド数
+        :param memory_items: メモリに保持するサムネイルの件数
+        :param decode_pool: 指定した場合は、JPEG以外の画像をワーカープロセスでデコードします。
+        """
+        self.size = size
+        self.cache = cache
+        self.decode_pool = decode_pool
+        self.memory_items = memory_items
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1),
+                                            thread_name_prefix="thumbnail")
+        self._lock = Lock()
+        self._memory: OrderedDict[str, Optional[Image.Image]] = OrderedDict()
+        self._pending: dict[str, Future] = {}
+        self._completed: queue.SimpleQueue[str] = queue.SimpleQueue()
+
+    @staticmethod
+    def _key(file_path: Path) -> str:
+        """
+        サムネイルのキー
+        :param file_path: 画像ファイルのパス
+        :return: 正規化したパス
+        """
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def get(self, file_path: Path) -> Optional[Image.Image]:
+        """
+        生成済みのサムネイルを取得します。ファイルの読み込みは行いません。
+        :param file_path: 画像ファイルのパス
+        :return: サムネイル。未生成、または生成に失敗した場合はNone
+        """
+        key = self._key(file_path)
+        with self._lock:
+            thumbnail = self._memory.get(key)
+            if thumbnail is not None:
+                self._memory.move_to_end(key)
+            return thumbnail
+
+    def has(self, file_path: Path) -> bool:
+        """
+        サムネイルの生成が完了しているか(失敗を含みます)
+        :param file_path: 画像ファイルのパス
+        :return: 生成済みの場合はTrue
+        """
+        with self._lock:
+            return self._key(file_path) in self._memory
+
+    def request(self, file_path: Path):
+        """
+        サムネイルの生成を要求します。生成済み、生成中の場合は何もしません。
+        :param file_path: 画像ファイルのパス
+        """
+        key = self._key(file_path)
+        with self._lock:
+            if key in self._memory or key in self._pending:
+                return
+            self._pending[key] = self._executor.submit(self._run, key, file_path)
+
+    def retain(self, file_paths: Iterable[Path]):
+        """
+        指定したファイル以外の開始前の生成要求を取り消します。
+        スクロールで表示範囲外になった要求を破棄するために使用します。
+        :param file_paths: 生成を継続するファイルのパス
+        """
+        keys = {self._key(f) for f in file_paths}
+        with self._lock:
+            for key in [k for k in self._pending if k not in keys]:
+                if self._pending[key].cancel():
+                    del self._pending[key]
+
+    @property
+    def pending(self) -> int:
+        """
+        生成中の件数
+        :return: 件数
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def poll(self) -> int:
+        """
+        生成が完了した件数を取り出します。UIスレッドより定期的に呼び出します。
+        :return: 前回の呼び出し以降に完了した件数
+        """
+        count = 0
+        while True:
+            try:
+                self._completed.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+
+    def _run(self, key: str, file_path: Path):
+        """
+        サムネイルを生成します。ワーカースレッドで実行します。
+        :param key: サムネイルのキー
+        :param file_path: 画像ファイルのパス
+        """
+        thumbnail: Optional[Image.Image] = None
+        try:
+            thumbnail = self.generate(file_path)
+        except Exception as e:
+            print(f"Thumbnail error:{file_path} {e}")
+        with self._lock:
+            # 完了の通知を生成中の一覧からの削除より先に行います。(pendingとpollの両方が0の間に、
+            # UIスレッドが定期的な呼び出しを停止して、最後のサムネイルを表示しないことがないようにします。)
+            self._completed.put(key)
+            self._pending.pop(key, None)
+            self._memory[key] = thumbnail
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def generate(self, file_path: Path) -> Image.Image:
+        """
+        サムネイルを取得します。永続キャッシュに存在しない場合は、画像ファイルより生成しキャッシュします。
+        :param file_path: 画像ファイルのパス
+        :return: サムネイル
+        """
+        if self.cache is None:
+            return self.create_thumbnail(file_path, self.size, self.decode_pool)
+
+        thumbnail = self.cache.get_thumbnail(file_path)
+        if thumbnail is None or max(thumbnail.size) < self.size:  # 小さい画像は再生成します。
+            thumbnail = self.create_thumbnail(file_path, max(self.size, self.cache.thumbnail_size), self.decode_pool)
+            self.cache.put_thumbnail(file_path, thumbnail)
+        if max(thumbnail.size) > self.size:
+            thumbnail.thumbnail((self.size, self.size))
+        return thumbnail
+
+    @staticmethod
+    def create_thumbnail(file_path: Path, size: int, decode_pool: Optional[ProcessDecodePool] = None) -> Image.Image:
+        """
+        画像ファイルよりサムネイルを生成します。
+        JPEGはドラフトモードで縮小してデコードします。
+        :param file_path: 画像ファイルのパス
+        :param size: サムネイルの長辺のピクセル数
+        :param decode_pool: 指定した場合は、JPEG以外の画像をワーカープロセスでデコードします。
+        :return: サムネイル
+        """
+        if decode_pool is not None and Path(file_path).suffix.lower() not in DRAFT_SUFFIXES:
+            with decode_pool.decode(file_path) as img:
+                return ThumbnailService._shrink(img, size)
+        with Image.open(file_path) as img:
+            img.draft("RGB", (size, size))
+            return ThumbnailService._shrink(img, size)
+
+    @staticmethod
+    def _shrink(img: Image.Image, size: int) -> Image.Image:
+        """
+        画像を縮小し、元の画像を参照しないサムネイルを生成します。
+        :param img: 画像
+        :param size: サムネイルの長辺のピクセル数
+        :return: サムネイル
+        """
+        img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if img.mode not in ("RGB", "RGBA", "L"):
+            return img.convert("RGB" if img.mode == "RGBX" else "RGBA")
+        return img.copy()
+
+    def clear(self):
+        """
+        生成要求とメモリのサムネイルをクリアします。
+        """
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._memory.clear()
+
+    def shutdown(self):
+        """
+        ワーカースレッドを終了します。
+        """
+        self.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
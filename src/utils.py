@@ -2,6 +2,9 @@
 """ユーティリティ"""
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_UP
+import os
+from pathlib import Path
+import sys
 import time
 
 
@@ -12,6 +15,24 @@ def get_package_version() -> str:
     return '0.0.7'
 
 
+def get_user_cache_dir(app_name: str) -> Path:
+    """
+    ユーザーのキャッシュディレクトリを取得します。
+    Windows: %LOCALAPPDATA%/<app_name>/Cache
+    macOS: ~/Library/Caches/<app_name>
+    その他: $XDG_CACHE_HOME/<app_name> または ~/.cache/<app_name>
+    :param app_name: アプリ名
+    :return: キャッシュディレクトリのパス
+    """
+    if os.name == 'nt':
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+        return Path(base, app_name, "Cache")
+    if sys.platform == 'darwin':
+        return Path.home() / "Library" / "Caches" / app_name
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base, app_name)
+
+
 def round_up_decimal(value: Decimal, places: int) -> Decimal:
     """
     指定した小数点以下の桁数に切り上げる関数
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+    Filmstrip
+    画像一覧のサムネイルを表示するフィルムストリップ
+    表示範囲のサムネイルのみを描画します。キャンバスのアイテムは表示枠の数だけ生成し、スクロール時は再利用します。
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import tkinter as tk
+from typing import Optional
+
+from PIL import ImageTk
+
+from . abstract_controllers import AbstractAppController
+
+
+@dataclass
+class FilmstripSlot:
+    """
+    フィルムストリップの表示枠
+    """
+    frame_id: int  # 枠の矩形
+    image_id: int  # サムネイル
+    badge_id: int  # 状態のバッジ
+    index: int = -1  # 表示中の画像一覧のインデックス
+
+
+class FilmstripFrame(tk.Frame):
+    """
+    画面のフィルムストリップ部
+    """
+    PADDING: int = 4  # サムネイルの余白
+    POLL_INTERVAL_MS: int = 30  # サムネイルの生成完了を確認する間隔(ミリ秒)
+    PHOTO_CACHE_ITEMS: int = 256  # 保持するPhotoImageの件数
+
+    def __init__(self, master, controller: AbstractAppController):
+        """
+        コンストラクタ
+        :param master: 親Widget
+        :param controller: コントローラー
+        """
+        super().__init__(master, bg=controller.theme_colors.bg_secondary)
+        self.controller = controller
+        self.thumbnail_service = controller.thumbnail_service
+
+        size = self.thumbnail_service.size
+        self.cell_width: int = size + self.PADDING * 2
+        self.canvas = tk.Canvas(self, height=self.cell_width, bg=controller.theme_colors.bg_secondary,
+                                highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.on_scroll)
+        self.canvas.pack(side=tk.TOP, fill=tk.X)
+        self.scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.offset: int = 0  # 先頭からのスクロール位置(ピクセル)
+        self.slots: list[FilmstripSlot] = []
+        self.photo_images: OrderedDict[str, ImageTk.PhotoImage] = OrderedDict()
+        self.poll_id: Optional[str] = None
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<Button-1>", self.handle_click)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+
+    @property
+    def view_width(self) -> int:
+        """
+        表示領域の幅
+        :return: 幅(ピクセル)
+        """
+        return max(1, self.canvas.winfo_width())
+
+    @property
+    def total_width(self) -> int:
+        """
+        全サムネイルを並べた幅
+        :return: 幅(ピクセル)
+        """
+        return len(self.controller.get_image_list()) * self.cell_width
+
+    def update_view(self):
+        """
+        処理中の画像が表示範囲に入るようにスクロールし、再描画します。
+        """
+        current = self.controller.get_current_index()
+        left = current * self.cell_width
+        if left < self.offset:
+            self.offset = left
+        elif left + self.cell_width > self.offset + self.view_width:
+            self.offset = left + self.cell_width - self.view_width
+        self.redraw()
+
+    def on_scroll(self, *args):
+        """
+        スクロールバーの操作
+        :param args: moveto 位置 または scroll 量 単位
+        """
+        if args[0] == tk.MOVETO:
+            self.offset = int(float(args[1]) * self.total_width)
+        elif args[0] == tk.SCROLL:
+            step = self.cell_width if args[2] == tk.UNITS else self.view_width
+            self.offset += int(args[1]) * step
+        self.redraw()
+
+    def on_mousewheel(self, event):
+        """
+        マウスホイールで横スクロールします。
+        :param event: イベント
+        """
+        self.on_scroll(tk.SCROLL, int(-1 * (event.delta / 120)), tk.UNITS)
+
+    def handle_click(self, event):
+        """
+        クリックしたサムネイルの画像に遷移します。
+        :param event: イベント
+        """
+        index = (self.offset + event.x) // self.cell_width
+        if 0 <= index < len(self.controller.get_image_list()):
+            self.controller.handle_jump_to_index(index)
+
+    def redraw(self):
+        """
+        表示範囲のサムネイルを描画します。
+        未生成のサムネイルはワーカースレッドに生成を要求し、枠のみを描画します。
+        """
+        image_list = self.controller.get_image_list()
+        count = len(image_list)
+        view_width = self.view_width
+        total_width = count * self.cell_width
+        self.offset = max(0, min(self.offset, total_width - view_width))
+
+        first = self.offset // self.cell_width
+        last = min(count, (self.offset + view_width) // self.cell_width + 1)
+        self.ensure_slots(last - first)
+
+        current = self.controller.get_current_index()
+        theme_colors = self.controller.theme_colors
+        for slot_no, slot in enumerate(self.slots):
+            index = first + slot_no
+            if index >= last:
+                slot.index = -1
+                for item_id in (slot.frame_id, slot.image_id, slot.badge_id):
+                    self.canvas.itemconfigure(item_id, state=tk.HIDDEN)
+                continue
+            slot.index = index
+            x = index * self.cell_width - self.offset
+            outline = theme_colors.bg_danger if index == current else theme_colors.bg_white
+            self.canvas.coords(slot.frame_id, x + 1, 1, x + self.cell_width - 1, self.cell_width - 1)
+            self.canvas.itemconfigure(slot.frame_id, state=tk.NORMAL, outline=outline)
+            self.canvas.coords(slot.image_id, x + self.cell_width // 2, self.cell_width // 2)
+            self.canvas.itemconfigure(slot.image_id, state=tk.NORMAL, image=self.get_photo_image(index))
+            self.canvas.coords(slot.badge_id, x + self.cell_width - self.PADDING, self.PADDING)
+            self.canvas.itemconfigure(slot.badge_id, state=tk.NORMAL, text=self.get_badge(index))
+
+        if total_width > 0:
+            self.scrollbar.set(self.offset / total_width, min(1.0, (self.offset + view_width) / total_width))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+        # 前後1画面分を先読みし、それ以外の開始前の生成要求は取り消します。
+        visible = last - first
+        prefetch = [image_list[i] for i in range(max(0, first - visible), min(count, last + visible))]
+        self.thumbnail_service.retain(prefetch)
+        for file_path in prefetch:
+            self.thumbnail_service.request(file_path)
+        self.schedule_poll()
+
+    def ensure_slots(self, count: int):
+        """
+        表示枠のアイテムを生成します。生成済みの枠は再利用します。
+        :param count: 必要な表示枠の数
+        """
+        theme_colors = self.controller.theme_colors
+        font_sizes = self.controller.font_sizes
+        while len(self.slots) < count:
+            self.slots.append(FilmstripSlot(
+                frame_id=self.canvas.create_rectangle(0, 0, 0, 0, width=2, fill=theme_colors.bg_neutral),
+                image_id=self.canvas.create_image(0, 0, anchor=tk.CENTER),
+                badge_id=self.canvas.create_text(0, 0, anchor=tk.NE, font=("", font_sizes.h5, "bold"))))
+
+    def get_badge(self, index: int) -> str:
+        """
+        画像の状態を表すバッジの文字を取得します。
+        :param index: 画像一覧のインデックス
+        :return: 編集中は●、保存済みは✔、それ以外は空文字
+        """
+        state = self.controller.get_image_state(index)
+        if state == "Modified":
+            return "●"
+        if state == "Saved":
+            return "✔"
+        return ""
+
+    def get_photo_image(self, index: int) -> str:
+        """
+        サムネイルのPhotoImageを取得します。
+        :param index: 画像一覧のインデックス
+        :return: PhotoImage。未生成の場合は空文字
+        """
+        file_path = self.controller.get_image_list()[index]
+        key = str(file_path)
+        photo_image = self.photo_images.get(key)
+        if photo_image is not None:
+            self.photo_images.move_to_end(key)
+            return photo_image  # type: ignore
+
+        thumbnail = self.thumbnail_service.get(file_path)
+        if thumbnail is None:
+            return ""
+        photo_image = ImageTk.PhotoImage(thumbnail)
+        self.photo_images[key] = photo_image
+        while len(self.photo_images) > self.PHOTO_CACHE_ITEMS:
+            self.photo_images.popitem(last=False)
+        return photo_image  # type: ignore
+
+    def schedule_poll(self):
+        """
+        サムネイルの生成中は、生成完了を定期的に確認します。
+        """
+        if self.poll_id is None and self.thumbnail_service.pending > 0:
+            self.poll_id = self.after(self.POLL_INTERVAL_MS, self.poll)
+
+    def poll(self):
+        """
+        サムネイルの生成が完了した場合は再描画します。
+        """
+        self.poll_id = None
+        if self.thumbnail_service.poll() > 0:
+            self.redraw()
+        else:
+            self.schedule_poll()
@@ -4,25 +4,40 @@
     画像を表示および編集するためのキャンバス
 """
 import asyncio
+import bisect
+import math
 import tkinter as tk
 from tkinter import messagebox
-from threading import Thread
-from typing import Optional
+from typing import Callable, Optional, Union
 from pathlib import Path
 
-from PIL import ImageTk
+from PIL import Image
 
 from . import PROGRAM_NAME
 from . abstract_controllers import AbstractAppController
+from . batch import BatchJob
+from . brush_stroke import BrushStroke
+from . edit_history import EditHistory, RegionSnapshot, SnapshotGroup
+from . edit_log import EditLog, EditRecord, sidecar_path
 from . utils import Stopwatch
+from . widgets_core import WidgetUtils
 from . image_file_service import ImageFileService
+from . photo_backend import display_mode
+from . region_index import AppliedRegion, RegionIndex, swap_snapshots
+from . widget_tiled_photo import TiledPhotoLayer
 from . effects.image_effects import MosaicEffect
+from . effects.mask_shapes import Ellipse, Shape
 
 
 class ImageCanvas(tk.Frame):
     """
     画面のキャンバス領域
     """
+    # Ctrl+マウスホイールで切り替える表示倍率
+    ZOOM_LEVELS = (0.25, 0.5, 1.0, 2.0)
+    # ウィンドウに合わせて表示する場合の表示倍率の指定
+    ZOOM_FIT = "fit"
+
     def __init__(self, master, controller: AbstractAppController):
         """
         コンストラクタ
@@ -43,7 +58,8 @@ class ImageCanvas(tk.Frame):
         self.vscrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # キャンバスを作成し、スクロールバーを設定
-        self.canvas = tk.Canvas(self, yscrollcommand=self.vscrollbar.set, xscrollcommand=self.hscrollbar.set)
+        # スクロール、リサイズで表示範囲が変わると呼び出され、表示範囲のタイルを更新します。
+        self.canvas = tk.Canvas(self, yscrollcommand=self.on_yscroll, xscrollcommand=self.on_xscroll)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         # スクロールバーのコマンドを設定
@@ -56,12 +72,57 @@ class ImageCanvas(tk.Frame):
             text="画面にフォルダまたはファイルをドラッグ＆ドロップしてください。",
             font=("", font_sizes.h4))
 
-        self.photo_image: Optional[ImageTk.PhotoImage] = None
+        # 画像はタイルに分割し、表示範囲のタイルのみを表示します。
+        canvas_config = self.controller.get_config().get("canvas", {})
+        if not isinstance(canvas_config, dict):
+            canvas_config = {}
+        self.tiles = TiledPhotoLayer(self.canvas, int(canvas_config.get("tile_size", 512)),
+                                     int(canvas_config.get("tile_margin", 1)),
+                                     str(canvas_config.get("photo_backend", "auto")),
+                                     int(canvas_config.get("photo_pool", 64)))
+        # 表示倍率。ZOOM_FITの場合は、ウィンドウの大きさに合わせます。(拡大はしません。)
+        zoom = canvas_config.get("zoom", self.ZOOM_FIT)
+        self.zoom: Union[float, str] = zoom if zoom == self.ZOOM_FIT else float(zoom)
         # モザイク領域の選択開始位置
         self.start_x: int = 0
         self.start_y: int = 0
         self.rect_id: Optional[int] = None  # モザイクを指定した範囲の矩形
+        # Shift+ドラッグは、範囲に内接する楕円のセルにモザイクをかけます。
+        self.drag_ellipse: bool = False
+        self.shape_threshold: float = float(canvas_config.get("shape_threshold", 0.5))  # セルの被覆率の下限
         self.size_label_id: Optional[int] = None  # サイズ表示用ラベル
+        # ドラッグ中の表示更新。マウス移動イベントはアイドル時の1回の更新にまとめます。
+        self.drag_end: tuple[int, int] = (0, 0)  # 最後のマウス移動イベントの位置
+        self.drag_update_id: Optional[str] = None
+        # ドラッグ中に、選択範囲のモザイクを縮小済みの画像から生成して表示します。
+        self.live_preview: bool = bool(canvas_config.get("live_preview", True))
+        self.preview_id: Optional[int] = None
+        self.preview_photo = None
+        # 画素数がproxy_megapixelsを超える画像は、長辺がproxy_sizeの作業用画像(プロキシ)で編集します。(0は無効)
+        # モザイクの領域は元の画像の座標で記録し、保存時に元の画像へまとめて適用します。
+        self.proxy_megapixels: float = float(canvas_config.get("proxy_megapixels", 50))
+        self.proxy_size: int = int(canvas_config.get("proxy_size", 4096))
+        self.image_size: tuple[int, int] = (0, 0)  # 元の画像の大きさ
+        self.proxy_scale: Optional[tuple[float, float]] = None  # 元の画像に対するプロキシの倍率。Noneはプロキシ未使用
+        # 元に戻す、やり直しの履歴。モザイクをかけた矩形の変更前の画素のみを圧縮して保持します。
+        self.history = EditHistory(int(float(canvas_config.get("undo_mb", 256)) * 1024 * 1024))
+        # 保存時に、適用したモザイクの編集ログを出力ファイルの隣に保存します。
+        edit_log_config = self.controller.get_config().get("edit_log", {})
+        if not isinstance(edit_log_config, dict):
+            edit_log_config = {}
+        self.write_edit_log: bool = bool(edit_log_config.get("enabled", True))
+        # 表示中の画像に適用した領域の空間インデックス。クリック位置の領域の選択、削除に使用します。
+        self.regions = RegionIndex()
+        self.selected_region: Optional[AppliedRegion] = None
+        self.selection_id: Optional[int] = None  # 選択した領域の矩形
+        self.drag_active: bool = False  # ドラッグでモザイク領域を選択中かどうか
+        # ブラシ。ドラッグした軌跡のセルにモザイクをかけます。(Bキーで矩形の選択と切り替えます。)
+        self.brush_mode: bool = False
+        self.brush_size: float = float(canvas_config.get("brush_size", 3))  # ブラシの直径(セル数)
+        self.brush: Optional[BrushStroke] = None  # ドラッグ中のストローク
+        self.brush_points: list[tuple[int, int]] = []  # 未処理のマウス移動イベントの位置
+        self.brush_regions: list[AppliedRegion] = []  # ドラッグ中のストロークで適用した領域
+        self.brush_update_id: Optional[str] = None
 
         # ドラッグ開始時のイベントをバインド
         self.canvas.bind("<Button-1>", self.handle_start_drag)
@@ -70,6 +131,12 @@ class ImageCanvas(tk.Frame):
         # ドラッグ終了時のイベントをバインド
         self.canvas.bind("<ButtonRelease-1>", self.handle_end_drag)
 
+        # Ctrl+クリックで、クリック位置の適用済みの領域を選択します。Deleteキーで選択した領域を削除します。
+        # キャンバスはクリック時に入力フォーカスを取得し、Deleteキーはフォーカスがある場合のみ処理します。
+        # (入力欄での文字の削除で、領域を削除しないようにします。)
+        self.canvas.bind("<Control-Button-1>", self.handle_select_region)
+        self.canvas.bind("<Delete>", self.handle_remove_region)
+
         # 右クリックのイベントをバインド
         self.canvas.bind("<Button-3>", self.handle_right_click)
         # Shift+右クリックのイベントをバインド
@@ -79,6 +146,19 @@ class ImageCanvas(tk.Frame):
         # リサイズイベントのunbind用にresize_handler_idにイベント関数を退避します。
         self.resize_handler_id: Optional[str] = self.canvas.bind("<Configure>", self.on_resize)
 
+        # 表示倍率のショートカット(Ctrl+0:ウィンドウに合わせる、Ctrl+1:100%)
+        WidgetUtils.bind_all(self, "Control", "0", lambda event: self.set_zoom(self.ZOOM_FIT))
+        WidgetUtils.bind_all(self, "Control", "1", lambda event: self.set_zoom(1.0))
+        # 元に戻す(Ctrl+Z)、やり直し(Ctrl+Y)
+        WidgetUtils.bind_all(self, "Control", "Z", self.handle_undo)
+        WidgetUtils.bind_all(self, "Control", "Y", self.handle_redo)
+        # 編集ログの読み込み(Ctrl+L)
+        WidgetUtils.bind_all(self, "Control", "L", self.handle_load_edit_log)
+        # ブラシと矩形の選択の切り替え(B)。修飾キーのないキーは、入力欄での入力と区別するため、
+        # キャンバスに入力フォーカスがある場合のみ処理します。
+        self.canvas.bind("<b>", self.handle_toggle_brush)
+        self.canvas.bind("<B>", self.handle_toggle_brush)
+
     # スクロールのバインド関数を追加
     def on_mousewheel(self, event):
         """
@@ -94,6 +174,89 @@ class ImageCanvas(tk.Frame):
         """
         self.canvas.xview_scroll(int(-1 * (event.delta / 120)), "units")
 
+    def on_control_mousewheel(self, event):
+        """
+        Ctrlマウスホイールイベント
+        マウスカーソルの位置を中心に、表示倍率を1段階拡大、縮小します。
+        """
+        scale = self.tiles.scale
+        if event.delta > 0:
+            index = bisect.bisect_right(self.ZOOM_LEVELS, scale)
+            if index >= len(self.ZOOM_LEVELS):
+                return
+        else:
+            index = bisect.bisect_left(self.ZOOM_LEVELS, scale) - 1
+            if index < 0:
+                return
+        self.set_zoom(self.ZOOM_LEVELS[index], (event.x, event.y))
+
+    def zoom_scale(self, image_size: tuple[int, int]) -> float:
+        """
+        現在の表示倍率の指定での、画像の表示倍率
+        :param image_size: 画像の大きさ
+        :return: 表示倍率。ZOOM_FITで画像がキャンバスより小さい場合は1.0
+        """
+        if self.zoom != self.ZOOM_FIT:
+            return float(self.zoom)
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return 1.0  # 画面の表示前
+        return min(width / image_size[0], height / image_size[1], 1.0)
+
+    def set_zoom(self, zoom: Union[float, str], anchor: Optional[tuple[int, int]] = None):
+        """
+        表示倍率を変更します。
+        縮小済みの画像(ImagePyramid)から表示範囲のタイルのみを生成するため、元の画像全体は縮小しません。
+        :param zoom: 表示倍率、またはZOOM_FIT
+        :param anchor: 表示倍率の変更前後で位置を保つキャンバス上の座標。Noneは表示範囲の中央
+        """
+        self.zoom = zoom
+        if self.tiles.image is None:
+            return
+        scale = self.zoom_scale(self.tiles.image.size)
+        old_scale = self.tiles.scale
+        if scale == old_scale:
+            return
+        if anchor is None:
+            anchor = (self.canvas.winfo_width() // 2, self.canvas.winfo_height() // 2)
+        # 倍率の変更前の、anchorの位置の画像上の座標
+        image_x = self.canvas.canvasx(anchor[0]) / old_scale
+        image_y = self.canvas.canvasy(anchor[1]) / old_scale
+
+        self.clear_selection()
+        self.tiles.set_scale(scale)
+        width, height = self.tiles.display_size()
+        self.canvas.xview_moveto((image_x * scale - anchor[0]) / width)
+        self.canvas.yview_moveto((image_y * scale - anchor[1]) / height)
+        self.controller.get_view().set_status_message(f"表示倍率：{scale:.0%}")
+
+    def on_fit_resize(self, event):
+        """
+        画像の表示中のリサイズイベント
+        ウィンドウに合わせて表示中の場合は、表示倍率を更新します。
+        :param event: イベント
+        """
+        if self.zoom == self.ZOOM_FIT:
+            self.set_zoom(self.ZOOM_FIT)
+
+    def on_xscroll(self, first: str, last: str):
+        """
+        水平方向の表示範囲の変更時
+        :param first: 表示範囲の開始位置(0.0～1.0)
+        :param last: 表示範囲の終了位置(0.0～1.0)
+        """
+        self.hscrollbar.set(first, last)
+        self.tiles.schedule_refresh()
+
+    def on_yscroll(self, first: str, last: str):
+        """
+        垂直方向の表示範囲の変更時
+        :param first: 表示範囲の開始位置(0.0～1.0)
+        :param last: 表示範囲の終了位置(0.0～1.0)
+        """
+        self.vscrollbar.set(first, last)
+        self.tiles.schedule_refresh()
+
     def on_resize(self, event):
         """
         リサイズイベント
@@ -118,6 +281,7 @@ class ImageCanvas(tk.Frame):
         # 登録したリサイズイベントの解除
         self.canvas.unbind("<Configure>", self.resize_handler_id)
         self.resize_handler_id = None
+        self.canvas.bind("<Configure>", self.on_fit_resize)
 
         if self.startup_message_id is not None:
             self.canvas.delete(self.startup_message_id)
@@ -126,6 +290,7 @@ class ImageCanvas(tk.Frame):
         # 画像を表示時は、マウスホイールスクロール操作を行えるようにします。
         self.canvas.bind("<MouseWheel>", self.on_mousewheel)
         self.canvas.bind("<Shift-MouseWheel>", self.on_shift_mousewheel)
+        self.canvas.bind("<Control-MouseWheel>", self.on_control_mousewheel)
 
     def handle_right_click(self, event):
         """
@@ -154,93 +319,557 @@ class ImageCanvas(tk.Frame):
     def update_image(self, file_path: Path):
         """
         表示画像を更新します。
+        画像はワーカーで読み込み、完了後に表示します。読み込み中は前の画像を破棄し、編集を受け付けません。
+        読み込みの完了前に画像を切り替えた場合は、前の読み込みを取り消します。
         :param file_path: 画像ファイルパス
         """
         if not file_path.exists():
             return
-        self.original_image = ImageFileService.load(file_path)  # 元の画像を開く
-        self.photo_image = ImageTk.PhotoImage(self.original_image)  # 元の画像のコピーをキャンバスに表示
-        # 画像を更新
-        self.canvas_image = self.canvas.create_image(0, 0, image=self.photo_image, anchor=tk.NW)
-        # キャンバスのスクロール領域を設定
-        self.canvas.config(scrollregion=(0, 0, self.original_image.width, self.original_image.height))
+        self.tiles.clear()
+        self.regions.clear()
+        self.clear_selection()
+        self.history.clear()
+        self.brush = None
+
+        def on_loaded(task: asyncio.Task):
+            if task.cancelled() or task.exception() is None:
+                return
+            try:
+                self.controller.get_view().set_status_message(f"画像を読み込めません：{file_path.name} {task.exception()}")
+            except tk.TclError:
+                pass  # 読み込みの完了前にウィンドウを閉じた場合
+
+        async_service = self.controller.async_service
+        async_service.spawn(self.load_image(file_path), key="canvas_image", done=on_loaded)
+
+    async def load_image(self, file_path: Path):
+        """
+        画像を読み込み、表示します。
+        画素数がproxy_megapixelsを超える画像は、縮小した作業用画像(プロキシ)を読み込みます。
+        :param file_path: 画像ファイルパス
+        """
+        async_service = self.controller.async_service
+        image_size = (await async_service.metadata(file_path)).size
+        if 0 < self.proxy_megapixels * 1_000_000 < image_size[0] * image_size[1]:
+            image = await async_service.run("load", self.load_proxy, file_path, self.proxy_size)
+        else:
+            image = await async_service.load(file_path)
+        self.image_size = image_size
+        self.proxy_scale = None
+        if image.size != image_size:
+            self.proxy_scale = (image.width / image_size[0], image.height / image_size[1])
+            self.controller.get_view().set_status_message(
+                f"プロキシ編集：{image_size[0]}x{image_size[1]}を{image.width}x{image.height}で表示しています。")
+        # デコードのプロセスプールを使用する場合は、共有メモリを参照する読み取り専用の画像です。
+        # モザイクをかけた時点で複製され、共有メモリのブロックは画像の破棄時に返却されます。
+        self.original_image = image
+        # 表示範囲のタイルを表示し、キャンバスのスクロール領域を設定します。
+        self.tiles.set_image(self.original_image, self.zoom_scale(self.original_image.size))
+
+    @staticmethod
+    def load_proxy(file_path: Path, proxy_size: int) -> Image.Image:
+        """
+        長辺がproxy_sizeの作業用画像(プロキシ)を読み込みます。ワーカースレッドで実行します。
+        JPEGはdraftで縮小してデコードするため、元の画像全体はデコードしません。
+        :param file_path: 画像ファイルパス
+        :param proxy_size: プロキシの長辺
+        :return: プロキシ
+        """
+        image = ImageFileService.load(file_path)
+        image.thumbnail((proxy_size, proxy_size), reducing_gap=2.0)
+        return image
 
     def handle_start_drag(self, event):
         """
         ドラッグ開始
         :param event: イベント
         """
+        self.canvas.focus_set()
         # ドラッグ開始位置を記録（キャンバス上の座標に変換）
         self.start_x = int(self.canvas.canvasx(event.x))
         self.start_y = int(self.canvas.canvasy(event.y))
+        self.drag_active = True
+        self.drag_ellipse = bool(event.state & 0x0001) and not self.brush_mode  # Shiftキー
+        self.clear_drag_feedback()
+        if self.brush_mode:
+            self.start_brush()
 
     def handle_dragging(self, event):
         """
         ドラッグ中
+        マウス移動イベント毎には描画せず、アイドル時に最後の位置で1回だけ更新します。
         :param event: イベント
         """
-        end_x = int(self.canvas.canvasx(event.x))
-        end_y = int(self.canvas.canvasy(event.y))
-
-        # 矩形が既に存在する場合は削除します。
-        if self.rect_id is not None:
-            self.canvas.delete(self.rect_id)
-        if self.size_label_id is not None:
-            self.canvas.delete(self.size_label_id)
-
-        # 矩形を描画し、タグを付けます。
-        self.rect_id: Optional[int] = self.canvas.create_rectangle(
-            self.start_x, self.start_y, end_x, end_y,
-            outline=self.controller.theme_colors.bg_danger)
-
-        # サイズを計算して表示します。
-        width = abs(end_x - self.start_x)
-        height = abs(end_y - self.start_y)
+        if not self.drag_active:
+            return  # Ctrl+クリックで領域を選択中
+        self.drag_end = (int(self.canvas.canvasx(event.x)), int(self.canvas.canvasy(event.y)))
+        if self.brush is not None:
+            self.brush_points.append(self.drag_end)
+            if self.brush_update_id is None:
+                self.brush_update_id = self.canvas.after_idle(self.update_brush)
+            return
+        if self.drag_update_id is None:
+            self.drag_update_id = self.canvas.after_idle(self.update_drag_feedback)
 
+    def update_drag_feedback(self):
+        """
+        選択範囲の矩形、サイズ表示用ラベル、モザイクのプレビューを更新します。
+        既存の矩形とラベルは作り直さずに移動します。
+        """
+        self.drag_update_id = None
+        end_x, end_y = self.drag_end
+        view_box = self.tiles.to_image_box((min(self.start_x, end_x), min(self.start_y, end_y),
+                                            max(self.start_x, end_x), max(self.start_y, end_y)))
+        # サイズを計算して表示します。(元の画像のピクセル数)
+        box = self.to_source_box(view_box)
+        text = f"{box[2] - box[0]} x {box[3] - box[1]}"
         # サイズラベルの位置をマウスカーソルの近くに設定します。
         label_x = end_x + 10
         label_y = end_y + 10
 
-        self.size_label_id: Optional[int] = self.canvas.create_text(
-            (label_x, label_y),
-            font=("", self.controller.font_sizes.h5), text=f"{width} x {height}",
-            anchor="nw")
+        if self.rect_id is None:
+            create = self.canvas.create_oval if self.drag_ellipse else self.canvas.create_rectangle
+            self.rect_id = create(
+                self.start_x, self.start_y, end_x, end_y,
+                outline=self.controller.theme_colors.bg_danger)
+            self.size_label_id = self.canvas.create_text(
+                (label_x, label_y),
+                font=("", self.controller.font_sizes.h5), text=text,
+                anchor="nw")
+        else:
+            self.canvas.coords(self.rect_id, self.start_x, self.start_y, end_x, end_y)
+            self.canvas.coords(self.size_label_id, label_x, label_y)
+            self.canvas.itemconfigure(self.size_label_id, text=text)
+
+        if self.live_preview and not self.drag_ellipse:
+            self.update_preview(view_box)
+
+    def update_preview(self, box: tuple[int, int, int, int]):
+        """
+        選択範囲のモザイクのプレビューを表示します。
+        :param box: 表示中の画像(プロキシ編集時はプロキシ)の選択範囲
+        """
+        if self.tiles.pyramid is None:
+            return
+        cell_size = self.resolve_effect().cell_size
+        if self.proxy_scale is not None:
+            cell_size = max(1, round(cell_size * self.proxy_scale[0]))
+        preview = self.tiles.pyramid.render_mosaic(self.tiles.scale, box, cell_size)
+        if preview is None:
+            if self.preview_id is not None:
+                self.canvas.itemconfigure(self.preview_id, state=tk.HIDDEN)
+            return
+        x, y, image = preview
+        backend = self.tiles.pool.backend
+        if self.preview_photo is None or (self.preview_photo.width(), self.preview_photo.height()) != image.size:
+            self.preview_photo = backend.create(self.canvas, display_mode(image), image.size)
+        backend.put(self.preview_photo, image)
+        if self.preview_id is None:
+            self.preview_id = self.canvas.create_image(x, y, image=self.preview_photo, anchor=tk.NW)
+            self.canvas.tag_lower(self.preview_id, self.rect_id)  # 選択範囲の矩形より下に表示します。
+        else:
+            self.canvas.coords(self.preview_id, x, y)
+            self.canvas.itemconfigure(self.preview_id, image=self.preview_photo, state=tk.NORMAL)
+
+    def clear_drag_feedback(self):
+        """
+        選択範囲の矩形、サイズ表示用ラベル、モザイクのプレビューを削除します。
+        """
+        if self.drag_update_id is not None:
+            self.canvas.after_cancel(self.drag_update_id)
+            self.drag_update_id = None
+        for item_id in (self.rect_id, self.size_label_id, self.preview_id):
+            if item_id is not None:
+                self.canvas.delete(item_id)
+        self.rect_id = None
+        self.size_label_id = None
+        self.preview_id = None
+        self.preview_photo = None
 
     def handle_end_drag(self, event):
         """
         ドラッグ終了時
         :param event: イベント
         """
+        if not self.drag_active:
+            return  # Ctrl+クリックで領域を選択中
+        self.drag_active = False
+        if self.brush is not None:
+            self.end_brush()
+            return
         try:
             sw = Stopwatch.start_new()
             # ドラッグ終了位置を取得します。（キャンバス上の座標に変換）
             end_x = int(self.canvas.canvasx(event.x))
             end_y = int(self.canvas.canvasy(event.y))
 
-            # 選択領域にモザイクをかけます。
-            is_apply = self.apply_mosaic(self.start_x, self.start_y, end_x, end_y)
+            # 選択領域を元の画像の座標に変換し、モザイクをかけます。
+            left, top, right, bottom = self.to_source_box(self.tiles.to_image_box(
+                (min(self.start_x, end_x), min(self.start_y, end_y), max(self.start_x, end_x), max(self.start_y, end_y))))
+            if self.drag_ellipse:
+                is_apply = self.apply_shapes([Ellipse((left, top, right, bottom))])
+            else:
+                is_apply = self.apply_mosaic(left, top, right, bottom)
             if is_apply:
                 self.controller.display_process_time(f"{sw.elapsed:.3f}s")
         except Exception as e:
             print(f"Error applying mosaic: {e}")
             raise e
         finally:
-            # 矩形とサイズ表示用ラベルを削除
-            if self.rect_id is not None:
-                self.canvas.delete(self.rect_id)
-            if self.size_label_id is not None:
-                self.canvas.delete(self.size_label_id)
+            # 矩形、サイズ表示用ラベルとプレビューを削除
+            self.clear_drag_feedback()
+
+    def handle_toggle_brush(self, event=None):
+        """
+        Bキー押下時
+        ブラシと矩形の選択を切り替えます。
+        :param event: イベント
+        """
+        if self.drag_active:
+            return  # ドラッグ中は切り替えません。
+        self.brush_mode = not self.brush_mode
+        self.canvas.configure(cursor="pencil" if self.brush_mode else "")
+        if self.brush_mode:
+            self.controller.get_view().set_status_message(
+                f"ブラシ：ドラッグした軌跡のセルにモザイクをかけます。(直径{self.brush_size:g}セル Bキーで矩形の選択に戻ります。)")
+        else:
+            self.controller.get_view().set_status_message("矩形の選択：ドラッグした範囲にモザイクをかけます。")
+
+    def to_source_point(self, x: float, y: float) -> tuple[float, float]:
+        """
+        キャンバス上の座標を、元の画像の座標に変換します。
+        :param x: キャンバス上のX座標
+        :param y: キャンバス上のY座標
+        :return: 元の画像の座標
+        """
+        scale_x = scale_y = self.tiles.scale
+        if self.proxy_scale is not None:
+            scale_x *= self.proxy_scale[0]
+            scale_y *= self.proxy_scale[1]
+        return x / scale_x, y / scale_y
+
+    def start_brush(self):
+        """
+        ブラシのストロークを開始します。セルサイズは選択中のエフェクトで、画像の左上を原点とする格子に揃えます。
+        """
+        if self.tiles.image is None:
+            return
+        cell_size = self.resolve_effect().cell_size
+        self.brush = BrushStroke(self.image_size, cell_size, self.brush_size * cell_size / 2)
+        self.brush_points = [(self.start_x, self.start_y)]
+        self.brush_regions = []
+        self.brush_update_id = self.canvas.after_idle(self.update_brush)
+
+    def update_brush(self):
+        """
+        未処理のマウス移動イベントの軌跡をなぞり、新しく触れたセルのみにモザイクをかけて表示を更新します。
+        """
+        self.brush_update_id = None
+        if self.brush is None:
+            return
+        points, self.brush_points = self.brush_points, []
+        cells = []
+        for x, y in points:
+            cells.extend(self.brush.move_to(*self.to_source_point(x, y)))
+        if not cells:
+            return
+        cells.sort(key=lambda cell: (cell[1], cell[0]))
+        mosaic = MosaicEffect(self.brush.cell_size)
+        rects = self.brush.runs(cells)
+        self.brush_regions.extend(self.add_runs(mosaic.cell_size, rects))
+        for rect in rects:
+            if self.proxy_scale is None:
+                mosaic.apply(self.original_image, *rect)
+            else:
+                mosaic.apply_proxy(self.original_image, self.proxy_scale, *rect)
+        # 新しく触れたセルは前回の位置の付近のみのため、まとめて1回更新します。
+        self.tiles.update_region(self.to_view_box((min(rect[0] for rect in rects), min(rect[1] for rect in rects),
+                                                   max(rect[2] for rect in rects), max(rect[3] for rect in rects))))
+
+    def end_brush(self):
+        """
+        ブラシのストロークを終了します。ストロークで適用した領域は、1回の操作として元に戻せます。
+        """
+        sw = Stopwatch.start_new()
+        if self.brush_update_id is not None:
+            self.canvas.after_cancel(self.brush_update_id)
+        self.update_brush()
+        brush, regions = self.brush, self.brush_regions
+        self.brush = None
+        self.brush_points = []
+        self.brush_regions = []
+        if not regions:
+            return
+        self.history.push(SnapshotGroup(tuple(region.snapshot for region in regions)), ("apply", tuple(regions)))
+        self.controller.update_data_state("Modified")
+        self.controller.display_process_time(f"{sw.elapsed:.3f}s")
+        self.controller.get_view().set_status_message(f"ブラシ：{brush.count}セルにモザイクをかけました。")
+
+    def add_runs(self, cell_size: int, rects: list[tuple[int, int, int, int]]) -> list[AppliedRegion]:
+        """
+        セルの格子に揃えた行毎の矩形を、適用前の画素を保存して適用済みの領域に追加します。(ブラシ、楕円で使用します。)
+        :param cell_size: セルサイズ
+        :param rects: 元の画像の矩形
+        :return: 追加した領域
+        """
+        regions = [AppliedRegion(cell_size, rect, RegionSnapshot.capture(self.original_image, self.to_view_box(rect)))
+                   for rect in rects]
+        for region in regions:
+            self.regions.add(region)
+        return regions
+
+    def apply_shapes(self, shapes: list[Shape], effect: Optional[MosaicEffect] = None) -> bool:
+        """
+        多角形、楕円の領域に、被覆率がshape_threshold以上のセルのみモザイクを適用します。
+        モザイクをかけたセルは行毎の矩形として記録するため、編集ログ、保存時の再適用は矩形と同じく行えます。
+        :param shapes: 元の画像の座標の領域
+        :param effect: エフェクト。Noneは選択中のエフェクト
+        :return: モザイクを掛けてたかどうか
+        """
+        if self.tiles.image is None:
+            return False
+        mosaic = effect or self.resolve_effect()
+        cover = mosaic.shape_cells(self.image_size, shapes, self.shape_threshold)
+        if cover is None:
+            return False
+        box, cells = cover
+        rects = mosaic.cell_runs(box, cells)
+        regions = self.add_runs(mosaic.cell_size, rects)
+        if self.proxy_scale is None:
+            mosaic.apply_cells(self.original_image, box, cells)
+        else:
+            for rect in rects:
+                mosaic.apply_proxy(self.original_image, self.proxy_scale, *rect)
+        self.history.push(SnapshotGroup(tuple(region.snapshot for region in regions)), ("apply", tuple(regions)))
+        self.tiles.update_region(self.to_view_box(box))
+        self.controller.update_data_state("Modified")
+        return True
 
-    def apply_mosaic(self, start_x: int, start_y: int, end_x: int, end_y: int) -> bool:
+    def to_source_box(self, box: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """
+        表示中の画像の矩形を、元の画像の座標に変換します。プロキシ編集時以外はそのままです。
+        :param box: 表示中の画像の矩形
+        :return: 元の画像の矩形
+        """
+        if self.proxy_scale is None:
+            return box
+        (scale_x, scale_y), (width, height) = self.proxy_scale, self.image_size
+        left, top, right, bottom = box
+        return (min(width, math.floor(left / scale_x)), min(height, math.floor(top / scale_y)),
+                min(width, math.ceil(right / scale_x)), min(height, math.ceil(bottom / scale_y)))
+
+    def to_view_box(self, box: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """
+        元の画像の矩形を、表示中の画像の座標に変換します。プロキシ編集時以外はそのままです。
+        :param box: 元の画像の矩形
+        :return: 表示中の画像の矩形(プロキシの画素を含むように広げます。)
+        """
+        if self.proxy_scale is None:
+            return box
+        scale_x, scale_y = self.proxy_scale
+        left, top, right, bottom = box
+        return (math.floor(left * scale_x), math.floor(top * scale_y),
+                math.ceil(right * scale_x), math.ceil(bottom * scale_y))
+
+    def handle_undo(self, event=None):
+        """
+        最後のモザイクを元に戻します。変更前の画素を貼り付けるため、モザイクの適用と同じ程度の時間で戻ります。
+        :param event: イベント
+        """
+        if self.tiles.image is None:
+            return
+        step = self.history.undo(self.original_image)
+        if step is None:
+            return
+        action, regions, *swaps = step.payload
+        for region in regions:
+            if action == "apply":
+                self.regions.remove(region)
+            else:  # 削除した領域を戻します。(適用した順序は保持しています。)
+                self.regions.add(region)
+        for swap in swaps:  # 削除時に適用し直した領域の、適用前の画素を戻します。
+            swap_snapshots(swap)
+        self.clear_selection()
+        for box in step.snapshot.boxes:
+            self.tiles.update_region(box)
+        self.controller.update_data_state("Modified")
+
+    def handle_redo(self, event=None):
+        """
+        元に戻したモザイクをやり直します。
+        :param event: イベント
+        """
+        if self.tiles.image is None:
+            return
+        step = self.history.redo(self.original_image)
+        if step is None:
+            return
+        action, regions, *swaps = step.payload
+        for region in regions:
+            if action == "apply":
+                self.regions.add(region)
+            else:
+                self.regions.remove(region)
+        for swap in swaps:
+            swap_snapshots(swap)
+        self.clear_selection()
+        for box in step.snapshot.boxes:
+            self.tiles.update_region(box)
+        self.controller.update_data_state("Modified")
+
+    @property
+    def applied_regions(self) -> list[tuple[int, tuple[int, int, int, int]]]:
+        """
+        表示中の画像に適用した(セルサイズ, 領域)。(すべてに適用、編集ログ、プロキシ編集時の保存で使用します。)
+        :return: 適用した順序の(セルサイズ, 領域)
+        """
+        return [(region.cell_size, region.rect) for region in self.regions]
+
+    def handle_select_region(self, event):
+        """
+        Ctrl+クリック時
+        クリック位置の適用済みの領域を選択します。同じ位置をクリックすると、重なる領域を新しい順に選択します。
+        :param event: イベント
+        """
+        self.canvas.focus_set()
+        self.drag_active = False
+        if self.tiles.image is None:
+            return
+        x = int(self.canvas.canvasx(event.x))
+        y = int(self.canvas.canvasy(event.y))
+        left, top, _, _ = self.to_source_box(self.tiles.to_image_box((x, y, x + 1, y + 1)))
+        regions = self.regions.at(left, top)
+        if not regions:
+            self.clear_selection()
+            self.controller.get_view().set_status_message("クリック位置にモザイクの領域がありません。")
+            return
+        index = (regions.index(self.selected_region) + 1) % len(regions) if self.selected_region in regions else 0
+        region = regions[index]
+        self.selected_region = region
+        # 選択した領域の矩形を表示します。
+        x0, y0, x1, y1 = (round(v * self.tiles.scale) for v in self.to_view_box(region.rect))
+        if self.selection_id is None:
+            self.selection_id = self.canvas.create_rectangle(x0, y0, x1, y1, dash=(4, 4), width=2,
+                                                             outline=self.controller.theme_colors.bg_danger)
+        else:
+            self.canvas.coords(self.selection_id, x0, y0, x1, y1)
+        self.controller.get_view().set_status_message(
+            f"領域 {index + 1}/{len(regions)}：{region.rect} セルサイズ:{region.cell_size}"
+            f"(Deleteキーで削除します。)")
+
+    def clear_selection(self):
+        """
+        領域の選択を解除します。
+        """
+        self.selected_region = None
+        if self.selection_id is not None:
+            self.canvas.delete(self.selection_id)
+            self.selection_id = None
+
+    def handle_remove_region(self, event=None):
+        """
+        Deleteキー押下時
+        選択した領域を削除します。
+        :param event: イベント
+        """
+        region = self.selected_region
+        self.clear_selection()
+        if region is None or region not in self.regions.regions:
+            return
+        self.remove_region(region)
+
+    def remove_region(self, region: AppliedRegion):
+        """
+        適用済みの領域を削除します。
+        重なる領域は元の画素から適用し直すため、削除後の画像は編集ログの再生結果と一致します。
+        処理時間は画像の大きさではなく、重なる領域の大きさに比例します。削除は元に戻せます。
+        :param region: 領域
+        """
+        current = RegionSnapshot.capture(self.original_image, self.to_view_box(self.regions.affected_box(region.rect)))
+        swaps = self.regions.remove_and_replay(region, self.original_image, self.reapply, self.to_view_box)
+        self.history.push(current, ("remove", (region, ), swaps))
+        self.tiles.update_region(current.box)
+        self.controller.update_data_state("Modified")
+
+    def reapply(self, image: Image.Image, region: AppliedRegion):
+        """
+        領域の削除時に、重なる領域のモザイクを適用し直します。(編集ログの再生と同じ処理です。)
+        :param image: 表示中の画像
+        :param region: 領域
+        """
+        if self.proxy_scale is None:
+            EditRecord(region.rect, region.cell_size).apply(image)
+        else:
+            MosaicEffect(region.cell_size).apply_proxy(image, self.proxy_scale, *region.rect)
+
+    def create_edit_log(self, source_path: Path, output_path: Path) -> EditLog:
+        """
+        表示中の画像に適用したモザイクの編集ログを作成します。
+        :param source_path: 元の画像のパス
+        :param output_path: 出力ファイルのパス
+        :return: 編集ログ
+        """
+        edit_log = EditLog.create(source_path, output_path, self.image_size)
+        for cell_size, rect in self.applied_regions:
+            edit_log.add(rect, cell_size)
+        return edit_log
+
+    def handle_load_edit_log(self, event=None):
+        """
+        自動保存先の出力ファイルの編集ログを読み込み、表示中の画像に同じ順序でモザイクを適用します。
+        適用後に領域の追加や元に戻す操作を行い、保存し直すことができます。
+        編集ログは元の画像に対する記録のため、編集済み(元に戻す履歴がある場合を含む)の画像には適用しません。
+        :param event: イベント
+        """
+        if self.tiles.image is None:
+            return
+        view = self.controller.get_view()
+        if len(self.regions) or self.history.undo_steps or self.history.redo_steps:
+            view.set_status_message("編集ログは、編集前の画像にのみ読み込めます。画像を開き直してください。")
+            return
+        current_file = self.controller.get_current_image()
+        sidecar = sidecar_path(self.controller.get_mosaic_filename())
+        if not sidecar.exists():
+            view.set_status_message(f"編集ログがありません：{sidecar.name}")
+            return
+        try:
+            edit_log = EditLog.load(sidecar)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            view.set_status_message(f"編集ログを読み込めません：{sidecar.name} {e}")
+            return
+        if edit_log.source_path(sidecar).resolve() != current_file.resolve() or edit_log.size != self.image_size:
+            view.set_status_message(f"編集ログの元の画像が一致しません：{sidecar.name}")
+            return
+        width, height = self.image_size
+        for record in edit_log.records:
+            x0, y0, x1, y1 = record.rect
+            self.apply_mosaic(max(0, x0), max(0, y0), min(width, x1), min(height, y1), MosaicEffect(record.cell_size))
+        view.set_status_message(f"編集ログを読み込みました：{len(edit_log.records)}件")
+
+    def resolve_effect(self) -> MosaicEffect:
+        """
+        選択中のエフェクト。セルサイズの自動計算の場合は、表示中の画像のセルサイズを計算します。
+        :return: エフェクト
+        """
+        mosaic = self.controller.current_effect
+        # Todo:mosaic#apply側で判定します。
+        if mosaic.cell_size == MosaicEffect.AUTO:  # セルサイズの自動計算
+            mosaic = MosaicEffect(MosaicEffect.calc_cell_size_for(self.image_size))
+        return mosaic
+
+    def apply_mosaic(self, start_x: int, start_y: int, end_x: int, end_y: int,
+                     effect: Optional[MosaicEffect] = None) -> bool:
         """
         モザイクを適用します。
+        座標は元の画像のピクセル座標です。(表示倍率に依存しません。)
         :param start_x: モザイクをかける領域の左上X座標
         :param start_y: モザイクをかける領域の左上Y座標
         :param end_x: モザイクをかける領域の右下X座標
         :param end_y: モザイクをかける領域の右下Y座標
+        :param effect: エフェクト。Noneは選択中のエフェクト
         :return: モザイクを掛けてたかどうか
         """
-        if self.photo_image is None:
+        if self.tiles.image is None:
             return False  # 画像ファイルを未選択状態にモザイク領域を指定した時
 
         # 座標を正しい順序に並べ替える
@@ -249,22 +878,65 @@ class ImageCanvas(tk.Frame):
         top = min(start_y, end_y)
         bottom = max(start_y, end_y)
 
-        mosaic = self.controller.current_effect
-        # Todo:mosaic#apply側で判定します。
-        if mosaic.cell_size == MosaicEffect.AUTO:  # セルサイズの自動計算
-            mosaic = MosaicEffect(MosaicEffect.calc_cell_size(self.original_image))
-        is_apply = mosaic.apply(self.original_image, left, top, right, bottom)
+        mosaic = effect or self.resolve_effect()
+        # 変更前の画素を保存します。プロキシ編集時は、プロキシの画素を保存します。
+        snapshot = RegionSnapshot.capture(self.original_image, self.to_view_box((left, top, right, bottom)))
+        if self.proxy_scale is None:
+            is_apply = mosaic.apply(self.original_image, left, top, right, bottom)
+            changed = (left, top, right, bottom)
+        else:
+            # プロキシには表示用に描画し、元の画像には保存時に適用します。
+            changed = mosaic.apply_proxy(self.original_image, self.proxy_scale, left, top, right, bottom)
+            is_apply = changed is not None
         if not is_apply:
             return False
+        region = AppliedRegion(mosaic.cell_size, (left, top, right, bottom), snapshot)
+        self.regions.add(region)
+        self.history.push(snapshot, ("apply", (region, )))
 
-        self.photo_image = ImageTk.PhotoImage(self.original_image)  # 元の画像のコピーをキャンバスに表示
-        # キャンバスの画像も更新※画像サイズを変更しないため、スクロール領域は更新しません。
-        self.canvas.itemconfig(self.canvas_image, image=self.photo_image)
+        # 縮小済みの画像と表示中のタイルは、モザイクをかけた領域のみ更新します。
+        # ※画像サイズを変更しないため、スクロール領域は更新しません。
+        self.tiles.update_region(changed)
         # 変更状態に設定します。
         self.controller.update_data_state("Modified")
 
         return True
 
+    def confirm_overwrite(self, output_path: Path) -> bool:
+        """
+        元の画像への上書きを確認します。
+        :param output_path: 保存するファイルの名前
+        :return: 上書きする場合はTrue
+        """
+        return messagebox.askokcancel(PROGRAM_NAME, f"{output_path}は既に存在します。\n上書きしますか？")
+
+    def saved_callback(self, current_file: Path, output_path: Path,
+                       edit_log: Optional[EditLog]) -> Callable[[asyncio.Task], None]:
+        """
+        保存の完了時に呼び出すコールバックを生成します。
+        保存中に次の編集を行えるように、画像はワーカーで保存し、完了はメインスレッドのイベントループで通知されます。
+        :param current_file: 元の画像のパス
+        :param output_path: 保存するファイルの名前
+        :param edit_log: 保存の完了後に出力する編集ログ。Noneの場合は出力しません。
+        :return: コールバック
+        """
+        def on_saved(task: asyncio.Task):
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                print(f"Error saving image: {output_path} {task.exception()}")
+                return
+            if edit_log is not None:
+                try:
+                    edit_log.save(output_path)
+                except OSError as e:
+                    print(f"Error saving edit log: {output_path} {e}")
+            try:
+                self.controller.handle_saved(current_file)
+            except tk.TclError:
+                pass  # 保存の完了前にウィンドウを閉じた場合
+        return on_saved
+
     def save(self, output_path: Path, override: bool = False):
         """
         モザイク画像を保存します。
@@ -272,24 +944,32 @@ class ImageCanvas(tk.Frame):
         :param override: ファイル名を付けて保存時は、true、自動保存時は、false
         """
         current_file = self.controller.get_current_image()
+        src_format = self.controller.get_current_image_format()
 
         # 自動保存時に同一ファイル名の場合は、念のため確認メッセージを表示します。
-        if not override:
-            if current_file == output_path:
-                retval = messagebox.askokcancel(
-                    PROGRAM_NAME,
-                    f"{output_path}は既に存在します。\n上書きしますか？")
-                if not retval:
-                    # ToDo: 自動保存時に同一ファイル名のエラー時の処理フローを改善する。
-                    self.controller.update_data_state("Unchanged")
-                    return
+        if not override and current_file == output_path and not self.confirm_overwrite(output_path):
+            # ToDo: 自動保存時に同一ファイル名のエラー時の処理フローを改善する。
+            self.controller.update_data_state("Unchanged")
+            return
         # 未編集状態に戻します。
         self.controller.update_data_state("Unchanged")
-
-        # 画像データをbytesに変換後、スレッドを起動します。
-        mode = self.original_image.mode
-        size = self.original_image.size
-        data = self.original_image.tobytes()
-        thread = Thread(target=lambda: asyncio.run(
-            ImageFileService.save_async(mode, size, data, output_path, current_file)))
-        thread.start()
+        # 保存の完了前に次の編集を行っても、保存した画像と一致するように、保存時点の編集ログを作成します。
+        # 保存の完了前に次の画像を開いても、保存時点のプロキシ編集の有無で完了を処理します。
+        edit_log = self.create_edit_log(current_file, output_path) if self.write_edit_log else None
+        is_proxy = self.proxy_scale is not None
+        # プロキシ編集時は、一括処理が編集ログを出力します。
+        on_saved = self.saved_callback(current_file, output_path, None if is_proxy else edit_log)
+
+        async_service = self.controller.async_service
+        if is_proxy:
+            # 元の画像を読み込み、記録した全ての領域にモザイクをかけて保存します。
+            job = BatchJob(str(current_file), MosaicEffect.AUTO, tuple(rect for _, rect in self.applied_regions),
+                           output_path=str(output_path),
+                           region_cell_sizes=tuple(cell_size for cell_size, _ in self.applied_regions),
+                           edit_log=edit_log is not None)
+            async_service.spawn(async_service.replay(job), done=on_saved, wait_on_close=True)
+            return
+        # 共有メモリから読み込んだRGBの画像(RGBX)は、保存できるモードに変換します。(変換した画像は複製です。)
+        image = self.original_image.convert("RGB") if self.original_image.mode == "RGBX" else self.original_image.copy()
+        async_service.spawn(async_service.save(image, output_path, current_file, src_format),
+                            done=on_saved, wait_on_close=True)
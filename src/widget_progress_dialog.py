@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+    ProgressDialog
+    一括処理の進捗の画面
+"""
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable
+
+from . import PROGRAM_NAME
+from . abstract_controllers import AbstractAppController
+
+
+class ProgressDialog:
+    """
+    進捗バーと取り消しボタンを表示するウィンドウ
+    """
+    def __init__(self, master, controller: AbstractAppController, title: str, total: int,
+                 on_cancel: Callable[[], None]):
+        """
+        コンストラクタ
+        :param master: 親Widget
+        :param controller: コントローラー
+        :param title: ウィンドウのタイトル
+        :param total: 総件数
+        :param on_cancel: 取り消しボタン、ウィンドウの閉じるボタンのクリック時に呼び出します。
+        """
+        font_sizes = controller.font_sizes
+        theme_colors = controller.theme_colors
+        self.total = total
+        self.on_cancel = on_cancel
+
+        self.win = tk.Toplevel(master, bg=theme_colors.bg_neutral)
+        self.win.title(f"{PROGRAM_NAME} - {title}")
+        self.win.resizable(False, False)
+        self.win.transient(master)
+        self.win.protocol('WM_DELETE_WINDOW', self.handle_cancel)
+
+        self.message_var = tk.StringVar(value=f"0 / {total}")
+        self.message = tk.Label(self.win, bg=theme_colors.bg_neutral, font=("", font_sizes.body),
+                                textvariable=self.message_var, anchor=tk.W)
+        self.progress = ttk.Progressbar(self.win, orient=tk.HORIZONTAL, length=360, mode="determinate",
+                                        maximum=max(1, total))
+        self.action_cancel = tk.Button(self.win, text="キャンセル", bg=theme_colors.bg_secondary,
+                                       font=("", font_sizes.h5), command=self.handle_cancel)
+
+        self.message.pack(fill=tk.X, padx=8, pady=(8, 4))
+        self.progress.pack(fill=tk.X, padx=8, pady=4)
+        self.action_cancel.pack(side=tk.RIGHT, padx=8, pady=(4, 8))
+
+    def update_progress(self, done: int, text: str = ""):
+        """
+        進捗を更新します。
+        :param done: 処理済みの件数
+        :param text: 追加で表示するテキスト
+        """
+        self.progress.configure(value=done)
+        self.message_var.set(f"{done} / {self.total} {text}".rstrip())
+
+    def handle_cancel(self):
+        """
+        取り消しボタンのクリック時
+        """
+        self.action_cancel.configure(state=tk.DISABLED)
+        self.message_var.set("キャンセルしています...")
+        self.on_cancel()
+
+    def close(self):
+        """
+        ウィンドウを閉じます。
+        """
+        self.win.destroy()
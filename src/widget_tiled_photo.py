@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+    TiledPhotoLayer
+    キャンバスに大きな画像をタイルに分割して表示します。
+    表示範囲(と周囲のmarginタイル)のタイルのみをPhotoImageに変換し、スクロールに合わせて生成、破棄します。
+    表示用のメモリは画像の大きさではなく、画面の大きさに比例します。
+    表示倍率を変更した場合は、ImagePyramidの縮小済みのレベルからタイルを生成します。
+    タイルのPhotoImageは表示バックエンド(photo_backend)で転送し、同じ大きさのタイルで再利用します。
+"""
+import math
+import tkinter as tk
+from typing import Iterator, Optional
+
+from PIL import Image
+
+from . image_pyramid import ImagePyramid
+from . photo_backend import Photo, PhotoPool, select_backend
+
+# タイルの位置(列, 行)
+Tile = tuple[int, int]
+# 矩形(左上X, 左上Y, 右下X, 右下Y)
+Box = tuple[int, int, int, int]
+
+
+class TileLayout:
+    """
+    画像のタイル分割
+    """
+    def __init__(self, size: tuple[int, int], tile_size: int = 512):
+        """
+        コンストラクタ
+        :param size: 画像の大きさ
+        :param tile_size: タイルの一辺のピクセル数
+        """
+        if tile_size <= 0:
+            raise ValueError(f"tile_size:{tile_size}")
+        self.width, self.height = size
+        self.tile_size = tile_size
+        self.columns = max(1, -(-self.width // tile_size))
+        self.rows = max(1, -(-self.height // tile_size))
+
+    def tile_box(self, tile: Tile) -> Box:
+        """
+        タイルの画像上の矩形。右端、下端のタイルは画像の範囲に切り詰めます。
+        :param tile: タイルの位置
+        :return: 矩形
+        """
+        column, row = tile
+        left, top = column * self.tile_size, row * self.tile_size
+        return left, top, min(left + self.tile_size, self.width), min(top + self.tile_size, self.height)
+
+    def tiles_in(self, box: Box, margin: int = 0) -> Iterator[Tile]:
+        """
+        矩形と重なるタイルを列挙します。
+        :param box: 画像上の矩形
+        :param margin: 周囲に追加するタイル数
+        :return: タイルの位置
+        """
+        left, top, right, bottom = box
+        if right <= left or bottom <= top:
+            return
+        ts = self.tile_size
+        first_column = max(0, left // ts - margin)
+        last_column = min(self.columns - 1, (right - 1) // ts + margin)
+        first_row = max(0, top // ts - margin)
+        last_row = min(self.rows - 1, (bottom - 1) // ts + margin)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                yield column, row
+
+
+def intersect(a: Box, b: Box) -> Optional[Box]:
+    """
+    2つの矩形の共通部分
+    :param a: 矩形
+    :param b: 矩形
+    :return: 共通部分。重ならない場合はNone
+    """
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+class TiledPhotoLayer:
+    """
+    キャンバスのタイル表示
+    """
+    def __init__(self, canvas: tk.Canvas, tile_size: int = 512, margin: int = 1, backend: str = "auto",
+                 pool_size: int = 64):
+        """
+        コンストラクタ
+        :param canvas: 表示先のキャンバス
+        :param tile_size: タイルの一辺のピクセル数
+        :param margin: 表示範囲の周囲に先読みするタイル数
+        :param backend: 表示バックエンドの名前(auto, imagetk, ppm)。autoは最初の画像の表示時に計測して選択します。
+        :param pool_size: 再利用のために保持するPhotoImageの上限
+        """
+        self.canvas = canvas
+        self.tile_size = tile_size
+        self.margin = margin
+        self.backend_name = backend
+        self.pool_size = pool_size
+        self.pool: Optional[PhotoPool] = None
+        self.image: Optional[Image.Image] = None
+        self.pyramid: Optional[ImagePyramid] = None
+        self.scale: float = 1.0  # 表示倍率
+        self.layout: Optional[TileLayout] = None  # 表示座標のタイル分割
+        self.tiles: dict[Tile, tuple[int, Photo]] = {}  # タイル → (キャンバスのアイテムID, PhotoImage)
+        self._refresh_id: Optional[str] = None
+
+    def set_image(self, image: Image.Image, scale: float = 1.0):
+        """
+        表示する画像を変更します。
+        :param image: 画像
+        :param scale: 表示倍率
+        """
+        self.clear()
+        if self.pool is None:
+            self.pool = PhotoPool(self.canvas, select_backend(self.canvas, self.backend_name, self.tile_size),
+                                  self.pool_size)
+        self.image = image
+        self.pyramid = ImagePyramid(image)
+        self.set_scale(scale)
+
+    def display_size(self) -> tuple[int, int]:
+        """
+        表示倍率での画像の大きさ
+        :return: 幅, 高さ
+        """
+        if self.image is None:
+            return 0, 0
+        return max(1, round(self.image.width * self.scale)), max(1, round(self.image.height * self.scale))
+
+    def set_scale(self, scale: float):
+        """
+        表示倍率を変更します。表示範囲のタイルのみを生成し直します。
+        :param scale: 表示倍率(1.0は等倍)
+        """
+        if scale <= 0:
+            raise ValueError(f"scale:{scale}")
+        self.scale = scale
+        if self.image is None:
+            return
+        self.remove_tiles()
+        width, height = self.display_size()
+        self.layout = TileLayout((width, height), self.tile_size)
+        self.canvas.config(scrollregion=(0, 0, width, height))
+        self.refresh()
+
+    def to_image_box(self, box: Box) -> Box:
+        """
+        表示座標の矩形を、元の画像の座標に変換します。
+        :param box: 表示座標の矩形(左上X, 左上Y, 右下X, 右下Y)
+        :return: 元の画像の矩形。画像の範囲に切り詰めます。
+        """
+        left, top, right, bottom = box
+        width, height = self.image.size if self.image is not None else (0, 0)
+        return (min(width, max(0, math.floor(left / self.scale))), min(height, max(0, math.floor(top / self.scale))),
+                min(width, max(0, math.ceil(right / self.scale))), min(height, max(0, math.ceil(bottom / self.scale))))
+
+    def to_display_box(self, box: Box) -> Box:
+        """
+        元の画像の座標の矩形を、表示座標に変換します。
+        :param box: 元の画像の矩形
+        :return: 表示座標の矩形。縮小、拡大時の補間に使用する周囲の1ピクセルを含みます。
+        """
+        if self.scale == 1.0:
+            return box
+        left, top, right, bottom = box
+        return (math.floor(left * self.scale) - 1, math.floor(top * self.scale) - 1,
+                math.ceil(right * self.scale) + 1, math.ceil(bottom * self.scale) + 1)
+
+    def render(self, box: Box) -> Image.Image:
+        """
+        表示座標の矩形の画像を生成します。
+        :param box: 表示座標の矩形
+        :return: 画像
+        """
+        if self.scale == 1.0:
+            return self.image.crop(box)
+        return self.pyramid.render(self.scale, box)
+
+    def viewport(self) -> Box:
+        """
+        キャンバスの表示範囲(画像上の座標)
+        :return: 矩形
+        """
+        left = int(self.canvas.canvasx(0))
+        top = int(self.canvas.canvasy(0))
+        return left, top, left + max(1, self.canvas.winfo_width()), top + max(1, self.canvas.winfo_height())
+
+    def schedule_refresh(self):
+        """
+        スクロール、リサイズ後のアイドル時にタイルを更新します。連続したイベントは1回にまとめます。
+        """
+        if self._refresh_id is None and self.image is not None:
+            self._refresh_id = self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        """
+        表示範囲のタイルを生成し、範囲外のタイルを破棄します。
+        """
+        self._refresh_id = None
+        if self.image is None or self.layout is None:
+            return
+        wanted = set(self.layout.tiles_in(self.viewport(), self.margin))
+        for tile in [tile for tile in self.tiles if tile not in wanted]:
+            item_id, photo = self.tiles.pop(tile)
+            self.canvas.delete(item_id)
+            self.pool.release(photo)
+        for tile in wanted.difference(self.tiles):
+            box = self.layout.tile_box(tile)
+            photo = self.pool.acquire(self.render(box))
+            item_id = self.canvas.create_image(box[0], box[1], image=photo, anchor=tk.NW, tags=("tile", ))
+            self.canvas.tag_lower(item_id)  # 選択範囲の矩形などより下に表示します。
+            self.tiles[tile] = (item_id, photo)
+
+    def update_region(self, box: Box):
+        """
+        画像の変更した領域を、縮小済みのレベルと生成済みのタイルに反映します。未生成のタイルは生成時に反映されます。
+        :param box: 元の画像の変更した領域
+        """
+        if self.image is None or self.layout is None:
+            return
+        self.pyramid.update_region(box)
+        box = self.to_display_box(box)
+        for tile in self.layout.tiles_in(box):
+            if tile not in self.tiles:
+                continue
+            tile_box = self.layout.tile_box(tile)
+            changed = intersect(box, tile_box)
+            if changed is None:
+                continue
+            self.blit(self.tiles[tile][1], self.render(changed), changed[0] - tile_box[0], changed[1] - tile_box[1])
+
+    def blit(self, photo: Photo, image: Image.Image, x: int, y: int):
+        """
+        PhotoImageの指定した位置に画像を転送します。PhotoImage全体は作り直しません。
+        :param photo: 転送先のPhotoImage
+        :param image: 転送する画像
+        :param x: 転送先のX座標
+        :param y: 転送先のY座標
+        """
+        self.pool.backend.put(photo, image, x, y)
+
+    def remove_tiles(self):
+        """
+        全てのタイルを破棄します。
+        """
+        if self._refresh_id is not None:
+            self.canvas.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        self.canvas.delete("tile")
+        for _, photo in self.tiles.values():
+            self.pool.release(photo)
+        self.tiles.clear()
+
+    def clear(self):
+        """
+        全てのタイルと画像を破棄します。
+        """
+        self.remove_tiles()
+        self.image = None
+        self.pyramid = None
+        self.layout = None
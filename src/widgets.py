@@ -8,17 +8,20 @@ from tkinter import filedialog, messagebox
 from functools import partial
 from decimal import Decimal
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from tkinterdnd2 import DND_FILES, TkinterDnD
 
 from . import PROGRAM_NAME
 from . abstract_controllers import AbstractAppController
-from . models import StatusBarInfo, ImageFormat
+from . image_file_service import ImageFormat
+from . models import StatusBarInfo
 from . utils import round_up_decimal, Stopwatch
 from . widgets_core import WidgetUtils, PhotoImageButton, Tooltip
 from . widget_file_property_window import FilePropertyWindow
+from . widget_filmstrip import FilmstripFrame
 from . widget_image_canvas import ImageCanvas
+from . widget_progress_dialog import ProgressDialog
 from . effects.image_effects import MosaicEffect
 
 
@@ -84,6 +87,15 @@ class HeaderFrame(tk.Frame):
                                                          "次のセルサイズに変更(Right Click)。 前のセルサイズに変更(Shift+Right Click)")
         self.update_view(None)
 
+        self.action_apply_to_all = tk.Button(
+            self,
+            text="すべてに適用",
+            bg=theme_colors.bg_secondary,
+            font=("", font_sizes.h5),
+            command=self.controller.handle_apply_to_all)
+        self.action_apply_to_all_tooltip = Tooltip(self.action_apply_to_all,
+                                                   "表示中の画像に適用した領域を、同じ大きさの全ての画像に適用して保存(Ctrl+Shift+A)")
+
         self.widgetHeader = tk.Label(self, bg=theme_colors.bg_primary)
 
         # Widgetを配置します。
@@ -94,7 +106,8 @@ class HeaderFrame(tk.Frame):
         self.action_file_info.grid(row=0, column=4, padx=(4, 0))
         self.mosaic_size.grid(row=0, column=5, padx=(8, 0))
         self.action_mosaic_size_change.grid(row=0, column=6, padx=(4, 4))
-        self.widgetHeader.grid(row=0, column=7, padx=(4, 0))
+        self.action_apply_to_all.grid(row=0, column=7, padx=(4, 4))
+        self.widgetHeader.grid(row=0, column=8, padx=(4, 0))
 
         # キーバインドの設定をします。
         WidgetUtils.bind_all(self, "Control", "O", partial(self.controller.on_file_open))
@@ -104,6 +117,7 @@ class HeaderFrame(tk.Frame):
         WidgetUtils.bind_all(self, "", "Right", partial(self.controller.handle_next_image))
         WidgetUtils.bind_all(self, "Shift", "Right", partial(self.controller.handle_next_image))
         WidgetUtils.bind_all(self, "", "I", partial(self.controller.on_show_file_property))
+        WidgetUtils.bind_all(self, "Control-Shift", "A", partial(self.controller.handle_apply_to_all))
 
     def update_view(self, event):
         """
@@ -139,6 +153,13 @@ class MainFrame(tk.Frame):
         self.update_view = self.image_canvas.update_view
         self.save = self.image_canvas.save
 
+    def get_applied_regions(self) -> list[tuple[int, tuple[int, int, int, int]]]:
+        """
+        表示中の画像に適用した(セルサイズ, 領域)を取得します。
+        :return: 適用した順序の(セルサイズ, 領域)
+        """
+        return list(self.image_canvas.applied_regions)
+
 
 class FooterFrame(tk.Frame):
     """
@@ -231,6 +252,10 @@ class MainPage(tk.Frame):
         # Widgetの生成
         self.HeaderFrame = HeaderFrame(self, controller)
         self.MainFrame = MainFrame(self, controller)
+        self.FilmstripFrame: Optional[FilmstripFrame] = None
+        filmstrip = controller.get_config().get("filmstrip", {})
+        if filmstrip.get("visible", True):
+            self.FilmstripFrame = FilmstripFrame(self, controller)
         self.FooterFrame = FooterFrame(self, controller)
 
         self.setup_bindings()
@@ -249,10 +274,13 @@ class MainPage(tk.Frame):
         """
         self.HeaderFrame.grid(column=0, row=0, sticky=(tk.E + tk.W + tk.S + tk.N))
         self.MainFrame.grid(column=0, row=1, sticky=(tk.E + tk.W + tk.S + tk.N))
-        self.FooterFrame.grid(column=0, row=2, sticky=(tk.E + tk.W + tk.S + tk.N))
-        # ヘッダーとフッターの行のweightを0に設定（固定領域）
+        if self.FilmstripFrame is not None:
+            self.FilmstripFrame.grid(column=0, row=2, sticky=(tk.E + tk.W + tk.S + tk.N))
+        self.FooterFrame.grid(column=0, row=3, sticky=(tk.E + tk.W + tk.S + tk.N))
+        # ヘッダー、フィルムストリップとフッターの行のweightを0に設定（固定領域）
         self.grid_rowconfigure(0, weight=0)
         self.grid_rowconfigure(2, weight=0)
+        self.grid_rowconfigure(3, weight=0)
         # メインフレームの行のweightを1に設定（残りのスペースをすべて取る）
         self.grid_rowconfigure(1, weight=1)
         # ヘッダーをウィンドウ幅まで拡張する
@@ -278,9 +306,17 @@ class MainPage(tk.Frame):
         """
         self.HeaderFrame.update_view(None)
         self.MainFrame.update_view(file_path)
+        self.update_filmstrip()
         self.controller.set_window_title(file_path)
         self.controller.update_status_bar_file_info()
 
+    def update_filmstrip(self):
+        """
+        フィルムストリップを更新します。
+        """
+        if self.FilmstripFrame is not None:
+            self.FilmstripFrame.update_view()
+
     def on_file_open(self, event):
         """
         ファイル選択ボタン
@@ -349,6 +385,31 @@ class MainPage(tk.Frame):
         self.set_status_message(f"Save. {save_file.name}", f"{sw.elapsed:.3f}")
         messagebox.showinfo(PROGRAM_NAME, f"ファイルを保存しました。\n\n{save_file}")
 
+    def get_applied_regions(self) -> list[tuple[int, tuple[int, int, int, int]]]:
+        """
+        表示中の画像に適用した(セルサイズ, 領域)を取得します。
+        :return: 適用した順序の(セルサイズ, 領域)
+        """
+        return self.MainFrame.get_applied_regions()
+
+    def confirm(self, message: str) -> bool:
+        """
+        確認メッセージを表示します。
+        :param message: メッセージ
+        :return: OKの場合はTrue
+        """
+        return messagebox.askokcancel(PROGRAM_NAME, message)
+
+    def show_progress(self, title: str, total: int, on_cancel: Callable[[], None]) -> ProgressDialog:
+        """
+        進捗画面を表示します。
+        :param title: タイトル
+        :param total: 総件数
+        :param on_cancel: 取り消し時に呼び出す関数
+        :return: 進捗画面
+        """
+        return ProgressDialog(self, self.controller, title, total, on_cancel)
+
     def set_status_message(self, text: str, time: str = ""):
         """
         フッターのステータスバーのメッセージ欄
@@ -0,0 +1,165 @@
+"""
+AsyncImageServiceの単体テスト
+"""
+import asyncio
+import gc
+import os
+from pathlib import Path
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.async_service import AsyncImageService
+from src.batch import BatchJob
+from src.decode_pool import ProcessDecodePool
+from src.effects.image_effects import MosaicEffect
+
+
+class TestAsyncImageService(unittest.TestCase):
+    """
+    AsyncImageServiceのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.temp_dir.name, "image.png")
+        Image.new("RGB", (64, 48), color="blue").save(self.file_path)
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_load_save_scan_metadata(self):
+        """
+        読み込み、保存、フォルダの走査、メタデータの取得をawaitで実行します。
+        """
+        async def scenario():
+            service = AsyncImageService(io_workers=2)
+            try:
+                image = await service.load(self.file_path)
+                self.assertEqual(image.size, (64, 48))
+                output_path = Path(self.temp_dir.name, "out", "image_mosaic.png")
+                await service.save(image.copy(), output_path, self.file_path, "PNG")
+                self.assertTrue(output_path.exists())
+                self.assertEqual(await service.scan([self.temp_dir.name]), [self.file_path])
+                metadata = await service.metadata(self.file_path)
+                self.assertEqual((metadata.size, metadata.format), ((64, 48), "PNG"))
+            finally:
+                await service.aclose()
+        asyncio.run(scenario())
+
+    def test_load_decode_pool(self):
+        """
+        ワーカープロセスでデコードした画像は、共有メモリをコピーせずに参照し、画像の破棄時にブロックを返却します。
+        """
+        pool = ProcessDecodePool(max_workers=1)
+
+        async def scenario():
+            service = AsyncImageService(io_workers=1, decode_pool=pool)
+            try:
+                return await service.load(self.file_path)
+            finally:
+                await service.aclose()
+        try:
+            image = asyncio.run(scenario())
+            self.assertEqual((image.mode, image.size), ("RGBX", (64, 48)))
+            self.assertTrue(image.readonly)
+            self.assertEqual(image.convert("RGB").getpixel((0, 0)), (0, 0, 255))
+            self.assertEqual(pool.blocks.idle_bytes, 0)
+            del image
+            # 結果を設定したワーカープロセスの監視スレッドが画像を参照し終えるまで待ち、循環参照を破棄します。
+            for _ in range(100):
+                gc.collect()
+                if pool.blocks.idle_bytes:
+                    break
+                time.sleep(0.01)
+            self.assertGreater(pool.blocks.idle_bytes, 0)
+        finally:
+            pool.shutdown()
+
+    def test_replay(self):
+        """
+        記録した領域を、元の画像に領域毎のセルサイズでまとめて適用して保存します。(プロキシ編集時の保存)
+        """
+        source = Image.effect_noise((64, 48), 64).convert("RGB")
+        source.save(self.file_path)
+        output_path = Path(self.temp_dir.name, "image_mosaic_0.png")
+        job = BatchJob(str(self.file_path), MosaicEffect.AUTO, ((0, 0, 32, 32), (32, 16, 64, 48)),
+                       output_path=str(output_path), region_cell_sizes=(4, 8))
+
+        async def scenario():
+            service = AsyncImageService(io_workers=1)
+            try:
+                return await service.replay(job)
+            finally:
+                await service.aclose()
+        self.assertEqual(asyncio.run(scenario()).output_path, str(output_path))
+
+        MosaicEffect(4).apply(source, 0, 0, 32, 32)
+        MosaicEffect(8).apply(source, 32, 16, 64, 48)
+        with Image.open(output_path) as actual:
+            self.assertEqual(actual.convert("RGB").tobytes(), source.tobytes())
+
+    def test_concurrency_limit(self):
+        """
+        種類毎の同時実行数を制限します。
+        """
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        async def scenario():
+            service = AsyncImageService(io_workers=4, max_loads=2)
+            await asyncio.gather(*(service.run("load", work) for _ in range(6)))
+            await service.aclose()
+        asyncio.run(scenario())
+        self.assertEqual(peak, 2)
+
+    def test_cancel(self):
+        """
+        同じキーのタスクは前のタスクを取り消します。終了時は保存以外のタスクを取り消し、保存の完了を待ちます。
+        """
+        started: list[str] = []
+
+        def work(name: str):
+            started.append(name)
+            time.sleep(0.05)
+            return name
+
+        async def scenario():
+            service = AsyncImageService(io_workers=1, max_loads=1)
+            first = service.spawn(service.run("load", work, "first"), key="current")
+            second = service.spawn(service.run("load", work, "second"), key="current")
+            self.assertEqual(await second, "second")
+            self.assertTrue(first.cancelled())
+
+            saved = service.spawn(service.run("save", work, "save"), wait_on_close=True)
+            loading = service.spawn(service.run("load", work, "load"))
+            await asyncio.sleep(0)
+            await service.aclose()
+            self.assertEqual(saved.result(), "save")
+            self.assertTrue(loading.cancelled())
+            self.assertEqual(service.pending, 0)
+        asyncio.run(scenario())
+        self.assertNotIn("first", started)
+        self.assertNotIn("load", started)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+batchの単体テスト
+"""
+from dataclasses import asdict, replace
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from PIL import Image, ImageChops
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import BatchJob, RegionSpec, apply_regions, create_jobs, process_job, run_batch
+from src.edit_log import EditLog, sidecar_path
+from src.effects.mask_shapes import Ellipse
+from src.effects.image_effects import EffectPreset, MosaicEffect
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+class TestBatch(unittest.TestCase):
+    """
+    batchのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = Path(self.temp_dir.name, "input")
+        self.input_dir.mkdir()
+        self.presets = EffectPreset({"mosaic": {"cell_sizes": [10, 16, -1], "default": {"cell_size": 16}}})
+        self.source = Image.effect_noise((96, 64), 64).convert("RGB")
+        for i in range(4):
+            self.source.save(self.input_dir / f"image_{i}.png")
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def expected_image(self, cell_size: int, rect: tuple[int, int, int, int]) -> Image.Image:
+        """
+        期待するモザイク画像を生成します。
+        :param cell_size: セルサイズ
+        :param rect: モザイクをかける領域
+        :return: モザイク画像
+        """
+        image = self.source.copy()
+        MosaicEffect(cell_size).apply(image, *rect)
+        return image
+
+    def test_region_spec_match(self):
+        """
+        ファイル毎の領域の指定
+        """
+        spec = RegionSpec({
+            "regions": [[50, 40, 0, 0]],
+            "files": {"image_1.*": {"preset": "mosaic_10", "regions": [[0, 0, 20, 20]]}},
+        }, self.presets)
+        self.assertEqual(spec.match(Path("image_0.png")), (16, ((0, 0, 50, 40), )))
+        self.assertEqual(spec.match(Path("x/image_1.png")), (10, ((0, 0, 20, 20), )))
+        with self.assertRaises(ValueError):
+            RegionSpec({"preset": "mosaic_99"}, self.presets)
+
+    def test_shapes(self):
+        """
+        多角形、楕円の領域にモザイクをかけ、編集ログには行毎の矩形を記録します。
+        """
+        spec = RegionSpec({
+            "regions": [],
+            "shapes": [{"ellipse": [8, 8, 72, 56]}],
+            "files": {"image_1.*": {"shapes": []}},
+        }, self.presets)
+        self.assertEqual(spec.match_shapes(Path("image_1.png")), ())
+        job = next(create_jobs([str(self.input_dir / "image_0.png")], spec))
+        self.assertEqual(job.shapes, ({"ellipse": [8.0, 8.0, 72.0, 56.0]}, ))
+        self.assertEqual(BatchJob.from_dict(json.loads(json.dumps(asdict(job)))), job)
+
+        result = process_job(replace(job, edit_log=True))
+        self.assertTrue(result.ok, result.error)
+        expected = self.source.copy()
+        MosaicEffect(16).apply_shapes(expected, [Ellipse((8, 8, 72, 56))])
+        with Image.open(result.output_path) as actual:
+            self.assertEqual(actual.convert("RGB").tobytes(), expected.tobytes())
+        log = EditLog.load(sidecar_path(Path(result.output_path)))
+        self.assertTrue(log.records)
+        replayed = self.source.copy()
+        log.replay(replayed)
+        self.assertEqual(replayed.tobytes(), expected.tobytes())
+        with self.assertRaises(ValueError):
+            RegionSpec({"shapes": [{"polygon": [[0, 0]]}]}, self.presets)
+
+    def test_run_batch(self):
+        """
+        プロセスプールで一括処理し、フォルダ指定時は_mosaicフォルダに出力します。
+        """
+        spec = RegionSpec({"regions": [[0, 0, 64, 48]], "files": {"image_3.png": {"preset": "mosaic_10"}}},
+                          self.presets)
+        jobs = list(create_jobs([str(self.input_dir)], spec))
+        summary = run_batch(jobs, max_workers=2)
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(summary.succeeded, 4)
+
+        output_dir = Path(self.temp_dir.name, "input_mosaic")
+        for i, cell_size in enumerate([16, 16, 16, 10]):
+            with Image.open(output_dir / f"image_{i}_mosaic_0.png") as actual:
+                diff = ImageChops.difference(actual.convert("RGB"), self.expected_image(cell_size, (0, 0, 64, 48)))
+                self.assertIsNone(diff.getbbox())
+
+    def test_small_regions(self):
+        """
+        セルサイズ未満の領域(画像の範囲外に切り詰めた領域を含む)はスキップし、他の領域にモザイクをかけます。
+        """
+        image = self.source.copy()
+        self.assertFalse(apply_regions(image, 16, [(90, 0, 200, 50), (10, 40, 20, 50)]))
+        self.assertEqual(image.tobytes(), self.source.tobytes())
+
+        output_path = Path(self.temp_dir.name, "small.png")
+        regions = ((90, 0, 200, 50), (0, 0, 64, 48), (10, 40, 20, 50))
+        result = process_job(BatchJob(str(self.input_dir / "image_0.png"), 16, regions,
+                                      output_path=str(output_path), edit_log=True))
+        self.assertTrue(result.ok, result.error)
+        with Image.open(output_path) as actual:
+            actual = actual.convert("RGB")
+        self.assertEqual(actual.tobytes(), self.expected_image(16, (0, 0, 64, 48)).tobytes())
+        replayed = self.source.copy()
+        EditLog.load(sidecar_path(output_path)).replay(replayed)
+        self.assertEqual(replayed.tobytes(), actual.tobytes())
+
+    def test_process_job_error(self):
+        """
+        読み込めないファイルは、エラーを処理結果に格納します。
+        """
+        broken = self.input_dir / "broken.png"
+        broken.write_bytes(b"broken")
+        result = process_job(BatchJob(str(broken), 16, ((0, 0, 10, 10), )))
+        self.assertFalse(result.ok)
+        self.assertIn("broken.png", result.input_path)
+
+    def test_output_subdir(self):
+        """
+        出力先ディレクトリを指定した場合は、入力のフォルダ構成を保持し、異なるフォルダの同名のファイルを別々に保存します。
+        """
+        scans = Path(self.temp_dir.name, "scans")
+        for name in ("a", "b"):
+            (scans / name).mkdir(parents=True)
+            self.source.save(scans / name / "0001.png")
+        output_dir = Path(self.temp_dir.name, "output")
+        spec = RegionSpec({"regions": [[0, 0, 32, 32]]}, self.presets)
+        jobs = list(create_jobs([str(scans / "a"), str(scans / "b")], spec, str(output_dir)))
+        self.assertEqual([job.output_subdir for job in jobs], ["a", "b"])
+        outputs = [process_job(job).output_path for job in jobs]
+        self.assertEqual(outputs, [str(output_dir / name / "0001_mosaic_0.png") for name in ("a", "b")])
+
+        single = list(create_jobs([str(scans / "a")], spec, str(output_dir)))  # 1つのフォルダは直下に保存します。
+        self.assertEqual(single[0].output_subdir, "")
+
+    def test_cli_without_tkinter(self):
+        """
+        batchサブコマンドはtkinterを読み込みません。
+        """
+        spec_path = Path(self.temp_dir.name, "regions.json")
+        spec_path.write_text(json.dumps({"preset": "mosaic_16", "regions": [[0, 0, 32, 32]]}), encoding="utf-8")
+        output_dir = Path(self.temp_dir.name, "output")
+        code = (
+            "import sys\n"
+            "from src.cli import main\n"
+            f"exit_code = main(['batch', {str(self.input_dir)!r}, '--regions', {str(spec_path)!r}, "
+            f"'--output-dir', {str(output_dir)!r}, '--workers', '2', '--quiet'])\n"
+            "assert 'tkinter' not in sys.modules and 'tkinterdnd2' not in sys.modules, 'tkinter imported'\n"
+            "sys.exit(exit_code)\n"
+        )
+        completed = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(len(list(output_dir.glob("*_mosaic_0.png"))), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+BrushStrokeの単体テスト
+"""
+import os
+import sys
+import unittest
+
+from PIL import Image, ImageStat
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.brush_stroke import BrushStroke
+from src.effects.image_effects import MosaicEffect
+
+
+class TestBrushStroke(unittest.TestCase):
+    """
+    BrushStrokeのテストクラス
+    """
+    def test_move_to(self):
+        """
+        軌跡の円と重なるセルを1回だけ返し、画像の範囲外と端の余りのセルは返しません。
+        """
+        stroke = BrushStroke((100, 60), 10, 4)
+        self.assertEqual(stroke.move_to(15, 15), [(1, 1)])
+        self.assertEqual(stroke.move_to(15, 15), [])
+        # 斜めになぞると、軌跡上のセルを途切れずに返します。
+        cells = stroke.move_to(55, 55)
+        self.assertIn((3, 3), cells)
+        self.assertIn((5, 5), cells)
+        self.assertNotIn((1, 1), cells)
+        self.assertEqual(cells, sorted(cells, key=lambda cell: (cell[1], cell[0])))
+        self.assertEqual(stroke.count, sum(stroke.occupied))
+
+        edge = BrushStroke((95, 55), 10, 1)
+        self.assertEqual(edge.move_to(93, 53), [])  # 端の余り
+        self.assertEqual(edge.move_to(200, 200), [])
+
+    def test_radius(self):
+        """
+        ブラシの半径に含まれるセルを返します。
+        """
+        stroke = BrushStroke((100, 100), 10, 15)
+        cells = stroke.move_to(50, 50)
+        self.assertEqual(len(cells), 16)  # 中心の周囲4x4セル
+        self.assertNotIn((2, 2), cells)
+
+    def test_runs(self):
+        """
+        行毎に連続するセルを矩形にまとめ、矩形のモザイクは各セルの平均値と一致します。
+        """
+        image = Image.effect_noise((96, 64), 64).convert("RGB")
+        stroke = BrushStroke(image.size, 8, 10)
+        cells = stroke.move_to(4, 4) + stroke.move_to(90, 60)
+        cells.sort(key=lambda cell: (cell[1], cell[0]))
+        rects = stroke.runs(cells)
+        self.assertLess(len(rects), len(cells))
+        self.assertEqual(sum((r[2] - r[0]) * (r[3] - r[1]) for r in rects), len(cells) * 64)
+
+        expected = {cell: tuple(round(v) for v in ImageStat.Stat(
+            image.crop((cell[0] * 8, cell[1] * 8, cell[0] * 8 + 8, cell[1] * 8 + 8))).mean) for cell in cells}
+        for rect in rects:
+            MosaicEffect(8).apply(image, *rect)
+        for (column, row), mean in expected.items():
+            colors = image.crop((column * 8, row * 8, column * 8 + 8, row * 8 + 8)).getcolors()
+            self.assertEqual(len(colors), 1)
+            for actual, value in zip(colors[0][1], mean):
+                self.assertLessEqual(abs(actual - value), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
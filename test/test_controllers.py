@@ -1,13 +1,17 @@
 """
 AppControllerの単体テスト
 """
+import asyncio
 from dataclasses import dataclass
 import os
 from pathlib import Path
 import sys
+import tempfile
 import unittest
 from unittest.mock import Mock
 
+from PIL import Image, ImageChops
+
 # プロジェクトのルートディレクトリをシステムパスに追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -15,6 +19,7 @@ from src.controllers import AppController
 from src.models import AppDataModel
 from src.widgets import MainPage
 from src.app_config import AppConfig
+from src.effects.image_effects import MosaicEffect
 
 
 class TestAppController(unittest.TestCase):
@@ -52,6 +57,47 @@ class TestAppController(unittest.TestCase):
         # 結果の件数は、3と比較します。
         self.assertTrue(count == 3, f"test_drop_file_parser error {count}")
 
+    def test_add_file_paths(self):
+        """
+        ドロップしたファイルとフォルダ内のファイルを、1回の追加でまとめて読み込みます。
+        """
+        current_dir = Path(__file__).parent / "test_files"
+        self.controller.model.add_images = Mock(return_value=3)
+        count = self.controller.add_file_paths([current_dir / "jet_256x256.webp", current_dir])
+        self.assertEqual(count, 3)
+        self.controller.model.add_images.assert_called_once()
+        files = self.controller.model.add_images.call_args.args[0]
+        self.assertEqual(files[0], current_dir / "jet_256x256.webp")
+        self.assertIn(current_dir / "pnginfo_valid.png", files)
+        self.assertTrue(self.controller.model.save_directory)
+
+    def test_apply_to_all(self):
+        """
+        表示中の画像に適用した領域を、同じ大きさの画像に適用して_mosaic_Nの名前で保存します。
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = Image.effect_noise((64, 48), 64).convert("RGB")
+            for name in ("a.png", "b.png", "c.png"):
+                source.save(Path(temp_dir, name))
+            source.resize((32, 48)).save(Path(temp_dir, "small.png"))
+            for name in ("a.png", "b.png", "c.png", "small.png"):
+                self.controller.model.image_list.add(Path(temp_dir, name))
+            regions = [(8, (0, 0, 32, 24)), (4, (16, 16, 64, 48))]
+            view = self.controller.view
+            view.confirm.return_value = True
+
+            summary = asyncio.run(self.controller.apply_to_all(Path(temp_dir, "a.png"), regions))
+            self.assertEqual((summary.total, summary.succeeded), (2, 2))
+            view.show_progress.return_value.close.assert_called_once()
+            self.assertTrue(self.controller.model.image_list.is_saved(Path(temp_dir, "c.png")))
+            self.assertFalse(Path(temp_dir, "small_mosaic_0.png").exists())
+
+            expected = source.copy()
+            for cell_size, rect in regions:
+                MosaicEffect(cell_size).apply(expected, *rect)
+            with Image.open(Path(temp_dir, "b_mosaic_0.png")) as actual:
+                self.assertIsNone(ImageChops.difference(actual.convert("RGB"), expected).getbbox())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,88 @@
+"""
+coreの単体テスト
+"""
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.core
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# 読み込み時間の上限(ミリ秒)。開発環境の計測値(import src.core:約15ms、部品の参照込み:約30ms)に余裕を持たせています。
+IMPORT_BUDGET_MS: int = 100
+ENGINE_IMPORT_BUDGET_MS: int = 250
+# 読み込み時間の計測回数。実行環境の負荷によるばらつきを抑えるため、最小値を使用します。
+MEASURE_RUNS: int = 5
+
+# coreから読み込んではいけないモジュール
+FORBIDDEN_MODULES = ("tkinter", "tkinterdnd2", "PIL.ImageTk", "PIL.PngImagePlugin", "sqlite3", "multiprocessing",
+                     "src.widgets", "src.controllers", "src.models")
+
+MEASURE_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import src.core as core
+bare = time.perf_counter() - start
+bare_modules = [m for m in sys.modules if m == "PIL" or m.startswith("PIL.")]
+for name in core.__all__:
+    getattr(core, name)
+engine = time.perf_counter() - start
+print(json.dumps({"bare_ms": bare * 1000, "engine_ms": engine * 1000, "bare_pil": bare_modules,
+                  "modules": sorted(sys.modules)}))
+"""
+
+
+class TestCore(unittest.TestCase):
+    """
+    coreのテストクラス
+    """
+    def measure(self) -> dict:
+        """
+        新しいプロセスでcoreの読み込み時間を計測します。ばらつきを抑えるため、MEASURE_RUNS回の最小値を使用します。
+        :return: 計測結果(読み込み時間は項目毎の最小値)
+        """
+        results = []
+        for _ in range(MEASURE_RUNS):
+            completed = subprocess.run([sys.executable, "-c", MEASURE_CODE], cwd=PROJECT_DIR,
+                                       capture_output=True, text=True, check=True)
+            results.append(json.loads(completed.stdout))
+        return {**results[0], "bare_ms": min(result["bare_ms"] for result in results),
+                "engine_ms": min(result["engine_ms"] for result in results)}
+
+    def test_exports(self):
+        """
+        公開する名前を参照できます。
+        """
+        for name in src.core.__all__:
+            self.assertIsNotNone(getattr(src.core, name))
+        self.assertIs(src.core.mosaic_filename, src.core.ImageFileService.mosaic_filename)
+        with self.assertRaises(AttributeError):
+            getattr(src.core, "MainPage")
+
+    def test_import_modules(self):
+        """
+        画面のモジュールを読み込まないこと
+        """
+        result = self.measure()
+        self.assertEqual(result["bare_pil"], [], "import src.core must not import PIL")
+        for module in FORBIDDEN_MODULES:
+            self.assertNotIn(module, result["modules"])
+
+    def test_import_budget(self):
+        """
+        読み込み時間が上限以内であること
+        """
+        result = self.measure()
+        self.assertLess(result["bare_ms"], IMPORT_BUDGET_MS)
+        self.assertLess(result["engine_ms"], ENGINE_IMPORT_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
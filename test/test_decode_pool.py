@@ -0,0 +1,121 @@
+"""
+ProcessDecodePoolの単体テスト
+"""
+import os
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.decode_pool import ProcessDecodePool, SharedBlockPool
+from src.thumbnail_service import ThumbnailService
+
+
+class TestProcessDecodePool(unittest.TestCase):
+    """
+    ProcessDecodePoolのテストクラス
+    """
+    @classmethod
+    def setUpClass(cls):
+        """ワーカープロセスの起動に時間がかかるため、テストクラスで共有します。"""
+        cls.pool = ProcessDecodePool(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        """ワーカープロセスを終了します。"""
+        cls.pool.shutdown()
+
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def create_image(self, mode: str, name: str) -> tuple[Path, Image.Image]:
+        """
+        画素が異なるテスト画像を作成します。
+        :param mode: 画像のモード
+        :param name: ファイル名
+        :return: ファイルのパス、画像
+        """
+        image = Image.linear_gradient("L").resize((257, 131)).convert(mode)
+        if mode == "P":
+            image.info["transparency"] = 0
+        file_path = Path(self.temp_dir.name, name)
+        image.save(file_path)
+        return file_path, image
+
+    def test_decode(self):
+        """
+        デコードした画素が、スレッドで読み込んだ画像と一致します。
+        """
+        for mode, expected_mode in (("RGB", "RGBX"), ("RGBA", "RGBA"), ("L", "L"), ("P", "RGBA")):
+            with self.subTest(mode=mode):
+                file_path, _ = self.create_image(mode, f"{mode}.png")
+                with Image.open(file_path) as src:
+                    expected = src.convert("RGBA" if mode == "P" else mode)
+                with self.pool.decode(file_path) as image:
+                    self.assertEqual(image.mode, expected_mode)
+                    self.assertTrue(image.readonly)  # コピーせずに共有メモリを参照します。
+                    actual = image.convert("RGB") if image.mode == "RGBX" else image.copy()
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_block_reuse(self):
+        """
+        返却したブロックを再利用します。detachした画像はブロックを参照しません。
+        """
+        file_path, expected = self.create_image("RGB", "image.png")
+        shared = self.pool.decode(file_path)
+        name = shared.block.name
+        image = shared.detach()
+        self.assertEqual((image.mode, image.tobytes()), ("RGB", expected.tobytes()))
+        shared.release()  # 2回目は何もしません。
+        self.assertEqual(self.pool.blocks.idle_bytes, shared.block.size)
+
+        futures = [self.pool.submit(file_path) for _ in range(3)]
+        shared_images = [future.result() for future in futures]
+        self.assertIn(name, [s.block.name for s in shared_images])
+        del shared_images, futures  # 画像の破棄時にも返却します。
+        self.assertEqual(self.pool.blocks.idle_bytes, 3 * shared.block.size)
+
+    def test_thumbnail(self):
+        """
+        サムネイルの生成にワーカープロセスを使用します。
+        """
+        file_path, expected = self.create_image("RGB", "image.png")
+        thumbnail = ThumbnailService.create_thumbnail(file_path, 64, self.pool)
+        self.assertEqual((thumbnail.mode, thumbnail.size), ("RGB", (64, 33)))
+        self.assertEqual(thumbnail.tobytes(), ThumbnailService.create_thumbnail(file_path, 64).tobytes())
+
+
+class TestSharedBlockPool(unittest.TestCase):
+    """
+    SharedBlockPoolのテストクラス
+    """
+    def test_idle_limit(self):
+        """
+        未使用のブロックの合計が上限を超える場合は削除します。
+        """
+        pool = SharedBlockPool(max_idle_bytes=3 * 1024 * 1024)
+        try:
+            small = pool.acquire(10)
+            large = pool.acquire(3 * 1024 * 1024)
+            self.assertEqual((small.size, large.size), (1024 * 1024, 3 * 1024 * 1024))
+            pool.release(small)
+            self.assertIsNot(pool.acquire(3 * 1024 * 1024), small)  # 2倍を超える大きさは再利用しません。
+            pool.release(large)
+            self.assertEqual(pool.idle_bytes, 3 * 1024 * 1024)  # 古いブロックから削除します。
+            self.assertIs(pool.acquire(2 * 1024 * 1024), large)
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+EditHistoryの単体テスト
+"""
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.edit_history import EditHistory, RegionSnapshot, SnapshotGroup
+from src.effects.image_effects import MosaicEffect
+
+
+class TestEditHistory(unittest.TestCase):
+    """
+    EditHistoryのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.image = Image.effect_noise((200, 120), 64).convert("RGB")
+        self.history = EditHistory()
+
+    def apply(self, box: tuple[int, int, int, int], cell_size: int = 8):
+        """
+        変更前の画素を記録してから、モザイクをかけます。
+        """
+        snapshot = RegionSnapshot.capture(self.image, box)
+        MosaicEffect(cell_size).apply(self.image, *box)
+        self.history.push(snapshot, (cell_size, box))
+
+    def test_undo_redo(self):
+        """
+        元に戻すと変更前の画素、やり直すと変更後の画素に戻ります。
+        """
+        original = self.image.tobytes()
+        self.apply((10, 10, 90, 70))
+        first = self.image.tobytes()
+        self.apply((50, 40, 230, 100), 16)  # 画像の範囲外は切り詰めます。
+        second = self.image.tobytes()
+
+        step = self.history.undo(self.image)
+        self.assertEqual((step.snapshot.box, step.payload), ((50, 40, 200, 100), (16, (50, 40, 230, 100))))
+        self.assertEqual(self.image.tobytes(), first)
+        self.history.undo(self.image)
+        self.assertEqual(self.image.tobytes(), original)
+        self.assertIsNone(self.history.undo(self.image))
+
+        self.history.redo(self.image)
+        self.history.redo(self.image)
+        self.assertEqual(self.image.tobytes(), second)
+        self.assertIsNone(self.history.redo(self.image))
+
+        # 新しい操作を記録すると、やり直しの履歴は破棄します。
+        self.history.undo(self.image)
+        self.apply((0, 0, 16, 16))
+        self.assertEqual(len(self.history.redo_steps), 0)
+        self.assertEqual(self.history.total_bytes, sum(len(s.snapshot.data) for s in self.history.undo_steps))
+
+    def test_evict(self):
+        """
+        上限を超えた場合は、古い操作から破棄します。
+        """
+        snapshot = RegionSnapshot.capture(self.image, (0, 0, 40, 40))
+        self.history = EditHistory(max_bytes=len(snapshot.data) * 5 // 2)
+        for i in range(4):
+            self.apply((i * 40, 0, i * 40 + 40, 40))
+        self.assertEqual([step.payload[1][0] for step in self.history.undo_steps], [80, 120])
+        self.assertLessEqual(self.history.total_bytes, self.history.max_bytes)
+
+    def test_group(self):
+        """
+        重なる複数の矩形を1回の操作として元に戻し、やり直します。
+        """
+        original = self.image.tobytes()
+        snapshots = []
+        for box in ((0, 0, 48, 16), (40, 0, 80, 16), (0, 16, 16, 32)):
+            snapshots.append(RegionSnapshot.capture(self.image, box))
+            MosaicEffect(8).apply(self.image, *box)
+        mosaic = self.image.tobytes()
+        group = SnapshotGroup(tuple(snapshots))
+        self.assertEqual(group.box, (0, 0, 80, 32))
+        self.history.push(group, "brush")
+        self.assertEqual(self.history.total_bytes, group.nbytes)
+
+        self.assertEqual(self.history.undo(self.image).payload, "brush")
+        self.assertEqual(self.image.tobytes(), original)
+        self.history.redo(self.image)
+        self.assertEqual(self.image.tobytes(), mosaic)
+
+    def test_palette(self):
+        """
+        パレット画像はインデックスのまま保存、復元します。
+        """
+        self.image = self.image.convert("P")
+        original = self.image.tobytes()
+        snapshot = RegionSnapshot.capture(self.image, (0, 0, 32, 32))
+        self.image.paste(0, (0, 0, 32, 32))
+        snapshot.restore(self.image)
+        self.assertEqual(self.image.tobytes(), original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+edit_logの単体テスト
+"""
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import BatchJob, process_job
+from src.cli import main
+from src.edit_log import EditLog, EditRecord, output_path_of, sidecar_path
+from src.effects.image_effects import MosaicEffect
+
+
+class TestEditLog(unittest.TestCase):
+    """
+    edit_logのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_path = Path(self.temp_dir.name, "input", "photo.png")
+        self.input_path.parent.mkdir()
+        self.source = Image.effect_noise((96, 64), 64).convert("RGB")
+        self.source.save(self.input_path)
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_replay(self):
+        """
+        記録した順序でモザイクを適用し、保存、読み込み後も同じ結果になります。
+        """
+        output_path = Path(self.temp_dir.name, "output", "photo_mosaic_0.png")
+        output_path.parent.mkdir()
+        edit_log = EditLog.create(self.input_path, output_path, self.source.size)
+        edit_log.add((0, 0, 50, 40), 8)
+        edit_log.add((30, 20, 120, 64), 16)  # 画像の範囲外は切り詰めます。
+        sidecar = edit_log.save(output_path)
+        self.assertEqual(sidecar, sidecar_path(output_path))
+        self.assertEqual(output_path_of(sidecar), output_path)
+
+        loaded = EditLog.load(sidecar)
+        self.assertEqual(loaded, edit_log)
+        self.assertEqual(loaded.source, "../input/photo.png")
+        self.assertEqual(loaded.source_path(sidecar).resolve(), self.input_path.resolve())
+
+        actual = self.source.copy()
+        loaded.replay(actual)
+        expected = self.source.copy()
+        MosaicEffect(8).apply(expected, 0, 0, 50, 40)
+        MosaicEffect(16).apply(expected, 30, 20, 96, 64)
+        self.assertEqual(actual.tobytes(), expected.tobytes())
+
+        with self.assertRaises(ValueError):
+            loaded.replay(Image.new("RGB", (10, 10)))
+        with self.assertRaises(ValueError):
+            EditRecord((0, 0, 1, 1), 8, statistic="median")
+
+    def test_rerender(self):
+        """
+        一括処理で保存した編集ログを修正して再生成した出力は、修正後の領域で処理した出力とビット単位で一致します。
+        """
+        job = BatchJob(str(self.input_path), MosaicEffect.AUTO, ((0, 0, 40, 40), ), edit_log=True)
+        result = process_job(job)
+        self.assertTrue(result.ok, result.error)
+        sidecar = sidecar_path(Path(result.output_path))
+        with open(sidecar, encoding="utf-8") as file:
+            data = json.load(file)
+        self.assertEqual(data["records"][0]["cell_size"], MosaicEffect.calc_cell_size(self.source))
+
+        # 領域を修正して再生成します。
+        data["records"][0]["rect"] = [8, 8, 72, 56]
+        with open(sidecar, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        self.assertEqual(main(["rerender", str(self.input_path.parent), "--workers", "1", "--quiet"]), 0)
+
+        expected_path = Path(self.temp_dir.name, "expected.png")
+        expected = process_job(BatchJob(str(self.input_path), 4, ((8, 8, 72, 56), ), output_path=str(expected_path)))
+        self.assertTrue(expected.ok, expected.error)
+        self.assertEqual(Path(result.output_path).read_bytes(), expected_path.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
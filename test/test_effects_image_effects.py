@@ -5,12 +5,14 @@ import os
 import sys
 import unittest
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageChops
 
 # プロジェクトのルートディレクトリをシステムパスに追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.effects.image_effects import MosaicEffect
+from src.effects.mask_shapes import Ellipse, Polygon, shape_from_dict
 
 
 class TestMosaicFilter(unittest.TestCase):
@@ -84,6 +86,99 @@ class TestMosaicFilter(unittest.TestCase):
                         gradient_image.save(test_image_file)
                     self.assertTrue(result, f"test:{test_image_file}, actual:{actual_image_path}")
 
+    def test_mosaic_effect_apply_array(self):
+        """
+        NumPy配列、バッファを直接書き換えるモザイクエフェクト。
+        """
+        for cell_size in [4, 10, 13, 41]:
+            actual_image_path = os.path.join(self.current_dir, 'test_files', f'mosaic_cell_size_{cell_size}.png')
+            with Image.open(actual_image_path) as actual_image, self.create_gradient_image(256, 256) as gradient_image:
+                array = np.array(gradient_image)
+                self.assertIs(MosaicEffect(cell_size).apply_array(array, 0, 0, 256, 256), array)
+                # PILは縮小時に8ビットで丸めるため、1の誤差を許容します。
+                diff = np.abs(array.astype(np.int16) - np.asarray(actual_image.convert("RGB"), dtype=np.int16))
+                self.assertLessEqual(diff.max(), 1, f"cell_size:{cell_size}")
+
+        # uint16、float32、2チャンネル。セルサイズで割り切れない余りの画素は変更しません。
+        for dtype in (np.uint16, np.float32):
+            array = np.arange(10 * 9 * 2, dtype=dtype).reshape(10, 9, 2)
+            expected = array.copy()
+            MosaicEffect(4).apply(array, 0, 0, 9, 10)
+            self.assertTrue(np.array_equal(array[8:], expected[8:]))
+            self.assertTrue(np.array_equal(array[:, 8:], expected[:, 8:]))
+            self.assertTrue(np.all(array[:4, :4] == array[0, 0]))
+
+        # 1次元のバッファは、形状を指定します。
+        buffer = bytearray(range(64))
+        MosaicEffect(4).apply_array(buffer, 0, 0, 8, 8, shape=(8, 8))
+        self.assertEqual(buffer[:4], bytearray([14, 14, 14, 14]))
+
+        with self.assertRaises(ValueError):
+            MosaicEffect(4).apply_array(np.zeros((8, 8, 3), dtype=np.uint8)[:, ::2], 0, 0, 4, 4)
+        with self.assertRaises(TypeError):
+            MosaicEffect(4).apply_array(np.zeros((8, 8), dtype=np.int32), 0, 0, 4, 4)
+
+    def test_mosaic_effect_apply_proxy(self):
+        """
+        縮小した作業用画像に描画したモザイクは、元の画像にモザイクをかけて縮小した結果とほぼ一致します。
+        """
+        source = Image.effect_noise((800, 600), 64).convert("RGB")
+        proxy = source.resize((200, 150), Image.Resampling.BOX)
+        box = (64, 32, 64 + 16 * 10, 32 + 16 * 5)
+        self.assertEqual(MosaicEffect(16).apply_proxy(proxy, (0.25, 0.25), *box), (16, 8, 16 + 40, 8 + 20))
+
+        MosaicEffect(16).apply(source, *box)
+        expected = source.resize((200, 150), Image.Resampling.BOX)
+        diff = ImageChops.difference(proxy, expected)
+        self.assertLessEqual(max(high for _, high in diff.getextrema()), 2)
+        self.assertEqual(MosaicEffect.calc_cell_size_for((2894, 4093)), 41)
+        # セルサイズで割り切れない余りの画素は変更しません。
+        self.assertEqual(MosaicEffect(16).apply_proxy(proxy.copy(), (0.25, 0.25), 0, 0, 16 * 3 + 9, 40), (0, 0, 12, 8))
+        self.assertIsNone(MosaicEffect(16).apply_proxy(proxy, (0.25, 0.25), 0, 0, 15, 100))
+
+    def test_mosaic_effect_apply_shapes(self):
+        """
+        多角形、楕円の被覆率が下限以上のセルのみモザイクをかけ、行毎の矩形にapplyした結果と一致します。
+        """
+        source = Image.effect_noise((200, 120), 64).convert("RGB")
+        shapes = [Ellipse((10, 10, 90, 70)), Polygon(((120, 10), (190, 60), (130, 110)))]
+        image = source.copy()
+        runs = MosaicEffect(10).apply_shapes(image, shapes)
+        self.assertTrue(runs)
+        expected = source.copy()
+        for rect in runs:
+            self.assertEqual((rect[0] % 10, rect[1] % 10, rect[2] % 10, rect[3] - rect[1]), (0, 0, 0, 10))
+            MosaicEffect(10).apply(expected, *rect)
+        self.assertEqual(image.tobytes(), expected.tobytes())
+        # 楕円の中心のセルはモザイク、外接矩形の角のセルは元のまま
+        self.assertEqual(len(image.crop((50, 40, 60, 50)).getcolors()), 1)
+        self.assertEqual(image.crop((10, 10, 20, 20)).tobytes(), source.crop((10, 10, 20, 20)).tobytes())
+
+        # 被覆率の下限を上げると、モザイクをかけるセルが減ります。
+        cells = sum((r[2] - r[0]) // 10 for r in runs)
+        strict = MosaicEffect(10).apply_shapes(source.copy(), shapes, threshold=1.0)
+        self.assertLess(sum((r[2] - r[0]) // 10 for r in strict), cells)
+
+        # NumPy配列も同じセルにモザイクをかけます。
+        array = np.asarray(source).copy()
+        self.assertEqual(MosaicEffect(10).apply_shapes(array, shapes), runs)
+        self.assertLessEqual(np.abs(array.astype(np.int16) - np.asarray(image).astype(np.int16)).max(), 1)
+
+        # 画像の範囲外、端の余りのセルは含みません。
+        self.assertEqual(MosaicEffect(10).apply_shapes(source, [Ellipse((195, 115, 300, 200))]), [])
+        self.assertEqual(MosaicEffect(10).apply_shapes(source, []), [])
+
+    def test_shape_from_dict(self):
+        """
+        JSONの辞書と多角形、楕円を相互に変換します。
+        """
+        for shape in (Ellipse((1.0, 2.0, 30.0, 40.0)), Polygon(((0.0, 0.0), (10.0, 0.0), (5.0, 8.5)))):
+            self.assertEqual(shape_from_dict(shape.to_dict()), shape)
+        self.assertEqual(Polygon(((0.5, 1), (10, 0), (5, 8.5))).bounds, (0, 0, 10, 9))
+        for data in ({"polygon": [[0, 0], [1, 1]]}, {"ellipse": [0, 0, 1]}, {"circle": [0, 0, 1]}):
+            with self.assertRaises(ValueError):
+                shape_from_dict(data)
+
     def compare_images(self, image1: Image.Image, image2: Image.Image, diff_image_path=None) -> bool:
         """
         2つの画像を比較し、差分を計算します
@@ -0,0 +1,146 @@
+"""
+hot_folderの単体テスト
+"""
+import os
+from pathlib import Path
+import sys
+import tempfile
+from threading import Thread
+import time
+import unittest
+
+from PIL import Image, ImageChops
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.effects.image_effects import EffectPreset, MosaicEffect
+from src.hot_folder import FolderWatcher, HotFolderDaemon, TemplateSet
+
+
+class TestHotFolder(unittest.TestCase):
+    """
+    hot_folderのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.watch_dir = Path(self.temp_dir.name, "scan")
+        self.watch_dir.mkdir()
+        self.presets = EffectPreset({"mosaic": {"cell_sizes": [10, 16, -1], "default": {"cell_size": 16}}})
+        self.templates = TemplateSet({
+            "templates": {
+                "header": {"match": ["page_*"], "units": "relative", "regions": [[0.0, 0.0, 1.0, 0.25]]},
+                "stamp": {"match": "stamp_*", "preset": "mosaic_10", "regions": [[10, 10, 40, 40]]},
+            },
+        }, self.presets)
+        self.source = Image.effect_noise((80, 64), 64).convert("RGB")
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_templates(self):
+        """
+        ファイル名で領域テンプレートを選択し、比率の領域は画像の大きさで変換します。
+        """
+        job = self.templates.match(Path("page_001.png")).create_job(Path("page_001.png"))
+        self.assertEqual((job.cell_size, job.resolve_regions((80, 64))), (16, ((0, 0, 80, 16), )))
+        self.assertTrue(job.save_directory)
+        self.assertEqual(self.templates.match(Path("stamp_1.jpg")).regions, ((10, 10, 40, 40), ))
+        self.assertIsNone(self.templates.match(Path("other.png")))
+        with self.assertRaises(ValueError):
+            TemplateSet({"templates": {"a": {"units": "relative", "regions": [[0, 0, 2, 1]]}}}, self.presets)
+
+    def test_watcher_debounce(self):
+        """
+        書き込み中のファイルは、大きさと更新日時が変化しなくなるまで処理しません。
+        フォルダの更新日時が変わらない間は、一覧を再取得しません。
+        """
+        watcher = FolderWatcher([self.watch_dir], settle=1.0)
+        path = self.watch_dir / "page_001.png"
+        with open(path, "wb") as file:
+            file.write(b"\x89PNG")
+        self.assertEqual(watcher.poll(now=0.0), [])
+        self.assertEqual(watcher.poll(now=0.5), [])
+        with open(path, "ab") as file:  # 書き込みの継続
+            file.write(b"\x00" * 100)
+        self.assertEqual(watcher.poll(now=1.2), [])
+        self.assertEqual(watcher.poll(now=2.3), [path])
+        self.assertEqual(watcher.poll(now=5.0), [])  # 処理済み
+
+        # 更新日時の精度の時間が過ぎた後は、フォルダが変わらない限り一覧を取得しません。
+        past = time.time() - 10
+        os.utime(self.watch_dir, (past, past))
+        watcher.poll(now=6.0)
+        listings = watcher.listings
+        for i in range(5):
+            watcher.poll(now=7.0 + i)
+        self.assertEqual(watcher.listings, listings)
+
+        path.unlink()
+        watcher.poll(now=13.0)
+        self.assertEqual(watcher.index, {})
+
+    def test_watcher_existing_files(self):
+        """
+        監視の開始時にあるファイルは処理せず、開始後に追加されたファイルのみ処理します。(再起動時)
+        process_existingを指定した場合は、既存のファイルも処理します。
+        """
+        existing = self.watch_dir / "page_001.png"
+        self.source.save(existing)
+        watcher = FolderWatcher([self.watch_dir], settle=1.0)
+        self.assertEqual(watcher.poll(now=0.0), [])
+        self.assertEqual(watcher.poll(now=2.0), [])
+        added = self.watch_dir / "page_002.png"
+        self.source.save(added)
+        self.assertEqual(watcher.poll(now=3.0), [])
+        self.assertEqual(watcher.poll(now=4.5), [added])
+
+        watcher = FolderWatcher([self.watch_dir], settle=1.0, process_existing=True)
+        self.assertEqual(watcher.poll(now=0.0), [])
+        self.assertEqual(watcher.poll(now=2.0), [existing, added])
+
+    def test_daemon_output_subdir(self):
+        """
+        複数のフォルダを監視する場合は、出力先ディレクトリ内にフォルダ毎のサブフォルダを作成します。
+        """
+        folders = [Path(self.temp_dir.name, "in", name) for name in ("a", "b")]
+        for folder in folders:
+            folder.mkdir(parents=True)
+        daemon = HotFolderDaemon(folders, self.templates, output_dir=str(Path(self.temp_dir.name, "out")), settle=0.1)
+        for folder in folders:
+            self.source.save(folder / "page_1.png")
+        daemon.collect(now=0.0)
+        daemon.collect(now=1.0)
+        self.assertEqual(sorted(job.output_subdir for job in daemon.backlog), ["a", "b"])
+
+    def test_daemon(self):
+        """
+        監視フォルダに追加されたファイルをワーカープロセスで処理し、_mosaicフォルダに保存します。
+        """
+        daemon = HotFolderDaemon([self.watch_dir], self.templates, max_workers=2, interval=0.05, settle=0.2)
+        thread = Thread(target=daemon.run)
+        thread.start()
+        try:
+            for i in range(3):
+                self.source.save(self.watch_dir / f"page_{i}.png")
+            self.source.save(self.watch_dir / "other.png")
+            deadline = time.monotonic() + 30
+            while daemon.summary.total < 3 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            daemon.stop()
+            thread.join()
+        self.assertEqual((daemon.summary.total, daemon.summary.succeeded), (3, 3))
+
+        expected = self.source.copy()
+        MosaicEffect(16).apply(expected, 0, 0, 80, 16)
+        output_dir = Path(self.temp_dir.name, "scan_mosaic")
+        self.assertEqual(sorted(p.name for p in output_dir.iterdir()), [f"page_{i}_mosaic_0.png" for i in range(3)])
+        with Image.open(output_dir / "page_0_mosaic_0.png") as actual:
+            self.assertIsNone(ImageChops.difference(actual.convert("RGB"), expected).getbbox())
+
+
+if __name__ == "__main__":
+    unittest.main()
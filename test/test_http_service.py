@@ -0,0 +1,133 @@
+"""
+http_serviceの単体テスト
+"""
+import http.client
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+from PIL import Image, ImageChops
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import RegionSpec
+from src.effects.image_effects import EffectPreset, MosaicEffect
+from src.http_service import RedactionServer
+
+
+class TestHttpService(unittest.TestCase):
+    """
+    http_serviceのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        presets = EffectPreset({"mosaic": {"cell_sizes": [10, 16, -1], "default": {"cell_size": 16}}})
+        self.server = RedactionServer(("127.0.0.1", 0), RegionSpec({"regions": [[0, 0, 32, 32]]}, presets),
+                                      max_workers=2, max_queue=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection(*self.server.server_address[:2], timeout=10)
+
+        self.source = Image.effect_noise((96, 64), 64).convert("RGB")
+        buffer = io.BytesIO()
+        self.source.save(buffer, format="PNG")
+        self.body = buffer.getvalue()
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path: str, body: bytes, headers: dict[str, str]) -> tuple[http.client.HTTPResponse, bytes]:
+        """
+        POST要求を送信します。
+        :param path: パス
+        :param body: 本文
+        :param headers: ヘッダー
+        :return: 応答と本文
+        """
+        self.connection.request("POST", path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_mosaic(self):
+        """
+        同じ接続で複数の要求を処理し、処理時間のヘッダーを返します。
+        """
+        spec = json.dumps({"regions": [[0, 0, 64, 48]], "preset": "mosaic_10"})
+        response, body = self.post("/mosaic", self.body, {"X-Mosaic-Spec": spec})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/png")
+        self.assertIn("total;dur=", response.getheader("Server-Timing"))
+        expected = self.source.copy()
+        MosaicEffect(10).apply(expected, 0, 0, 64, 48)
+        with Image.open(io.BytesIO(body)) as actual:
+            self.assertIsNone(ImageChops.difference(actual.convert("RGB"), expected).getbbox())
+
+        # keep-aliveで同じ接続を再利用します。
+        response, body = self.post("/mosaic?format=jpeg", self.body, {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/jpeg")
+
+        response, _ = self.post("/mosaic", b"broken", {})
+        self.assertEqual(response.status, 422)
+        response, _ = self.post("/mosaic", self.body, {"X-Mosaic-Spec": "[1, 2]"})
+        self.assertEqual(response.status, 400)
+        self.assertEqual(self.server.stats()["completed"], 3)
+
+    def test_busy(self):
+        """
+        処理枠が上限に達している場合は503を返します。
+        """
+        for _ in range(self.server.max_workers):
+            self.assertTrue(self.server.acquire_slot())
+        try:
+            response, _ = self.post("/mosaic", self.body, {})
+            self.assertEqual(response.status, 503)
+            self.assertEqual(response.getheader("Retry-After"), "1")
+            self.assertEqual(response.getheader("Connection"), "close")  # 本文を受信せずに切断します。
+        finally:
+            for _ in range(self.server.max_workers):
+                self.server.release_slot()
+        self.assertEqual(self.server.stats()["rejected"], 1)
+
+    def test_timeout(self):
+        """
+        タイムアウトした要求の処理中は処理枠を解放せず、処理の完了時に解放します。
+        """
+        self.server.request_timeout = 0.1
+        started, finish = threading.Event(), threading.Event()
+
+        def slow(*args):
+            started.set()
+            finish.wait(10)
+            return {"error": "slow"}, b"", {}
+
+        with patch("src.http_service.process_image", slow):
+            for _ in range(self.server.max_workers):
+                started.clear()
+                connection = http.client.HTTPConnection(*self.server.server_address[:2], timeout=10)
+                connection.request("POST", "/mosaic", body=self.body)
+                self.assertEqual(connection.getresponse().status, 504)
+                connection.close()
+                self.assertTrue(started.wait(10))
+            self.assertEqual(self.server.stats()["in_flight"], self.server.max_workers)
+            response, _ = self.post("/mosaic", self.body, {})
+            self.assertEqual(response.status, 503)
+            finish.set()
+        self.server.executor.submit(lambda: None).result(10)  # 処理中のjobの完了を待ちます。
+        for _ in range(100):
+            if self.server.stats()["in_flight"] == 0:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(self.server.stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
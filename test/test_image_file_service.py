@@ -4,6 +4,7 @@ ImageFileServiceの単体テスト
 import os
 from pathlib import Path
 import sys
+import tempfile
 import unittest
 
 from PIL import Image
@@ -51,6 +52,29 @@ class TestImageFileService(unittest.TestCase):
             # テスト完了後に出力先ファイルを削除
             output_path.unlink()
 
+    def test_sniff(self):
+        """
+        ファイル先頭のバイト列による画像形式の判定
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expected = {
+                "PNG": "png", "JPEG": "jpg", "WEBP": "webp", "GIF": "gif",
+                "BMP": "bmp", "PNM": "ppm", "TIFF": "tif",
+            }
+            for image_format, suffix in expected.items():
+                file_path = Path(temp_dir, f"image.{suffix}")
+                Image.new("RGB", (16, 16), color="blue").save(file_path)
+                result = ImageFileService.sniff(file_path)
+                self.assertEqual(result.format, image_format)
+                self.assertTrue(result.is_valid, image_format)
+
+            # シグネチャは一致するがヘッダーが壊れている
+            self.assertTrue(ImageFileService.detect_format(b"\x89PNG\r\n\x1a\n" + b"\x00" * 8).corrupt)
+            self.assertTrue(ImageFileService.detect_format(b"\xFF\xD8\x00").corrupt)
+            # 判定できない
+            self.assertFalse(ImageFileService.detect_format(b"<svg").is_valid)
+            self.assertFalse(ImageFileService.sniff(Path(temp_dir, "missing.png")).is_valid)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,101 @@
+"""
+ImagePyramidの単体テスト
+"""
+import os
+import sys
+import unittest
+
+from PIL import Image, ImageChops
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.effects.image_effects import MosaicEffect
+from src.image_pyramid import ImagePyramid
+
+
+class TestImagePyramid(unittest.TestCase):
+    """
+    ImagePyramidのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.image = Image.effect_noise((1001, 517), 64).convert("RGB")
+
+    def test_levels(self):
+        """
+        レベルは参照時に生成し、大きさは1/2ずつ(端数は切り上げ)になります。
+        """
+        pyramid = ImagePyramid(self.image, min_size=64)
+        self.assertEqual(pyramid.max_level, 3)
+        self.assertEqual(pyramid.levels[1:], [None, None, None])
+        self.assertEqual(pyramid.get(2).size, (251, 130))
+        self.assertIsNotNone(pyramid.levels[1])
+        self.assertIsNone(pyramid.levels[3])
+        self.assertIs(pyramid.get(0), self.image)
+
+        self.assertEqual(pyramid.level_for_scale(2.0), 0)
+        self.assertEqual(pyramid.level_for_scale(1.0), 0)
+        self.assertEqual(pyramid.level_for_scale(0.6), 0)
+        self.assertEqual(pyramid.level_for_scale(0.5), 1)
+        self.assertEqual(pyramid.level_for_scale(0.25), 2)
+        self.assertEqual(pyramid.level_for_scale(0.01), 3)
+
+    def test_update_region(self):
+        """
+        変更した領域のみを縮小し直した結果は、全体を縮小し直した結果と一致します。
+        """
+        pyramid = ImagePyramid(self.image)
+        for level in range(pyramid.max_level + 1):
+            pyramid.get(level)
+        box = (101, 33, 457, 290)
+        MosaicEffect(16).apply(self.image, *box)
+        pyramid.update_region(box)
+
+        expected = ImagePyramid(self.image)
+        for level in range(1, pyramid.max_level + 1):
+            diff = ImageChops.difference(pyramid.get(level), expected.get(level))
+            self.assertIsNone(diff.getbbox(), f"level:{level}")
+
+    def test_render(self):
+        """
+        表示倍率の領域を生成します。等倍、レベルと同じ倍率は縮小しません。
+        """
+        pyramid = ImagePyramid(self.image)
+        self.assertEqual(pyramid.render(1.0, (10, 20, 110, 70)).tobytes(), self.image.crop((10, 20, 110, 70)).tobytes())
+        self.assertEqual(pyramid.render(0.5, (0, 0, 64, 32)).tobytes(), pyramid.get(1).crop((0, 0, 64, 32)).tobytes())
+        self.assertEqual(pyramid.render(0.3, (0, 0, 300, 155)).size, (300, 155))
+        self.assertEqual(pyramid.render(2.0, (0, 0, 40, 20)).getpixel((1, 1)), self.image.getpixel((0, 0)))
+
+    def test_render_mosaic(self):
+        """
+        縮小済みのレベルから生成したプレビューは、元の画像にモザイクをかけた結果とほぼ一致します。
+        """
+        pyramid = ImagePyramid(self.image)
+        box = (64, 32, 64 + 16 * 10, 32 + 16 * 5)
+        x, y, preview = pyramid.render_mosaic(1.0, box, 16)
+        self.assertEqual((x, y, preview.size), (64, 32, (160, 80)))
+
+        expected = self.image.copy()
+        MosaicEffect(16).apply(expected, *box)
+        diff = ImageChops.difference(preview, expected.crop((64, 32, 64 + 160, 32 + 80)))
+        self.assertLessEqual(max(high for _, high in diff.getextrema()), 2)
+
+        x, y, preview = pyramid.render_mosaic(0.25, box, 16)
+        self.assertEqual((x, y, preview.size), (16, 8, (40, 20)))
+        # セルサイズで割り切れない余りは含みません。
+        self.assertEqual(pyramid.render_mosaic(1.0, (0, 0, 16 * 3 + 9, 40), 16)[2].size, (48, 32))
+        self.assertIsNone(pyramid.render_mosaic(1.0, (0, 0, 15, 100), 16))
+
+    def test_palette(self):
+        """
+        Image.reduceに対応していないモードは変換して縮小します。
+        """
+        image = self.image.convert("P")
+        pyramid = ImagePyramid(image)
+        self.assertEqual(pyramid.get(1).mode, "RGB")
+        pyramid.update_region((0, 0, 10, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
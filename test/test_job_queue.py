@@ -0,0 +1,108 @@
+"""
+job_queueの単体テスト
+"""
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import BatchJob, BatchResult
+from src.job_queue import JobQueue, parse_shard, run_local_workers, select_shard
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+class TestJobQueue(unittest.TestCase):
+    """
+    JobQueueのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = Path(self.temp_dir.name, "input")
+        self.input_dir.mkdir()
+        self.spool_dir = Path(self.temp_dir.name, "spool")
+        for i in range(12):
+            Image.effect_noise((64, 48), 64).convert("RGB").save(self.input_dir / f"image_{i:02}.png")
+        self.jobs = [BatchJob(str(path), 8, ((0, 0, 32, 24), )) for path in sorted(self.input_dir.iterdir())]
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_shard(self):
+        """
+        シャードは全てのジョブを重複なく分割します。
+        """
+        self.assertEqual(parse_shard("1/3"), (1, 3))
+        for text in ("3/3", "a/3", "1"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+        shards = [list(select_shard(self.jobs, i, 3)) for i in range(3)]
+        self.assertEqual(sorted(job.input_path for shard in shards for job in shard),
+                         [job.input_path for job in self.jobs])
+        self.assertEqual(shards, [list(select_shard(self.jobs, i, 3)) for i in range(3)])
+
+    def test_claim_and_lease(self):
+        """
+        取得済みのジョブは他のワーカーが取得できません。リースの期限を過ぎたジョブは再実行します。
+        """
+        queue = JobQueue(self.spool_dir, lease=60)
+        self.assertEqual(queue.enqueue(self.jobs[:2]), 2)
+        self.assertEqual(queue.enqueue(self.jobs[:2]), 0)  # 登録済み
+
+        first = queue.claim("a")
+        second = queue.claim("b")
+        self.assertNotEqual(first.job_id, second.job_id)
+        self.assertIsNone(queue.claim("c"))
+        self.assertEqual(first.job.regions, ((0, 0, 32, 24), ))
+
+        queue.complete(first, BatchResult(first.job.input_path, "out.png"))
+        self.assertEqual(queue.reclaim(), 0)
+        self.assertEqual(queue.reclaim(time.time() + 61), 1)  # bの処理が停止した場合
+        self.assertFalse(queue.heartbeat(second))
+        again = queue.claim("c")
+        self.assertEqual(again.job_id, second.job_id)
+        queue.complete(again, BatchResult(again.job.input_path, error="ValueError: broken"))
+        self.assertEqual(queue.counts(), {"pending": 0, "running": 0, "done": 1, "failed": 1})
+        self.assertEqual(queue.enqueue(self.jobs[:2]), 1)  # エラーのジョブは再登録できます。
+
+    def test_local_workers(self):
+        """
+        複数のワーカープロセスで、全てのジョブを1回ずつ処理します。
+        """
+        queue = JobQueue(self.spool_dir)
+        queue.enqueue(self.jobs)
+        summary = run_local_workers(self.spool_dir, workers=3, poll=0.05)
+        self.assertEqual((summary.total, summary.succeeded), (12, 12))
+        self.assertEqual(queue.counts(), {"pending": 0, "running": 0, "done": 12, "failed": 0})
+        outputs = sorted(Path(result.output_path).name for result in queue.results())
+        self.assertEqual(outputs, [f"image_{i:02}_mosaic_0.png" for i in range(12)])
+
+    def test_cli(self):
+        """
+        queueサブコマンドで登録、処理、状態の表示を行います。
+        """
+        def run(*args: str) -> subprocess.CompletedProcess:
+            return subprocess.run([sys.executable, "app.py", "queue", *args, "--spool", str(self.spool_dir)],
+                                  cwd=PROJECT_DIR, capture_output=True, text=True, timeout=120)
+        for i in range(2):
+            completed = run("enqueue", str(self.input_dir), "--shard", f"{i}/2")
+            self.assertEqual(completed.returncode, 0, completed.stderr)
+        completed = run("work", "--workers", "2", "--poll", "0.05")
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertIn("12/12 succeeded", completed.stdout)
+        completed = run("status")
+        self.assertEqual(completed.stdout.strip(), "pending:0, running:0, done:12, failed:0")
+
+
+if __name__ == "__main__":
+    unittest.main()
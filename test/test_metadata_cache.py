@@ -0,0 +1,121 @@
+"""
+MetadataCacheの単体テスト
+"""
+import os
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.metadata_cache import ACCESS_UPDATE_INTERVAL, CachedMetadata, MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    """
+    MetadataCacheのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.temp_dir.name, "cache", "metadata.sqlite3")
+        self.image_path = Path(self.temp_dir.name, "image.png")
+        Image.new("RGB", (320, 200), color="blue").save(self.image_path)
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_persist_across_sessions(self):
+        """
+        キャッシュした画像情報とサムネイルを次回起動時に再利用します。
+        """
+        cache = MetadataCache(self.db_path)
+        metadata = cache.get_or_probe(self.image_path)
+        self.assertEqual(metadata.size, (320, 200))
+        self.assertEqual(metadata.format, "PNG")
+        with Image.open(self.image_path) as img:
+            img.thumbnail((128, 128))
+            cache.put_thumbnail(self.image_path, img)
+        cache.close()
+
+        cache = MetadataCache(self.db_path)
+        self.assertEqual(cache.get(self.image_path), metadata)
+        thumbnail = cache.get_thumbnail(self.image_path)
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(thumbnail.size, (128, 80))
+
+        # ファイルが更新された場合は、キャッシュを使用しません。
+        Image.new("RGB", (64, 64)).save(self.image_path)
+        os.utime(self.image_path, ns=(0, 1_000_000_000))
+        self.assertIsNone(cache.get(self.image_path))
+        self.assertIsNone(cache.get_thumbnail(self.image_path))
+        self.assertEqual(cache.get_or_probe(self.image_path).size, (64, 64))
+        cache.close()
+
+    def test_format_only(self):
+        """
+        取り込み時に判定した画像形式のみの情報は、大きさの取得時にヘッダーを読み込みます。
+        """
+        cache = MetadataCache(self.db_path)
+        cache.put(self.image_path, CachedMetadata(format="PNG"))
+        cache.close()
+
+        cache = MetadataCache(self.db_path)
+        cached = cache.get(self.image_path)
+        self.assertEqual((cached.format, cached.is_probed), ("PNG", False))
+        self.assertEqual(cache.get_or_probe(self.image_path).size, (320, 200))
+        self.assertTrue(cache.get(self.image_path).is_probed)
+        cache.close()
+
+    def test_access_time(self):
+        """
+        参照のみの場合、最終参照日時はACCESS_UPDATE_INTERVAL毎にのみ更新します。
+        """
+        cache = MetadataCache(self.db_path)
+        cache.get_or_probe(self.image_path)
+
+        def last_access() -> float:
+            return cache._conn.execute("SELECT last_access FROM entries").fetchone()[0]
+
+        stored = last_access()
+        cache.get(self.image_path)
+        self.assertEqual(last_access(), stored)
+        cache._conn.execute("UPDATE entries SET last_access=?", (stored - ACCESS_UPDATE_INTERVAL, ))
+        cache.get(self.image_path)
+        self.assertGreaterEqual(last_access(), stored)
+        cache.close()
+
+    def test_eviction(self):
+        """
+        上限サイズを超えた場合は、古いものから削除します。
+        """
+        cache = MetadataCache(self.db_path, max_bytes=4096)
+        paths: list[Path] = []
+        for i in range(40):
+            file_path = Path(self.temp_dir.name, f"image_{i}.png")
+            Image.new("RGB", (8, 8)).save(file_path)
+            cache.get_or_probe(file_path)
+            paths.append(file_path)
+        self.assertLessEqual(cache.total_bytes, 4096)
+        self.assertIsNone(cache.get(paths[0]))
+        self.assertIsNotNone(cache.get(paths[-1]))
+        cache.close()
+
+    def test_recreate_corrupt_database(self):
+        """
+        破損したデータベースは作り直します。
+        """
+        self.db_path.parent.mkdir(parents=True)
+        self.db_path.write_bytes(b"not a database" * 100)
+        cache = MetadataCache(self.db_path)
+        self.assertEqual(cache.get_or_probe(self.image_path).size, (320, 200))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+modelsの単体テスト
+"""
+import os
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.app_config import AppConfig
+from src.metadata_cache import MetadataCache
+from src.models import AppDataModel, FileStat, ImageList
+
+
+class TestImageList(unittest.TestCase):
+    """
+    ImageListのテストクラス
+    """
+    def test_add_deduplicates(self):
+        """
+        同じファイルは一度だけ追加されます。
+        """
+        image_list = ImageList()
+        self.assertTrue(image_list.add(Path("a.png")))
+        self.assertTrue(image_list.add(Path("b.png")))
+        self.assertFalse(image_list.add(Path("./a.png")))
+        self.assertEqual(len(image_list), 2)
+        self.assertIn(Path("a.png"), image_list)
+        self.assertEqual(image_list.index_of(Path("b.png")), 1)
+        self.assertEqual(image_list.index_of(Path("c.png")), -1)
+
+    def test_sort(self):
+        """
+        自然順、名前順、更新日時順、サイズ順の並べ替え
+        """
+        image_list = ImageList()
+        image_list.add(Path("img10.png"), FileStat(mtime=1.0, size=300))
+        image_list.add(Path("img2.png"), FileStat(mtime=3.0, size=100))
+        image_list.add(Path("IMG1.png"), FileStat(mtime=2.0, size=200))
+
+        image_list.sort("natural")
+        self.assertListEqual(["IMG1.png", "img2.png", "img10.png"], [f.name for f in image_list])
+        self.assertEqual(image_list.index_of(Path("img10.png")), 2)
+
+        image_list.sort("name")
+        self.assertListEqual(["IMG1.png", "img10.png", "img2.png"], [f.name for f in image_list])
+
+        image_list.sort("mtime", reverse=True)
+        self.assertListEqual(["img2.png", "IMG1.png", "img10.png"], [f.name for f in image_list])
+
+        image_list.sort("size")
+        self.assertListEqual(["img2.png", "IMG1.png", "img10.png"], [f.name for f in image_list])
+
+        with self.assertRaises(ValueError):
+            image_list.sort("unknown")  # type: ignore
+
+
+class TestAppDataModel(unittest.TestCase):
+    """
+    AppDataModelのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.model = AppDataModel(Mock(AppConfig))
+        self.model.data_saved_handler = Mock()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files: list[Path] = []
+        for name in ["b_2.png", "b_10.png", "a.jpg", "readme.txt"]:
+            file_path = Path(self.temp_dir.name, name)
+            if file_path.suffix == ".txt":
+                file_path.write_bytes(b"")
+            else:
+                Image.new("RGB", (8, 8)).save(file_path)
+            self.files.append(file_path)
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def test_add_images(self):
+        """
+        画像ファイル以外と重複ファイルはスキップします。
+        """
+        count = self.model.add_images(self.files + self.files + [Path(self.temp_dir.name, "missing.png")])
+        self.assertEqual(count, 3)
+        self.assertEqual(self.model.count, 3)
+
+    def test_add_images_validation(self):
+        """
+        壊れたファイルは追加せず、拡張子が異なるファイルは判定した画像形式を保持します。
+        """
+        broken = Path(self.temp_dir.name, "broken.png")
+        broken.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 24)
+        misnamed = Path(self.temp_dir.name, "misnamed.jpg")
+        Image.new("RGB", (8, 8)).save(misnamed, format="PNG")
+
+        count = self.model.add_images([broken, misnamed])
+        self.assertEqual(count, 1)
+        self.assertEqual(self.model.image_list.sniff(misnamed).format, "PNG")
+        self.assertEqual(self.model.get_current_image_format(), "PNG")
+        self.assertFalse(self.model.check_image_file(broken))
+
+    def test_add_images_cache(self):
+        """
+        取り込み時に判定した画像形式をキャッシュし、次回の取り込みではファイルを読み込みません。
+        """
+        self.model.metadata_cache = MetadataCache(Path(self.temp_dir.name, "cache", "metadata.sqlite3"))
+        try:
+            self.assertEqual(self.model.add_images(self.files), 3)
+            self.model.clear()
+            with patch("src.models.ImageFileService.sniff") as sniff:
+                self.assertEqual(self.model.add_images(self.files), 3)
+            sniff.assert_not_called()
+        finally:
+            self.model.metadata_cache.close()
+
+    def test_jump_and_sort(self):
+        """
+        ファイル、インデックス指定の移動と並べ替え後の選択状態
+        """
+        self.model.add_images(self.files)
+        self.assertTrue(self.model.jump_to_file(self.files[1]))
+        self.assertEqual(self.model.current, 1)
+        self.assertFalse(self.model.jump_to_index(3))
+        self.assertFalse(self.model.jump_to_file(self.files[3]))
+
+        self.model.sort_images("natural")
+        self.assertEqual(self.model.get_current_image(), self.files[1])
+        self.assertEqual(self.model.current, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+photo_backendの単体テスト
+"""
+import io
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.photo_backend import PhotoBackend, PhotoPool, display_mode, encode_ppm
+
+
+class FakePhoto:
+    """
+    PhotoImageの代わり
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.image = None
+
+    def __str__(self):
+        return self.name
+
+
+class FakeBackend(PhotoBackend):
+    """
+    生成したPhotoImageの数を記録する表示バックエンド
+    """
+    name = "fake"
+
+    def __init__(self):
+        self.created = 0
+
+    def create(self, master, mode, size):
+        self.created += 1
+        return FakePhoto(f"photo{self.created}")
+
+    def put(self, photo, image, x=0, y=0):
+        photo.image = image
+
+
+class TestPhotoBackend(unittest.TestCase):
+    """
+    photo_backendのテストクラス
+    """
+    def test_encode_ppm(self):
+        """
+        L、RGBの画像をPGM、PPMに変換し、Pillowで読み込むと元の画像と一致します。
+        """
+        for mode in ("L", "RGB", "1"):
+            image = Image.effect_noise((33, 17), 64).convert(mode)
+            with Image.open(io.BytesIO(encode_ppm(image))) as decoded:
+                expected = image.convert("L") if mode == "1" else image
+                self.assertEqual((decoded.mode, decoded.tobytes()), (expected.mode, expected.tobytes()))
+
+    def test_display_mode(self):
+        """
+        ImageTk.PhotoImageと同じモードで表示します。
+        """
+        image = Image.new("RGB", (4, 4))
+        self.assertEqual(display_mode(image), "RGB")
+        self.assertEqual(display_mode(image.convert("P")), "RGB")
+        palette = image.convert("P")
+        palette.info["transparency"] = 0
+        self.assertEqual(display_mode(palette), "RGBA")
+        self.assertEqual(display_mode(Image.new("I;16", (4, 4))), "L")
+
+    def test_pool(self):
+        """
+        同じモードと大きさのPhotoImageを再利用し、上限を超えた分は破棄します。
+        """
+        backend = FakeBackend()
+        pool = PhotoPool(None, backend, max_idle=1)
+        tile = Image.new("RGB", (8, 8))
+        first = pool.acquire(tile)
+        second = pool.acquire(tile)
+        pool.release(first)
+        pool.release(second)  # 上限を超えたため破棄
+        self.assertEqual(pool.idle_count, 1)
+
+        self.assertIs(pool.acquire(Image.new("RGB", (8, 8), "red")), first)
+        self.assertEqual(first.image.getpixel((0, 0)), (255, 0, 0))
+        pool.acquire(Image.new("RGB", (4, 8)))  # 大きさが異なる
+        pool.acquire(Image.new("L", (8, 8)))  # モードが異なる
+        self.assertEqual(backend.created, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
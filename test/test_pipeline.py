@@ -0,0 +1,128 @@
+"""
+pipelineの単体テスト
+"""
+import io
+import os
+from pathlib import Path
+import subprocess
+import sys
+import unittest
+
+from PIL import Image, ImageChops
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batch import RegionSpec
+from src.effects.image_effects import EffectPreset, MosaicEffect
+from src.pipeline import FrameError, read_frame, run_pipeline, write_frame
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def encode(image: Image.Image, image_format: str) -> bytes:
+    """
+    画像をエンコードします。
+    :param image: 画像
+    :param image_format: 画像形式
+    :return: エンコードした画像
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    pipelineのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.presets = EffectPreset({"mosaic": {"cell_sizes": [10, 16, -1], "default": {"cell_size": 16}}})
+        self.source = Image.effect_noise((96, 64), 64).convert("RGB")
+
+    def read_all(self, stream: io.BytesIO) -> list[tuple[dict, bytes]]:
+        """
+        出力のフレームを全て読み込みます。
+        :param stream: 出力ストリーム
+        :return: ヘッダーと本体
+        """
+        stream.seek(0)
+        frames = []
+        while (frame := read_frame(stream)) is not None:
+            frames.append(frame)
+        return frames
+
+    def test_run_pipeline(self):
+        """
+        入力と同じ順序で、モザイクをかけた画像を出力します。エラーのフレームも出力します。
+        """
+        input_stream = io.BytesIO()
+        body = encode(self.source, "PNG")
+        write_frame(input_stream, {"id": 1, "regions": [[0, 0, 64, 48]], "preset": "mosaic_10"}, body)
+        write_frame(input_stream, {"id": 2, "format": "jpeg"}, body)
+        write_frame(input_stream, {"id": 3}, b"broken")
+        write_frame(input_stream, {"id": 4, "preset": "mosaic_99"}, body)
+        input_stream.seek(0)
+
+        output_stream = io.BytesIO()
+        spec = RegionSpec({"regions": [[0, 0, 32, 32]]}, self.presets)
+        summary = run_pipeline(input_stream, output_stream, spec)
+        self.assertEqual((summary.total, summary.failed), (4, 2))
+
+        frames = self.read_all(output_stream)
+        self.assertEqual([header["id"] for header, _ in frames], [1, 2, 3, 4])
+
+        header, body = frames[0]
+        self.assertEqual((header["format"], header["width"], header["height"]), ("PNG", 96, 64))
+        expected = self.source.copy()
+        MosaicEffect(10).apply(expected, 0, 0, 64, 48)
+        with Image.open(io.BytesIO(body)) as actual:
+            self.assertIsNone(ImageChops.difference(actual.convert("RGB"), expected).getbbox())
+
+        header, body = frames[1]
+        self.assertEqual(header["format"], "JPEG")
+        with Image.open(io.BytesIO(body)) as actual:
+            self.assertEqual(actual.format, "JPEG")
+
+        for header, body in frames[2:]:
+            self.assertEqual(header["length"], 0)
+            self.assertTrue(header["error"])
+            self.assertEqual(body, b"")
+
+    def test_truncated_stream(self):
+        """
+        本体が途中で終わる場合は、FrameErrorを送出します。
+        """
+        input_stream = io.BytesIO(b'{"id": 1, "length": 100}\n' + b"x" * 10)
+        with self.assertRaises(FrameError):
+            run_pipeline(input_stream, io.BytesIO(), RegionSpec({}, self.presets))
+
+    def test_read_error(self):
+        """
+        入力ストリームの読み込みで例外が発生した場合は、待ち続けずに例外を送出します。
+        """
+        class BrokenStream(io.BytesIO):
+            def readline(self, *args):
+                raise OSError("read error")
+
+        with self.assertRaises(OSError):
+            run_pipeline(BrokenStream(), io.BytesIO(), RegionSpec({}, self.presets))
+
+    def test_cli_pipe(self):
+        """
+        pipeサブコマンドで標準入出力を使用します。
+        """
+        input_stream = io.BytesIO()
+        write_frame(input_stream, {"id": "a", "regions": [[0, 0, 32, 32]]}, encode(self.source, "PNG"))
+        completed = subprocess.run([sys.executable, "app.py", "pipe", "--quiet"], cwd=PROJECT_DIR,
+                                   input=input_stream.getvalue(), capture_output=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        frames = self.read_all(io.BytesIO(completed.stdout))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][0]["id"], "a")
+        self.assertEqual(frames[0][0]["format"], "PNG")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+region_indexの単体テスト
+"""
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.edit_history import RegionSnapshot
+from src.edit_log import EditLog, EditRecord
+from src.region_index import AppliedRegion, RegionIndex, swap_snapshots
+
+
+class TestRegionIndex(unittest.TestCase):
+    """
+    RegionIndexのテストクラス
+    """
+    def test_hit_test(self):
+        """
+        点を含む領域を新しい順に列挙し、削除した領域は含みません。
+        """
+        index = RegionIndex(bucket_size=16)
+        a = AppliedRegion(8, (0, 0, 40, 40))
+        b = AppliedRegion(8, (20, 20, 60, 60))
+        c = AppliedRegion(8, (100, 100, 120, 120))
+        for region in (a, b, c):
+            index.add(region)
+        self.assertEqual(index.at(30, 30), [b, a])
+        self.assertIs(index.hit_test(10, 10), a)
+        self.assertIsNone(index.hit_test(80, 80))
+        self.assertIsNone(index.hit_test(60, 60))  # 右下は含まない
+        self.assertEqual(list(index), [a, b, c])
+
+        index.remove(b)
+        self.assertEqual(index.at(30, 30), [a])
+        self.assertEqual(len(index), 2)
+        index.add(b)  # 元に戻した場合も、適用した順序を保持します。
+        self.assertEqual(list(index), [a, b, c])
+        index.clear()
+        self.assertEqual((len(index), index.buckets), (0, {}))
+
+    def test_overlapping(self):
+        """
+        複数のバケットにまたがる領域を重複なく列挙します。
+        """
+        index = RegionIndex(bucket_size=16)
+        large = AppliedRegion(8, (0, 0, 100, 100))
+        small = AppliedRegion(8, (90, 90, 95, 95))
+        index.add(large)
+        index.add(small)
+        self.assertEqual(index.overlapping((50, 50, 200, 200)), [large, small])
+        self.assertEqual(index.overlapping((96, 96, 200, 200)), [large])
+        self.assertEqual(index.overlapping((100, 0, 200, 200)), [])
+
+    def apply_regions(self, image: Image.Image, index: RegionIndex,
+                      rects: tuple[tuple[int, int, int, int], ...]) -> list[AppliedRegion]:
+        """
+        適用前の画素を保存して、領域にモザイクをかけます。
+        :param image: 画像
+        :param index: 空間インデックス
+        :param rects: 領域
+        :return: 適用した領域
+        """
+        regions = []
+        for rect in rects:
+            region = AppliedRegion(16, rect, RegionSnapshot.capture(image, rect))
+            EditRecord(rect, 16).apply(image)
+            index.add(region)
+            regions.append(region)
+        return regions
+
+    def replay(self, source: Image.Image, index: RegionIndex) -> Image.Image:
+        """
+        残りの領域を元の画像に適用した順序で適用します。(編集ログの再生)
+        :param source: 元の画像
+        :param index: 空間インデックス
+        :return: 画像
+        """
+        edit_log = EditLog("source.png", source.size)
+        for region in index:
+            edit_log.add(region.rect, region.cell_size)
+        image = source.copy()
+        edit_log.replay(image)
+        return image
+
+    def test_remove_and_replay(self):
+        """
+        領域の削除後の画像は、残りの領域の編集ログを元の画像に再生した画像と一致します。
+        重なる領域の外の画素は変化しません。
+        """
+        source = Image.effect_noise((128, 96), 64).convert("RGB")
+        image = source.copy()
+        index = RegionIndex(bucket_size=32)
+        a, b, c, d = self.apply_regions(image, index, ((0, 0, 48, 48), (24, 8, 72, 56), (60, 40, 100, 88),
+                                                       (104, 0, 128, 24)))
+        self.assertEqual(index.affected_box(a.rect), (0, 0, 100, 88))
+        before = image.copy()
+
+        def reapply(img: Image.Image, region: AppliedRegion):
+            EditRecord(region.rect, region.cell_size).apply(img)
+        swaps = index.remove_and_replay(a, image, reapply)
+        self.assertEqual(image.tobytes(), self.replay(source, index).tobytes())
+        self.assertEqual(image.crop(d.rect).tobytes(), before.crop(d.rect).tobytes())
+        self.assertEqual([region for region, _ in swaps], [b, c])
+
+        # 適用前の画素を更新するため、続けて削除しても一致します。
+        index.remove_and_replay(c, image, reapply)
+        self.assertEqual(image.tobytes(), self.replay(source, index).tobytes())
+
+    def test_swap_snapshots(self):
+        """
+        削除を元に戻すと、適用し直した領域の適用前の画素も戻ります。
+        """
+        source = Image.effect_noise((64, 64), 64).convert("RGB")
+        image = source.copy()
+        index = RegionIndex(bucket_size=32)
+        a, b = self.apply_regions(image, index, ((0, 0, 40, 40), (20, 20, 60, 60)))
+        snapshot = b.snapshot
+        swaps = index.remove_and_replay(a, image, lambda img, region: EditRecord(region.rect, 16).apply(img))
+        self.assertIsNot(b.snapshot, snapshot)
+        swap_snapshots(swaps)
+        self.assertIs(b.snapshot, snapshot)
+        swap_snapshots(swaps)  # やり直し
+        self.assertIsNot(b.snapshot, snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+ThumbnailServiceの単体テスト
+"""
+from concurrent.futures import Future
+import os
+from pathlib import Path
+import queue
+import sys
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.metadata_cache import MetadataCache
+from src.thumbnail_service import ThumbnailService
+
+
+class TestThumbnailService(unittest.TestCase):
+    """
+    ThumbnailServiceのテストクラス
+    """
+    def setUp(self):
+        """テストのセットアップを行います。"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files: list[Path] = []
+        for i, suffix in enumerate(["jpg", "png", "webp"]):
+            file_path = Path(self.temp_dir.name, f"image_{i}.{suffix}")
+            Image.new("RGB", (640, 320), color="blue").save(file_path)
+            self.files.append(file_path)
+
+    def tearDown(self):
+        """テストの後処理を行います。"""
+        self.temp_dir.cleanup()
+
+    def wait_completed(self, service: ThumbnailService, count: int):
+        """
+        サムネイルの生成完了を待ちます。
+        :param service: サムネイルの生成サービス
+        :param count: 完了を待つ件数
+        """
+        completed = 0
+        deadline = time.monotonic() + 10
+        while completed < count and time.monotonic() < deadline:
+            completed += service.poll()
+            time.sleep(0.01)
+        self.assertEqual(completed, count)
+
+    def test_generate_in_background(self):
+        """
+        ワーカースレッドでサムネイルを生成します。
+        """
+        service = ThumbnailService(size=64, max_workers=2)
+        try:
+            for file_path in self.files:
+                self.assertIsNone(service.get(file_path))
+                service.request(file_path)
+            self.wait_completed(service, len(self.files))
+            for file_path in self.files:
+                self.assertEqual(service.get(file_path).size, (64, 32))
+            self.assertEqual(service.pending, 0)
+        finally:
+            service.shutdown()
+
+    def test_completed_before_pending(self):
+        """
+        生成の完了は、生成中の一覧から削除する前に通知します。(pendingとpollの両方が0の状態になりません。)
+        """
+        service = ThumbnailService(size=64, max_workers=1)
+        states: list[bool] = []
+
+        class RecordingQueue(queue.SimpleQueue):
+            def put(self, item, block=True, timeout=None):
+                states.append(item in service._pending)
+                super().put(item, block, timeout)
+        try:
+            key = service._key(self.files[0])
+            service._completed = RecordingQueue()
+            service._pending[key] = Future()
+            service._run(key, self.files[0])
+            self.assertEqual(states, [True])
+            self.assertEqual((service.pending, service.poll()), (0, 1))
+        finally:
+            service.shutdown()
+
+    def test_persistent_cache(self):
+        """
+        生成したサムネイルを永続キャッシュに保存します。
+        """
+        cache = MetadataCache(Path(self.temp_dir.name, "cache.sqlite3"), thumbnail_size=128)
+        service = ThumbnailService(size=64, cache=cache, max_workers=1)
+        try:
+            service.request(self.files[0])
+            self.wait_completed(service, 1)
+            self.assertEqual(cache.get_thumbnail(self.files[0]).size, (128, 64))
+            self.assertEqual(service.get(self.files[0]).size, (64, 32))
+        finally:
+            service.shutdown()
+            cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
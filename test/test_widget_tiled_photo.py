@@ -0,0 +1,50 @@
+"""
+TileLayoutの単体テスト
+"""
+import os
+import sys
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.widget_tiled_photo import TileLayout, intersect
+
+
+class TestTileLayout(unittest.TestCase):
+    """
+    TileLayoutのテストクラス
+    """
+    def test_tile_box(self):
+        """
+        右端、下端のタイルは画像の範囲に切り詰めます。
+        """
+        layout = TileLayout((1000, 600), 256)
+        self.assertEqual((layout.columns, layout.rows), (4, 3))
+        self.assertEqual(layout.tile_box((0, 0)), (0, 0, 256, 256))
+        self.assertEqual(layout.tile_box((3, 2)), (768, 512, 1000, 600))
+
+    def test_tiles_in_viewport(self):
+        """
+        表示範囲と周囲のタイルのみを列挙し、タイル数は画像ではなく表示範囲の大きさで決まります。
+        """
+        layout = TileLayout((20000, 20000), 512)
+        viewport = (5000, 7000, 5000 + 1920, 7000 + 1080)
+        tiles = list(layout.tiles_in(viewport))
+        self.assertEqual(len(tiles), 5 * 3)
+        self.assertIn((9, 13), tiles)
+        self.assertEqual(len(list(layout.tiles_in(viewport, margin=1))), 7 * 5)
+        # 画像の端ではmarginを切り詰めます。
+        self.assertEqual(list(layout.tiles_in((0, 0, 100, 100), margin=1)), [(0, 0), (1, 0), (0, 1), (1, 1)])
+        self.assertEqual(list(layout.tiles_in((10, 10, 10, 50))), [])
+
+    def test_intersect(self):
+        """
+        矩形の共通部分
+        """
+        self.assertEqual(intersect((0, 0, 512, 512), (500, 100, 700, 200)), (500, 100, 512, 200))
+        self.assertIsNone(intersect((0, 0, 512, 512), (512, 0, 600, 10)))
+
+
+if __name__ == "__main__":
+    unittest.main()